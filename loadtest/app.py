@@ -0,0 +1,79 @@
+"""A small Pyramid application used by the load-test harness.
+
+``make_app("header")`` authenticates through the ``Authorization`` header
+using ``set_jwt_authentication_policy``, ``make_app("cookie")`` uses
+``set_jwt_cookie_authentication_policy`` with sliding sessions.
+"""
+
+import hashlib
+
+from pyramid.authorization import ACLAuthorizationPolicy
+from pyramid.config import Configurator
+from pyramid.response import Response
+from pyramid.security import Allow, Authenticated, remember
+
+SECRET = "load-test-secret"
+EXPIRATION = 3600
+REISSUE_TIME = 60
+PASSWORD = b"correct horse battery staple"
+SALT = b"pyramid_jwt"
+PASSWORD_HASH = hashlib.pbkdf2_hmac("sha256", PASSWORD, SALT, 100000)
+
+
+class Root:
+    __acl__ = [(Allow, Authenticated, ("read",))]
+
+    def __init__(self, request):
+        pass
+
+
+def check_password(password):
+    # Deliberately expensive, like a real password hash.
+    return hashlib.pbkdf2_hmac("sha256", password, SALT, 100000) == PASSWORD_HASH
+
+
+def login_view(request):
+    if not check_password(request.POST.get("password", "").encode("utf-8")):
+        return Response(status=403)
+    return {"token": request.create_jwt_token("user", roles=["reader"])}
+
+
+def login_cookie_view(request):
+    if not check_password(request.POST.get("password", "").encode("utf-8")):
+        return Response(status=403)
+    headers = remember(request, request.create_jwt_token("user", roles=["reader"]))
+    return Response(headers=headers, body="OK")
+
+
+def secure_view(request):
+    return "OK"
+
+
+def make_app(kind="header", settings=None, **policy_args):
+    config = Configurator(settings=settings or {})
+    config.set_authorization_policy(ACLAuthorizationPolicy())
+    config.include("pyramid_jwt")
+    config.set_root_factory(Root)
+    config.add_route("secure", "/secure")
+    config.add_view(
+        secure_view, route_name="secure", renderer="string", permission="read"
+    )
+    config.add_route("login", "/login", request_method="POST")
+
+    if kind == "header":
+        config.add_view(login_view, route_name="login", renderer="json")
+        config.set_jwt_authentication_policy(
+            SECRET, expiration=EXPIRATION, **policy_args
+        )
+    elif kind == "cookie":
+        config.add_view(login_cookie_view, route_name="login")
+        config.set_jwt_cookie_authentication_policy(
+            SECRET,
+            expiration=EXPIRATION,
+            reissue_time=REISSUE_TIME,
+            https_only=False,
+            **policy_args
+        )
+    else:
+        raise ValueError("Unknown application kind %s" % kind)
+    return config.make_wsgi_app()
@@ -0,0 +1,41 @@
+"""Measure the cost of custom-object claims in ``create_token``.
+
+Compares tokens with plain claims to tokens with a claim that needs a Pyramid
+JSON adapter::
+
+    python loadtest/bench_encoder.py
+"""
+
+import timeit
+
+from pyramid.config import Configurator
+from pyramid.renderers import JSON
+
+from pyramid_jwt import create_jwt_authentication_policy
+
+
+class Account:
+    def __init__(self, name):
+        self.name = name
+
+
+def main():
+    renderer = JSON()
+    renderer.add_adapter(Account, lambda obj, request: {"name": obj.name})
+    config = Configurator()
+    config.include("pyramid_jwt")
+    config.add_renderer("json", renderer)
+    config.commit()
+    policy = create_jwt_authentication_policy(config, "secret", algorithm="HS256")
+
+    cases = {
+        "plain": lambda: policy.create_token("user", account={"name": "user"}),
+        "adapter": lambda: policy.create_token("user", account=Account("user")),
+    }
+    for name, case in cases.items():
+        number, total = timeit.Timer(case).autorange()
+        print("%-8s %8.2f us/token" % (name, total / number * 1e6))
+
+
+if __name__ == "__main__":
+    main()
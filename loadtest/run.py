@@ -0,0 +1,215 @@
+"""Replay a mix of authentication traffic against the load-test app.
+
+Every mix is a weighted set of request kinds:
+
+``valid``
+    A request with a valid token in the ``Authorization`` header.
+``expired``
+    A request with an expired token.
+``garbage``
+    A request with a token that is not a JWT at all.
+``reissue``
+    A cookie request with a token older than the reissue time, so a new
+    cookie is issued.
+``login``
+    A burst of password logins that mint new tokens.
+
+Requests are sent in-process to the WSGI application, so results only
+reflect the cost of Pyramid and pyramid_jwt. Example::
+
+    python loadtest/run.py --requests 20000 --concurrency 4 \\
+        --mix steady=valid:90,expired:5,garbage:5 \\
+        --mix browser=valid:50,reissue:45,login:5
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+
+from webob import Request
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import EXPIRATION, PASSWORD, REISSUE_TIME, SECRET, make_app  # noqa: E402
+from pyramid_jwt.clock import FixedClock  # noqa: E402
+from pyramid_jwt.policy import (  # noqa: E402
+    JWTAuthenticationPolicy,
+    JWTCookieAuthenticationPolicy,
+)
+
+KINDS = ("valid", "expired", "garbage", "reissue", "login")
+
+DEFAULT_MIXES = [
+    "valid=valid:100",
+    "steady=valid:90,expired:5,garbage:5",
+    "attack=valid:50,garbage:50",
+    "browser=valid:50,reissue:45,login:5",
+]
+
+
+def parse_mix(value):
+    name, _, spec = value.partition("=")
+    weights = {}
+    for part in spec.split(","):
+        kind, _, weight = part.partition(":")
+        if kind not in KINDS:
+            raise argparse.ArgumentTypeError("Unknown request kind %s" % kind)
+        weights[kind] = float(weight or 1)
+    return name, weights
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, int(round(fraction * (len(values) - 1))))
+    return values[index]
+
+
+class TrafficFactory:
+    def __init__(self):
+        now = time.time()
+        fresh = JWTAuthenticationPolicy(SECRET, expiration=EXPIRATION)
+        old = JWTAuthenticationPolicy(
+            SECRET, expiration=EXPIRATION, clock=FixedClock(now - REISSUE_TIME - 5)
+        )
+        expired = JWTAuthenticationPolicy(
+            SECRET, expiration=60, clock=FixedClock(now - 3600)
+        )
+        self.valid_token = fresh.create_token("user", roles=["reader"])
+        self.expired_token = expired.create_token("user", roles=["reader"])
+        self.reissue_cookie = self._cookie_header(
+            old.create_token("user", roles=["reader"])
+        )
+
+    def _cookie_header(self, token):
+        policy = JWTCookieAuthenticationPolicy(SECRET, https_only=False)
+        headers = policy.remember(Request.blank("/"), token)
+        return "; ".join(value.split(";", 1)[0] for _, value in headers)
+
+    def make(self, kind, rng):
+        if kind == "valid":
+            return "header", self._secure("JWT " + self.valid_token)
+        if kind == "expired":
+            return "header", self._secure("JWT " + self.expired_token)
+        if kind == "garbage":
+            garbage = "%032x.%032x" % (rng.getrandbits(128), rng.getrandbits(128))
+            return "header", self._secure("JWT " + garbage)
+        if kind == "reissue":
+            return "cookie", Request.blank(
+                "/secure", headers={"Cookie": self.reissue_cookie}
+            )
+        if kind == "login":
+            return "header", Request.blank(
+                "/login", POST={"password": PASSWORD.decode("utf-8")}
+            )
+        raise ValueError(kind)
+
+    def _secure(self, authorization):
+        return Request.blank("/secure", headers={"Authorization": authorization})
+
+
+def build_plan(weights, count, burst, rng):
+    kinds = list(weights)
+    plan = []
+    while len(plan) < count:
+        kind = rng.choices(kinds, [weights[k] for k in kinds])[0]
+        plan.extend([kind] * (burst if kind == "login" else 1))
+    return plan[:count]
+
+
+def run_mix(apps, factory, plan, concurrency, rng):
+    requests = [(kind,) + factory.make(kind, rng) for kind in plan]
+    latencies = [[] for _ in range(concurrency)]
+    errors = [0] * concurrency
+    position = iter(range(len(requests)))
+    lock = threading.Lock()
+
+    def worker(slot):
+        own = latencies[slot]
+        while True:
+            with lock:
+                index = next(position, None)
+            if index is None:
+                return
+            kind, app_name, request = requests[index]
+            start = time.perf_counter()
+            response = request.get_response(apps[app_name])
+            own.append(time.perf_counter() - start)
+            if response.status_int >= 500:
+                errors[slot] += 1
+
+    threads = [
+        threading.Thread(target=worker, args=(slot,)) for slot in range(concurrency)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    samples = sorted(latency for own in latencies for latency in own)
+    return {
+        "requests": len(samples),
+        "errors": sum(errors),
+        "rps": len(samples) / elapsed if elapsed else 0.0,
+        "mean_ms": statistics.mean(samples) * 1000 if samples else 0.0,
+        "p50_ms": percentile(samples, 0.50) * 1000,
+        "p99_ms": percentile(samples, 0.99) * 1000,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--burst", type=int, default=10, help="Logins per burst")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--warmup", type=int, default=200)
+    parser.add_argument(
+        "--mix", action="append", type=parse_mix, help="NAME=kind:weight,..."
+    )
+    parser.add_argument("--json", action="store_true", help="Output JSON lines")
+    args = parser.parse_args(argv)
+    # Rejected tokens are logged as warnings, which would drown the report.
+    logging.basicConfig(level=logging.ERROR)
+
+    mixes = args.mix or [parse_mix(mix) for mix in DEFAULT_MIXES]
+    apps = {"header": make_app("header"), "cookie": make_app("cookie")}
+    factory = TrafficFactory()
+
+    if not args.json:
+        print(
+            "%-10s %8s %7s %10s %9s %9s"
+            % ("mix", "requests", "errors", "req/s", "p50 ms", "p99 ms")
+        )
+    for name, weights in mixes:
+        rng = random.Random(args.seed)
+        warmup = build_plan(weights, args.warmup, args.burst, rng)
+        run_mix(apps, factory, warmup, args.concurrency, rng)
+        plan = build_plan(weights, args.requests, args.burst, rng)
+        result = run_mix(apps, factory, plan, args.concurrency, rng)
+        if args.json:
+            print(json.dumps(dict(result, mix=name)))
+        else:
+            print(
+                "%-10s %8d %7d %10.1f %9.3f %9.3f"
+                % (
+                    name,
+                    result["requests"],
+                    result["errors"],
+                    result["rps"],
+                    result["p50_ms"],
+                    result["p99_ms"],
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,29 @@
+from pyramid.events import ApplicationCreated
+from pyramid.settings import asbool
+
+from .algorithms import verification_keys_from_settings
+from .clock import coarse_clock
+from .dpop import proof_verifier_from_settings
+from .encryption import encryption_from_settings
+from .keys import is_symmetric, load_key, public_key_for
+from .profiler import profiler_from_settings
+from .profiles import add_jwt_route_profile, get_route_profile
+from .reference import reference_tokens_from_settings
+from .refresh import refresh_tokens_from_settings
+from .replay import replay_store_from_settings
+from .security import JWTSecurityPolicy, find_authentication_policy
+from .skew import skew_monitor_from_settings
+from .sources import sources_from_settings
+from .stats import add_stats_view
 from .policy import (
     JWTAuthenticationPolicy,
     JWTCookieAuthenticationPolicy,
+    PyramidJSONEncoderFactory,
     json_encoder_factory,
 )
 
 
 def includeme(config):
-    json_encoder_factory.registry = config.registry
     config.add_directive(
         "set_jwt_authentication_policy",
         set_jwt_authentication_policy,
@@ -17,6 +34,34 @@ def includeme(config):
         set_jwt_cookie_authentication_policy,
         action_wrap=True,
     )
+    config.add_directive(
+        "set_jwt_security_policy", set_jwt_security_policy, action_wrap=True
+    )
+    config.add_directive(
+        "set_jwt_cookie_security_policy",
+        set_jwt_cookie_security_policy,
+        action_wrap=True,
+    )
+    config.add_directive("add_jwt_route_profile", add_jwt_route_profile)
+
+    settings = config.get_settings()
+    if settings.get("jwt.stats_path"):
+        add_stats_view(
+            config,
+            settings["jwt.stats_path"],
+            settings.get("jwt.stats_permission", "jwt.stats"),
+        )
+    if asbool(settings.get("jwt.warm_up", False)) or settings.get(
+        "jwt.warm_up_snapshot"
+    ):
+        config.add_subscriber(warm_up_policy, ApplicationCreated)
+
+
+def warm_up_policy(event):
+    registry = event.app.registry
+    policy = find_authentication_policy(registry)
+    if isinstance(policy, JWTAuthenticationPolicy):
+        policy.warm_up(registry.settings.get("jwt.warm_up_snapshot"))
 
 
 def create_jwt_authentication_policy(
@@ -31,15 +76,33 @@ def create_jwt_authentication_policy(
     callback=None,
     json_encoder=None,
     audience=None,
+    reference_tokens=None,
+    refresh_tokens=None,
+    clock=None,
+    credential_sources=None,
+    verification_keys=None,
+    serializer=None,
+    replay_store=None,
+    dpop=None,
+    encryption=None,
+    skew_monitor=None,
 ):
     settings = config.get_settings()
     private_key = private_key or settings.get("jwt.private_key")
     audience = audience or settings.get("jwt.audience")
     algorithm = algorithm or settings.get("jwt.algorithm") or "HS512"
-    if not algorithm.startswith("HS"):
-        public_key = public_key or settings.get("jwt.public_key")
-    else:
+    private_key = load_key(algorithm, private_key, settings.get("jwt.private_key_file"))
+    if is_symmetric(algorithm):
         public_key = None
+    else:
+        public_key = load_key(
+            algorithm,
+            public_key or settings.get("jwt.public_key"),
+            settings.get("jwt.public_key_file"),
+            private=False,
+        )
+        if public_key is None and private_key is not None:
+            public_key = public_key_for(private_key)
     if expiration is None and "jwt.expiration" in settings:
         expiration = int(settings.get("jwt.expiration"))
     leeway = int(settings.get("jwt.leeway", 0)) if leeway is None else leeway
@@ -48,6 +111,30 @@ def create_jwt_authentication_policy(
         auth_type = auth_type or settings.get("jwt.auth_type") or "JWT"
     else:
         auth_type = None
+    if clock is None and asbool(settings.get("jwt.coarse_clock", False)):
+        clock = coarse_clock
+    if reference_tokens is None:
+        reference_tokens = reference_tokens_from_settings(settings, clock)
+    if refresh_tokens is None:
+        refresh_tokens = refresh_tokens_from_settings(settings, clock)
+    credential_sources = credential_sources or settings.get("jwt.credential_sources")
+    if isinstance(credential_sources, str):
+        credential_sources = sources_from_settings(
+            credential_sources, auth_type or "JWT"
+        )
+    if verification_keys is None:
+        verification_keys = verification_keys_from_settings(settings)
+    if json_encoder is None:
+        json_encoder = PyramidJSONEncoderFactory(config.registry)
+    serializer = serializer or settings.get("jwt.serializer")
+    if replay_store is None:
+        replay_store = replay_store_from_settings(settings, clock)
+    if dpop is None:
+        dpop = proof_verifier_from_settings(settings)
+    if encryption is None:
+        encryption = encryption_from_settings(settings)
+    if skew_monitor is None:
+        skew_monitor = skew_monitor_from_settings(settings)
     return JWTAuthenticationPolicy(
         private_key=private_key,
         public_key=public_key,
@@ -59,6 +146,16 @@ def create_jwt_authentication_policy(
         callback=callback,
         json_encoder=json_encoder,
         audience=audience,
+        reference_tokens=reference_tokens,
+        refresh_tokens=refresh_tokens,
+        clock=clock,
+        credential_sources=credential_sources,
+        verification_keys=verification_keys,
+        serializer=serializer,
+        replay_store=replay_store,
+        dpop=dpop,
+        encryption=encryption,
+        skew_monitor=skew_monitor,
     )
 
 
@@ -82,6 +179,17 @@ def create_jwt_cookie_authentication_policy(
     accept_header=None,
     header_first=None,
     reissue_callback=None,
+    cookie_chunk_size=None,
+    reference_tokens=None,
+    refresh_tokens=None,
+    clock=None,
+    credential_sources=None,
+    verification_keys=None,
+    serializer=None,
+    replay_store=None,
+    dpop=None,
+    encryption=None,
+    skew_monitor=None,
 ):
     settings = config.get_settings()
     cookie_name = cookie_name or settings.get("jwt.cookie_name")
@@ -95,6 +203,7 @@ def create_jwt_cookie_authentication_policy(
         accept_header = settings.get("jwt.cookie_accept_header", False)
     if header_first is None:
         header_first = settings.get("jwt.cookie_prefer_header", False)
+    cookie_chunk_size = cookie_chunk_size or settings.get("jwt.cookie_chunk_size")
 
     auth_policy = create_jwt_authentication_policy(
         config,
@@ -108,6 +217,16 @@ def create_jwt_cookie_authentication_policy(
         callback,
         json_encoder,
         audience,
+        reference_tokens,
+        refresh_tokens,
+        clock,
+        credential_sources,
+        verification_keys,
+        serializer,
+        replay_store,
+        dpop,
+        encryption,
+        skew_monitor,
     )
 
     return JWTCookieAuthenticationPolicy.make_from(
@@ -120,6 +239,7 @@ def create_jwt_cookie_authentication_policy(
         accept_header=accept_header,
         header_first=header_first,
         reissue_callback=reissue_callback,
+        cookie_chunk_size=cookie_chunk_size,
     )
 
 
@@ -127,6 +247,14 @@ def configure_jwt_authentication_policy(config, auth_policy, register=True):
     def _request_create_token(
         request, principal, expiration=None, audience=None, **claims
     ):
+        profile = get_route_profile(request)
+        if profile is not None:
+            expiration = expiration or profile.expiration
+            audience = audience or profile.audience
+        if auth_policy.dpop is not None and "cnf" not in claims:
+            thumbprint = auth_policy.proof_thumbprint(request)
+            if thumbprint is not None:
+                claims["cnf"] = {"jkt": thumbprint}
         return auth_policy.create_token(principal, expiration, audience, **claims)
 
     def _request_claims(request):
@@ -135,9 +263,29 @@ def configure_jwt_authentication_policy(config, auth_policy, register=True):
     def _request_token(request):
         return auth_policy.get_token(request)
 
+    def _request_credential_source(request):
+        return auth_policy.get_credential_source(request)
+
+    def _request_create_refresh_token(request, principal, **claims):
+        return auth_policy.create_refresh_token(principal, **claims)
+
+    def _request_refresh_token(request, refresh_token, expiration=None, audience=None):
+        return auth_policy.refresh_token(refresh_token, expiration, audience)
+
     config.add_request_method(_request_claims, "jwt_claims", reify=True)
     config.add_request_method(_request_token, "jwt_token", reify=True)
     config.add_request_method(_request_create_token, "create_jwt_token")
+    if auth_policy.credential_sources is not None:
+        config.add_request_method(
+            _request_credential_source, "jwt_credential_source", reify=True
+        )
+    if auth_policy.refresh_tokens is not None:
+        config.add_request_method(
+            _request_create_refresh_token, "create_jwt_refresh_token"
+        )
+        config.add_request_method(_request_refresh_token, "refresh_jwt_token")
+
+    profiler_from_settings(auth_policy, config.get_settings())
 
     if register:
         config.set_authentication_policy(auth_policy)
@@ -163,6 +311,17 @@ def set_jwt_cookie_authentication_policy(
     accept_header=None,
     header_first=None,
     reissue_callback=None,
+    cookie_chunk_size=None,
+    reference_tokens=None,
+    refresh_tokens=None,
+    clock=None,
+    credential_sources=None,
+    verification_keys=None,
+    serializer=None,
+    replay_store=None,
+    dpop=None,
+    encryption=None,
+    skew_monitor=None,
 ):
     policy = create_jwt_cookie_authentication_policy(
         config,
@@ -184,6 +343,17 @@ def set_jwt_cookie_authentication_policy(
         accept_header,
         header_first,
         reissue_callback,
+        cookie_chunk_size,
+        reference_tokens,
+        refresh_tokens,
+        clock,
+        credential_sources,
+        verification_keys,
+        serializer,
+        replay_store,
+        dpop,
+        encryption,
+        skew_monitor,
     )
     configure_jwt_authentication_policy(config, policy)
 
@@ -200,6 +370,16 @@ def set_jwt_authentication_policy(
     callback=None,
     json_encoder=None,
     audience=None,
+    reference_tokens=None,
+    refresh_tokens=None,
+    clock=None,
+    credential_sources=None,
+    verification_keys=None,
+    serializer=None,
+    replay_store=None,
+    dpop=None,
+    encryption=None,
+    skew_monitor=None,
 ):
     policy = create_jwt_authentication_policy(
         config,
@@ -213,6 +393,36 @@ def set_jwt_authentication_policy(
         callback,
         json_encoder,
         audience,
+        reference_tokens,
+        refresh_tokens,
+        clock,
+        credential_sources,
+        verification_keys,
+        serializer,
+        replay_store,
+        dpop,
+        encryption,
+        skew_monitor,
     )
 
     configure_jwt_authentication_policy(config, policy)
+
+
+def set_jwt_security_policy(config, *args, **kwargs):
+    """Use a :class:`JWTSecurityPolicy` with a header based JWT policy.
+
+    Takes the same arguments as ``set_jwt_authentication_policy``.
+    """
+    policy = create_jwt_authentication_policy(config, *args, **kwargs)
+    configure_jwt_authentication_policy(config, policy, register=False)
+    config.set_security_policy(JWTSecurityPolicy(policy))
+
+
+def set_jwt_cookie_security_policy(config, *args, **kwargs):
+    """Use a :class:`JWTSecurityPolicy` with a cookie based JWT policy.
+
+    Takes the same arguments as ``set_jwt_cookie_authentication_policy``.
+    """
+    policy = create_jwt_cookie_authentication_policy(config, *args, **kwargs)
+    configure_jwt_authentication_policy(config, policy, register=False)
+    config.set_security_policy(JWTSecurityPolicy(policy))
@@ -0,0 +1,116 @@
+import binascii
+import hmac
+import json
+import threading
+
+import jwt
+from jwt.algorithms import HMACAlgorithm, get_default_algorithms
+from jwt.utils import base64url_decode
+from pyramid.settings import aslist
+
+from .keys import load_key
+
+
+class VerifierPool:
+    """Verify tokens signed with any of a set of algorithms.
+
+    Every algorithm has its own key, which is prepared once. The ``alg``
+    header of a token selects the verifier with a single dictionary lookup,
+    so accepting several algorithms costs nothing compared to accepting one.
+    HMAC verifiers keep a keyed context per thread which is copied for each
+    token instead of re-keying HMAC every time.
+    """
+
+    def __init__(self, keys):
+        available = get_default_algorithms()
+        self._verifiers = {}
+        for name, key in keys.items():
+            if name not in available:
+                raise NotImplementedError("Algorithm %s not supported" % name)
+            algorithm = available[name]
+            self._verifiers[name] = (algorithm, algorithm.prepare_key(key))
+        self.algorithms = tuple(keys)
+        self._local = threading.local()
+
+    def _hmac_context(self, name, algorithm, key):
+        try:
+            contexts = self._local.contexts
+        except AttributeError:
+            contexts = self._local.contexts = {}
+        context = contexts.get(name)
+        if context is None:
+            context = contexts[name] = hmac.new(key, digestmod=algorithm.hash_alg)
+        return context.copy()
+
+    def verify(self, token, algorithms=None):
+        if isinstance(token, bytes):
+            token = token.decode("ascii")
+        try:
+            signing_input, crypto_segment = token.rsplit(".", 1)
+            header_segment, payload_segment = signing_input.split(".", 1)
+        except ValueError:
+            raise jwt.DecodeError("Not enough segments")
+
+        try:
+            header = json.loads(base64url_decode(header_segment.encode("ascii")))
+            signature = base64url_decode(crypto_segment.encode("ascii"))
+            payload = json.loads(base64url_decode(payload_segment.encode("ascii")))
+        except (TypeError, ValueError, binascii.Error, UnicodeError):
+            raise jwt.DecodeError("Invalid token encoding")
+        if not isinstance(header, dict) or not isinstance(payload, dict):
+            raise jwt.DecodeError("Invalid token encoding")
+
+        name = header.get("alg")
+        verifier = self._verifiers.get(name)
+        if verifier is None or (algorithms and name not in algorithms):
+            raise jwt.InvalidAlgorithmError("The specified alg value is not allowed")
+
+        algorithm, key = verifier
+        message = signing_input.encode("ascii")
+        if isinstance(algorithm, HMACAlgorithm):
+            context = self._hmac_context(name, algorithm, key)
+            context.update(message)
+            valid = hmac.compare_digest(context.digest(), signature)
+        else:
+            valid = algorithm.verify(message, key, signature)
+        if not valid:
+            raise jwt.InvalidSignatureError("Signature verification failed")
+        return payload
+
+
+def verify_audience(claims, audience):
+    # Same rules as PyJWT applies when it is given an audience.
+    if audience is None:
+        if claims.get("aud"):
+            raise jwt.InvalidAudienceError("Invalid audience")
+        return
+    if "aud" not in claims:
+        raise jwt.MissingRequiredClaimError("aud")
+
+    token_audience = claims["aud"]
+    if isinstance(token_audience, str):
+        token_audience = [token_audience]
+    if not isinstance(token_audience, list) or not all(
+        isinstance(aud, str) for aud in token_audience
+    ):
+        raise jwt.InvalidAudienceError("Invalid claim format in token")
+
+    if isinstance(audience, str):
+        audience = [audience]
+    if not any(aud in token_audience for aud in audience):
+        raise jwt.InvalidAudienceError("Audience doesn't match")
+
+
+def verification_keys_from_settings(settings):
+    keys = {}
+    for name in aslist(settings.get("jwt.verification_algorithms", "")):
+        key = load_key(
+            name,
+            settings.get("jwt.public_key." + name) or None,
+            settings.get("jwt.public_key_file." + name),
+            private=False,
+        )
+        if key is None:
+            raise ValueError("Missing jwt.public_key.%s setting" % name)
+        keys[name] = key
+    return keys or None
@@ -0,0 +1,58 @@
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """A small thread-safe least-recently-used mapping.
+
+    Lookups do not take a lock: a hit costs a dictionary access and a
+    ``move_to_end`` call, both of which are atomic under the GIL. Only
+    inserts, which may have to evict the oldest entry, are serialised.
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        try:
+            value = self._data[key]
+            self._data.move_to_end(key)
+        except KeyError:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+
+    def peek(self, key, default=None):
+        """Return a value without counting a hit or marking it as used."""
+        return self._data.get(key, default)
+
+    def items(self):
+        """Return a list of the cached items, least recently used first."""
+        with self._lock:
+            return list(self._data.items())
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            return self._data.pop(key, default)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
@@ -0,0 +1,63 @@
+import os
+import threading
+import time
+
+
+class CoarseClock:
+    """A clock that only reads the system time once per ``resolution``.
+
+    A daemon thread refreshes the current time in the background, so reading
+    the clock is a plain attribute access. JWT timestamps have a resolution of
+    one second, which makes this precise enough for ``iat``, ``exp`` and
+    reissue decisions.
+    """
+
+    def __init__(self, resolution=1.0, source=time.time):
+        self.resolution = resolution
+        self.source = source
+        self.now = int(source())
+        self._thread = None
+        self._lock = threading.Lock()
+        if hasattr(os, "register_at_fork"):
+            # Threads do not survive a fork: restart the ticker in the child.
+            os.register_at_fork(after_in_child=self._reset)
+
+    def __call__(self):
+        if self._thread is None:
+            self.start()
+        return self.now
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self.now = int(self.source())
+                self._thread = threading.Thread(
+                    target=self._run, name="pyramid_jwt-clock", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.resolution)
+            self.now = int(self.source())
+
+    def _reset(self):
+        self._thread = None
+        self._lock = threading.Lock()
+
+
+class FixedClock:
+    """A clock that only moves when told to, for use in tests."""
+
+    def __init__(self, now=None):
+        self.now = time.time() if now is None else now
+
+    def __call__(self):
+        return self.now
+
+    def tick(self, seconds=1):
+        self.now += seconds
+
+
+# Shared by every policy configured with ``jwt.coarse_clock``.
+coarse_clock = CoarseClock()
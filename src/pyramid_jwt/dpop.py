@@ -0,0 +1,148 @@
+import binascii
+import hashlib
+import hmac
+import json
+import math
+
+import jwt
+from jwt.algorithms import get_default_algorithms
+from jwt.utils import base64url_decode, base64url_encode
+from pyramid.settings import asbool
+
+from .cache import LRUCache
+from .keys import is_symmetric
+
+# Members of a JWK used for its thumbprint, see RFC 7638.
+THUMBPRINT_MEMBERS = {
+    "EC": ("crv", "kty", "x", "y"),
+    "OKP": ("crv", "kty", "x"),
+    "RSA": ("e", "kty", "n"),
+}
+
+
+class InvalidProofError(jwt.InvalidTokenError):
+    pass
+
+
+def jwk_thumbprint(jwk):
+    """Return the base64url encoded SHA-256 thumbprint of a public JWK."""
+    try:
+        members = THUMBPRINT_MEMBERS[jwk["kty"]]
+        data = {name: jwk[name] for name in members}
+    except (KeyError, TypeError):
+        raise InvalidProofError("Invalid or unsupported JWK")
+    canonical = json.dumps(data, separators=(",", ":"), sort_keys=True)
+    digest = hashlib.sha256(canonical.encode("utf-8")).digest()
+    return base64url_encode(digest).decode("ascii")
+
+
+def access_token_hash(token):
+    digest = hashlib.sha256(token.encode("ascii")).digest()
+    return base64url_encode(digest).decode("ascii")
+
+
+class ProofVerifier:
+    """Verify DPoP proofs (RFC 9449) sent along with bound tokens.
+
+    A proof is a JWT signed with the client's private key, which carries the
+    public key in its ``jwk`` header. Tokens are bound to that key by a
+    ``cnf`` claim with the key's thumbprint. Parsed client keys are cached by
+    thumbprint, so verifying the proof of a known client costs a thumbprint
+    calculation and one signature check.
+    """
+
+    def __init__(
+        self,
+        header="DPoP",
+        max_age=60,
+        required=False,
+        algorithms=("ES256", "ES384", "ES512", "EdDSA", "RS256", "PS256"),
+        cache_size=1024,
+    ):
+        self.header = header
+        self.environ_key = "HTTP_" + header.upper().replace("-", "_")
+        self.max_age = max_age
+        self.required = required
+        available = get_default_algorithms()
+        self.algorithms = {
+            name: available[name]
+            for name in algorithms
+            if name in available and not is_symmetric(name)
+        }
+        self.keys = LRUCache(cache_size)
+
+    def verify(self, request, proof, now, access_token=None, replay_store=None):
+        """Verify a proof for a request and return the key thumbprint."""
+        if isinstance(proof, bytes):
+            proof = proof.decode("ascii")
+        try:
+            signing_input, signature = proof.rsplit(".", 1)
+            header_segment, payload_segment = signing_input.split(".", 1)
+            header = json.loads(base64url_decode(header_segment.encode("ascii")))
+            payload = json.loads(base64url_decode(payload_segment.encode("ascii")))
+            signature = base64url_decode(signature.encode("ascii"))
+        except (TypeError, ValueError, binascii.Error, UnicodeError):
+            raise InvalidProofError("Malformed proof")
+        if not isinstance(header, dict) or not isinstance(payload, dict):
+            raise InvalidProofError("Malformed proof")
+
+        if header.get("typ") != "dpop+jwt":
+            raise InvalidProofError("Invalid proof type")
+        algorithm = self.algorithms.get(header.get("alg"))
+        if algorithm is None:
+            raise InvalidProofError("Proof algorithm not allowed")
+        jwk = header.get("jwk")
+        if not isinstance(jwk, dict) or "d" in jwk:
+            raise InvalidProofError("Proof must contain a public JWK")
+
+        thumbprint = jwk_thumbprint(jwk)
+        cache_key = (thumbprint, header["alg"])
+        key = self.keys.get(cache_key)
+        if key is None:
+            try:
+                key = algorithm.from_jwk(jwk)
+            except (jwt.InvalidKeyError, ValueError, TypeError, KeyError):
+                raise InvalidProofError("Invalid proof key")
+            self.keys.set(cache_key, key)
+        if not algorithm.verify(signing_input.encode("ascii"), key, signature):
+            raise InvalidProofError("Invalid proof signature")
+
+        if payload.get("htm") != request.method:
+            raise InvalidProofError("Proof is for another HTTP method")
+        if payload.get("htu") != request.path_url:
+            raise InvalidProofError("Proof is for another URL")
+        iat = payload.get("iat")
+        if (
+            not isinstance(iat, (int, float))
+            or isinstance(iat, bool)
+            or not math.isfinite(iat)
+            or abs(now - iat) > self.max_age
+        ):
+            raise InvalidProofError("Proof is too old or from the future")
+        jti = payload.get("jti")
+        if not jti or not isinstance(jti, str):
+            raise InvalidProofError("Proof has no jti")
+        if access_token is not None:
+            ath = payload.get("ath")
+            if not isinstance(ath, str) or not hmac.compare_digest(
+                ath.encode("utf-8"), access_token_hash(access_token).encode("ascii")
+            ):
+                raise InvalidProofError("Proof is for another access token")
+        if replay_store is not None:
+            if not replay_store.add("dpop:" + jti, int(iat) + self.max_age):
+                raise InvalidProofError("Proof has already been used")
+        return thumbprint
+
+    def get_proof(self, request):
+        return request.environ.get(self.environ_key) or None
+
+
+def proof_verifier_from_settings(settings):
+    if not asbool(settings.get("jwt.dpop", False)):
+        return None
+    return ProofVerifier(
+        header=settings.get("jwt.dpop_header", "DPoP"),
+        max_age=int(settings.get("jwt.dpop_max_age", 60)),
+        required=asbool(settings.get("jwt.dpop_required", False)),
+        cache_size=int(settings.get("jwt.dpop_cache_size", 1024)),
+    )
@@ -0,0 +1,119 @@
+import binascii
+import json
+import os
+
+import jwt
+from jwt.utils import base64url_decode, base64url_encode
+from pyramid.settings import asbool
+
+from .cache import LRUCache
+
+try:
+    from cryptography.exceptions import InvalidTag
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+except ImportError:  # pragma: no cover
+    AESGCM = None
+
+KEY_SIZES = {"A128GCM": 16, "A192GCM": 24, "A256GCM": 32}
+
+
+class InvalidEncryptionError(jwt.DecodeError):
+    pass
+
+
+class TokenEncryption:
+    """Encrypt tokens as compact JWEs with a shared key.
+
+    Only direct encryption (``alg`` ``dir``) with AES GCM is supported. With
+    ``nested`` a signed JWT is encrypted, otherwise the claims themselves are
+    encrypted and the encryption key also authenticates them.
+
+    Decrypting and verifying a token is expensive, so the claims of recently
+    seen tokens are kept in a cache keyed by the SHA-256 digest of the token.
+    Entries are dropped when the token expires, after ``cache_ttl`` seconds
+    if set, or when more than ``cache_size`` tokens are cached.
+    """
+
+    def __init__(
+        self, key, enc="A256GCM", nested=True, cache_size=1024, cache_ttl=None
+    ):
+        if AESGCM is None:
+            raise ValueError("The cryptography package is required for encryption")
+        if enc not in KEY_SIZES:
+            raise ValueError("Unsupported content encryption %s" % enc)
+        if isinstance(key, str):
+            key = base64url_decode(key.strip().encode("ascii"))
+        if len(key) != KEY_SIZES[enc]:
+            raise ValueError("%s requires a %d byte key" % (enc, KEY_SIZES[enc]))
+        self.enc = enc
+        self.nested = nested
+        self.cache = LRUCache(cache_size)
+        self.cache_ttl = cache_ttl
+        self._aead = AESGCM(key)
+        header = {"alg": "dir", "enc": enc}
+        if nested:
+            header["cty"] = "JWT"
+        self._header = base64url_encode(
+            json.dumps(header, separators=(",", ":")).encode("ascii")
+        )
+
+    def encrypt(self, plaintext):
+        if isinstance(plaintext, str):
+            plaintext = plaintext.encode("utf-8")
+        iv = os.urandom(12)
+        sealed = self._aead.encrypt(iv, plaintext, self._header)
+        ciphertext, tag = sealed[:-16], sealed[-16:]
+        return b".".join(
+            [
+                self._header,
+                b"",
+                base64url_encode(iv),
+                base64url_encode(ciphertext),
+                base64url_encode(tag),
+            ]
+        ).decode("ascii")
+
+    def decrypt(self, token):
+        """Decrypt a token and return the header and the plaintext."""
+        if isinstance(token, str):
+            token = token.encode("ascii", "replace")
+        parts = token.split(b".")
+        if len(parts) != 5:
+            raise InvalidEncryptionError("Not an encrypted token")
+        header_segment, encrypted_key, iv, ciphertext, tag = parts
+        try:
+            header = json.loads(base64url_decode(header_segment))
+            iv = base64url_decode(iv)
+            sealed = base64url_decode(ciphertext) + base64url_decode(tag)
+        except (TypeError, ValueError, binascii.Error, UnicodeError):
+            raise InvalidEncryptionError("Invalid token encoding")
+        if (
+            not isinstance(header, dict)
+            or header.get("alg") != "dir"
+            or header.get("enc") != self.enc
+            or encrypted_key
+        ):
+            raise InvalidEncryptionError("Unsupported token encryption")
+        try:
+            plaintext = self._aead.decrypt(iv, sealed, header_segment)
+        except (InvalidTag, ValueError):
+            raise InvalidEncryptionError("Token decryption failed")
+        return header, plaintext
+
+
+def encryption_from_settings(settings):
+    key = settings.get("jwt.encryption_key")
+    path = settings.get("jwt.encryption_key_file")
+    if not key and path:
+        with open(path) as f:
+            key = f.read()
+    if not key:
+        return None
+    cache_ttl = settings.get("jwt.encryption_cache_ttl")
+    return TokenEncryption(
+        key,
+        enc=settings.get("jwt.encryption_enc", "A256GCM"),
+        nested=asbool(settings.get("jwt.encryption_nested", True)),
+        cache_size=int(settings.get("jwt.encryption_cache_size", 1024)),
+        cache_ttl=int(cache_ttl) if cache_ttl else None,
+    )
@@ -0,0 +1,147 @@
+import json
+import secrets
+
+from jwt.algorithms import get_default_algorithms
+
+try:
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import ec, ed448, ed25519, rsa
+except ImportError:  # pragma: no cover
+    serialization = None
+
+# Prefixes of public keys in OpenSSH format.
+SSH_KEY_PREFIXES = (b"ssh-", b"ecdsa-sha2-")
+
+CURVES = {
+    "ES256": "secp256r1",
+    "ES256K": "secp256k1",
+    "ES384": "secp384r1",
+    "ES512": "secp521r1",
+}
+
+
+def is_symmetric(algorithm):
+    return algorithm.startswith("HS")
+
+
+def _require_cryptography(algorithm):
+    if serialization is None:
+        raise ValueError("The cryptography package is required for %s" % algorithm)
+
+
+def load_key(algorithm, value=None, path=None, private=True):
+    """Load a key from a setting value or a file.
+
+    Keys can be given in PEM format or as a JWK, and public keys also in
+    OpenSSH format. HMAC keys are only read as a JWK when given as a dict,
+    so any string can be used as a secret. Asymmetric keys are checked
+    against the algorithm, including the curve for EC algorithms.
+    """
+    if value is None and path:
+        with open(path, "rb") as f:
+            value = f.read()
+        if is_symmetric(algorithm):
+            value = value.strip()
+    if value is None:
+        return None
+    if not isinstance(value, (str, bytes, dict)):
+        validate_key(algorithm, value)
+        return value
+    if is_symmetric(algorithm) and not isinstance(value, dict):
+        return value
+
+    _require_cryptography(algorithm)
+    if _is_jwk(value):
+        algorithms = get_default_algorithms()
+        if algorithm not in algorithms:
+            raise NotImplementedError("Algorithm %s not supported" % algorithm)
+        key = algorithms[algorithm].from_jwk(value)
+        if is_symmetric(algorithm):
+            return key
+    else:
+        if isinstance(value, str):
+            value = value.encode("ascii")
+        if private:
+            key = serialization.load_pem_private_key(value, password=None)
+        elif value.lstrip().startswith(SSH_KEY_PREFIXES):
+            key = serialization.load_ssh_public_key(value.strip())
+        else:
+            key = serialization.load_pem_public_key(value)
+    validate_key(algorithm, key)
+    return key
+
+
+# Only used for asymmetric keys: a PEM or OpenSSH key never starts with "{".
+def _is_jwk(value):
+    if isinstance(value, dict):
+        return True
+    if isinstance(value, bytes):
+        value = value.decode("ascii", "replace")
+    return isinstance(value, str) and value.lstrip().startswith("{")
+
+
+def validate_key(algorithm, key):
+    if is_symmetric(algorithm):
+        return
+    _require_cryptography(algorithm)
+    if algorithm in CURVES:
+        if not isinstance(key, (ec.EllipticCurvePrivateKey, ec.EllipticCurvePublicKey)):
+            raise ValueError("%s requires an EC key" % algorithm)
+        if key.curve.name != CURVES[algorithm]:
+            raise ValueError(
+                "%s requires curve %s, not %s"
+                % (algorithm, CURVES[algorithm], key.curve.name)
+            )
+    elif algorithm == "EdDSA":
+        okp_types = (
+            ed25519.Ed25519PrivateKey,
+            ed25519.Ed25519PublicKey,
+            ed448.Ed448PrivateKey,
+            ed448.Ed448PublicKey,
+        )
+        if not isinstance(key, okp_types):
+            raise ValueError("EdDSA requires an Ed25519 or Ed448 key")
+    elif algorithm[:2] in ("RS", "PS"):
+        if not isinstance(key, (rsa.RSAPrivateKey, rsa.RSAPublicKey)):
+            raise ValueError("%s requires an RSA key" % algorithm)
+
+
+def public_key_for(key):
+    if hasattr(key, "public_key"):
+        return key.public_key()
+    return key
+
+
+def generate_key(algorithm):
+    """Generate a new private key for an algorithm."""
+    if is_symmetric(algorithm):
+        return secrets.token_urlsafe(64)
+    _require_cryptography(algorithm)
+    if algorithm in CURVES:
+        curve = getattr(ec, CURVES[algorithm].upper())
+        return ec.generate_private_key(curve())
+    if algorithm == "EdDSA":
+        return ed25519.Ed25519PrivateKey.generate()
+    if algorithm[:2] in ("RS", "PS"):
+        return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    raise NotImplementedError("Algorithm %s not supported" % algorithm)
+
+
+def serialize_key(algorithm, key, format="pem"):
+    if is_symmetric(algorithm):
+        if format == "jwk":
+            return get_default_algorithms()[algorithm].to_jwk(key)
+        return key
+    if format == "jwk":
+        return json.dumps(get_default_algorithms()[algorithm].to_jwk(key, as_dict=True))
+    if hasattr(key, "private_bytes"):
+        data = key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption(),
+        )
+    else:
+        data = key.public_bytes(
+            serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+        )
+    return data.decode("ascii")
@@ -1,37 +1,83 @@
 import datetime
+import hashlib
+import hmac
+import json
 import logging
+import secrets
 import time
 import warnings
 from json import JSONEncoder
 
 import jwt
+from jwt.algorithms import get_default_algorithms
+from jwt.utils import base64url_encode
 from pyramid.renderers import JSON
 from pyramid.settings import asbool
 from webob.cookies import CookieProfile
 from zope.interface import implementer
 from pyramid.authentication import CallbackAuthenticationPolicy
 from pyramid.interfaces import IAuthenticationPolicy, IRendererFactory
+from pyramid.threadlocal import get_current_registry
+
+from .algorithms import VerifierPool, verify_audience
+from .cache import LRUCache
+from .dpop import InvalidProofError
+from .profiler import AuthProfiler
+from .profiles import get_route_profile, max_profile_leeway
+from .reference import UnknownReferenceError
+from .replay import ReplayedTokenError
+from .serializers import fast_dumps, is_plain
+from .state import request_state
+from .stats import DecodeStats, failure_reason
 
 log = logging.getLogger("pyramid_jwt")
 marker = []
 
+# Browsers drop cookies larger than about 4 KB. The cookie value is the
+# base64 encoded JSON string of the token, so keep chunks well below that.
+COOKIE_CHUNK_SIZE = 3000
+# Stale chunk cookies beyond this index are left alone. Browsers limit the
+# size of the Cookie header, so real chunks never get that far.
+COOKIE_MAX_CHUNKS = 16
+
 
 class PyramidJSONEncoderFactory(JSON):
+    # Instances are shared between threads. Apart from the memoized encoders
+    # in _encoders nothing is stored on self after construction. Without a
+    # registry the registry of the current request or configuration is used.
     def __init__(self, pyramid_registry=None, **kw):
         super().__init__(**kw)
         self.registry = pyramid_registry
+        self._encoders = {}
 
     def __call__(self, *args, **kwargs):
-        json_renderer = None
-        if self.registry is not None:
-            json_renderer = self.registry.queryUtility(
-                IRendererFactory, "json", default=JSONEncoder
-            )
+        registry = self.registry
+        if registry is None:
+            registry = get_current_registry()
+        if args or kwargs.get("default") or kwargs.get("request") is not None:
+            return self._make_encoder(registry, *args, **kwargs)
+
+        # JSONEncoder instances keep no state between encode() calls, so one
+        # instance per set of options can be reused until the registry changes.
+        generation = getattr(getattr(registry, "utilities", None), "_generation", None)
+        options = tuple(sorted(kwargs.items()))
+        cache_key = (id(registry), options)
+        entry = self._encoders.get(cache_key)
+        if entry is not None and entry[0] is registry and entry[1] == generation:
+            return entry[2]
+        encoder = self._make_encoder(registry, **kwargs)
+        if generation is not None:
+            self._encoders[cache_key] = (registry, generation, encoder)
+        return encoder
+
+    def _make_encoder(self, registry, *args, **kwargs):
+        json_renderer = registry.queryUtility(
+            IRendererFactory, "json", default=JSONEncoder
+        )
 
         request = kwargs.get("request")
         if not kwargs.get("default") and isinstance(json_renderer, JSON):
-            self.components = json_renderer.components
-            kwargs["default"] = self._make_default(request)
+            kwargs["default"] = json_renderer._make_default(request)
         return JSONEncoder(*args, **kwargs)
 
 
@@ -53,6 +99,16 @@ class JWTAuthenticationPolicy(CallbackAuthenticationPolicy):
         callback=None,
         json_encoder=None,
         audience=None,
+        reference_tokens=None,
+        refresh_tokens=None,
+        clock=None,
+        credential_sources=None,
+        verification_keys=None,
+        serializer=None,
+        replay_store=None,
+        dpop=None,
+        encryption=None,
+        skew_monitor=None,
     ):
         self.private_key = private_key
         self.public_key = public_key if public_key is not None else private_key
@@ -75,32 +131,114 @@ class JWTAuthenticationPolicy(CallbackAuthenticationPolicy):
         if json_encoder is None:
             json_encoder = json_encoder_factory
         self.json_encoder = json_encoder
+        self.reference_tokens = reference_tokens
+        self.refresh_tokens = refresh_tokens
+        self.clock = clock if clock is not None else time.time
+        self.credential_sources = credential_sources
+        for source in credential_sources or ():
+            source.check(self)
+        self.verification_keys = verification_keys
+        self.serializer = serializer
+        self.replay_store = replay_store
+        self.dpop = dpop
+        self.encryption = encryption
+        self.skew_monitor = skew_monitor
+        # Used tokens are remembered for the largest leeway they can be
+        # accepted with, not the leeway of the request that used them.
+        if isinstance(leeway, datetime.timedelta):
+            leeway = leeway.total_seconds()
+        self.replay_leeway = int(leeway)
+        self._fast_dumps = fast_dumps(serializer)
+        self._fast_signer = None
+        self.stats = DecodeStats()
+        self.profiler = None
+        if verification_keys:
+            keys = {self.algorithm: self.public_key}
+            keys.update(verification_keys)
+            self.verifiers = VerifierPool(keys)
+        else:
+            self.verifiers = None
         self.jwt_std_claims = ("sub", "iat", "exp", "aud")
+        # Time based claims are checked against our own clock in verify_times,
+        # and the audience in jwt_decode.
+        self.jwt_decode_options = {
+            "verify_exp": False,
+            "verify_nbf": False,
+            "verify_iat": False,
+            "verify_aud": False,
+        }
 
     def create_token(self, principal, expiration=None, audience=None, **claims):
         payload = self.default_claims.copy()
         payload.update(claims)
         payload["sub"] = principal
-        payload["iat"] = iat = datetime.datetime.utcnow()
+        payload["iat"] = iat = int(self.clock())
         expiration = expiration or self.expiration
         audience = audience or self.audience
         if expiration:
-            if not isinstance(expiration, datetime.timedelta):
-                expiration = datetime.timedelta(seconds=expiration)
-            payload["exp"] = iat + expiration
+            if isinstance(expiration, datetime.timedelta):
+                expiration = expiration.total_seconds()
+            payload["exp"] = iat + int(expiration)
         if audience:
             payload["aud"] = audience
-        token = jwt.encode(
-            payload,
-            self.private_key,
-            algorithm=self.algorithm,
-            json_encoder=self.json_encoder,
-        )
+        if self.replay_store is not None and "jti" not in payload:
+            payload["jti"] = secrets.token_urlsafe(16)
+        encryption = self.encryption
+        if encryption is not None and not encryption.nested:
+            plaintext = json.dumps(
+                payload, separators=(",", ":"), cls=self.json_encoder
+            )
+            return self._issue(encryption.encrypt(plaintext), payload)
+        if (
+            self._fast_dumps is not None
+            and isinstance(self.json_encoder, PyramidJSONEncoderFactory)
+            and is_plain(payload)
+        ):
+            token = self._fast_encode(payload)
+        else:
+            token = jwt.encode(
+                payload,
+                self.private_key,
+                algorithm=self.algorithm,
+                json_encoder=self.json_encoder,
+            )
         if not isinstance(token, str):  # Python3 unicode madness
             token = token.decode("ascii")
+        if encryption is not None:
+            token = encryption.encrypt(token)
+        return self._issue(token, payload)
+
+    def _issue(self, token, payload):
+        if self.reference_tokens is not None:
+            token = self.reference_tokens.issue(token, payload.get("exp"))
         return token
 
+    # Encode plain claims with a fast JSON library and sign them directly.
+    # The header segment is taken from a token made by PyJWT, so the result
+    # is byte for byte what jwt.encode() would return.
+    def _fast_encode(self, payload):
+        return self._sign(self._fast_dumps(payload))
+
+    def _sign(self, payload_json):
+        signer = self._fast_signer
+        if signer is None:
+            header = jwt.encode({}, self.private_key, algorithm=self.algorithm)
+            algorithm = get_default_algorithms()[self.algorithm]
+            if not isinstance(header, str):
+                header = header.decode("ascii")
+            signer = self._fast_signer = (
+                header.split(".", 1)[0].encode("ascii"),
+                algorithm,
+                algorithm.prepare_key(self.private_key),
+            )
+        header_segment, algorithm, key = signer
+        signing_input = header_segment + b"." + base64url_encode(payload_json)
+        signature = base64url_encode(algorithm.sign(signing_input, key))
+        return (signing_input + b"." + signature).decode("ascii")
+
     def get_token(self, request):
+        if self.credential_sources is not None:
+            return self._resolve_credentials(request)[0]
         if self.http_header == "Authorization":
             try:
                 if request.authorization is None:
@@ -115,24 +253,317 @@ class JWTAuthenticationPolicy(CallbackAuthenticationPolicy):
             return request.headers.get(self.http_header)
 
     def get_claims(self, request):
+        if self.credential_sources is not None:
+            return self._resolve_credentials(request)[1]
         token = self.get_token(request)
         if not token:
             return {}
         return self.jwt_decode(request, token)
 
-    def jwt_decode(self, request, token):
-        try:
-            claims = jwt.decode(
-                token,
-                self.public_key,
-                algorithms=[self.algorithm],
-                leeway=self.leeway,
-                audience=self.audience,
+    def get_credential_source(self, request):
+        if self.credential_sources is None:
+            return None
+        source = self._resolve_credentials(request)[2]
+        return source.name if source is not None else None
+
+    # Try the credential sources in order and stop at the first token that
+    # verifies. The outcome is stored on the request so the sources are only
+    # probed once.
+    def _resolve_credentials(self, request):
+        state = request_state(request)
+        if state.credentials is not None:
+            return state.credentials
+        result = (None, {}, None)
+        for source in self.credential_sources:
+            token = source.probe(self, request)
+            if not token:
+                continue
+            claims = self.jwt_decode(
+                request, token, algorithms=source.algorithms, audience=source.audience
             )
-            return claims
+            if claims:
+                result = (token, claims, source)
+                break
+        state.credentials = result
+        return result
+
+    def jwt_decode(self, request, token, algorithms=None, audience=marker):
+        try:
+            claims = self.jwt_verify(request, token, algorithms, audience)
         except jwt.InvalidTokenError as e:
+            self.stats.failure(failure_reason(e), request.remote_addr)
             log.warning("Invalid JWT token from %s: %s", request.remote_addr, e)
             return {}
+        self.stats.success()
+        return claims
+
+    def jwt_verify(self, request, token, algorithms=None, audience=marker):
+        """Return the claims of a valid token or raise InvalidTokenError."""
+        leeway = None
+        profile = get_route_profile(request) if request is not None else None
+        if profile is not None:
+            leeway = profile.leeway
+            if profile.audience is not None:
+                audience = profile.audience
+        if audience is marker:
+            audience = self.audience
+        presented = token
+        if self.reference_tokens is not None:
+            handle, token = token, self.reference_tokens.resolve(token)
+            if token is None:
+                raise UnknownReferenceError("Unknown reference token %s" % handle)
+        claims = self._verified_claims(request, token, algorithms)
+        verify_audience(claims, audience)
+        # A clock running ahead only affects iat and nbf, so exp keeps the
+        # configured leeway.
+        future_leeway = None
+        if self.skew_monitor is not None:
+            future_leeway = self.skew_monitor.leeway(
+                request, claims, self.clock(), self.leeway if leeway is None else leeway
+            )
+        self.verify_times(claims, leeway, future_leeway)
+        if self.dpop is not None:
+            self._check_proof(request, presented, claims)
+        # Last, so a token is only used up by a request that passes every
+        # other check.
+        if self.replay_store is not None and (
+            profile is None or profile.replay is not False
+        ):
+            self._check_replay(request, claims, leeway)
+        return claims
+
+    # Only the signature is checked here. The result is kept on the request
+    # so claims can be validated again, for example with the settings of a
+    # route profile, without verifying the signature a second time.
+    def _verified_claims(self, request, token, algorithms=None):
+        state = request_state(request) if request is not None else None
+        cached = state.verified if state is not None else None
+        if cached is not None and cached[0] == token and cached[1] == algorithms:
+            return cached[2]
+        if self.encryption is not None:
+            claims = self._decrypt(token, algorithms)
+        else:
+            claims = self._verify_signature(token, algorithms)
+        if self.skew_monitor is not None:
+            self.skew_monitor.observe(request, claims, self.clock())
+        if state is not None:
+            state.verified = (token, algorithms, claims)
+        return claims
+
+    def _check_replay(self, request, claims, leeway=None):
+        # The same request may decode its token more than once.
+        state = request_state(request) if request is not None else None
+        if state is not None and state.replay_checked is claims:
+            return
+        jti = claims.get("jti")
+        if not jti or not isinstance(jti, str):
+            raise jwt.MissingRequiredClaimError("jti")
+        if "exp" not in claims:
+            raise jwt.MissingRequiredClaimError("exp")
+        leeway = self.leeway if leeway is None else leeway
+        if isinstance(leeway, datetime.timedelta):
+            leeway = leeway.total_seconds()
+        leeway = max(int(leeway), self.replay_leeway)
+        if request is not None:
+            leeway = max(leeway, max_profile_leeway(request.registry))
+        if not self.replay_store.add(jti, int(claims["exp"]), leeway):
+            raise ReplayedTokenError("Token has already been used")
+        if state is not None:
+            state.replay_checked = claims
+
+    def _verify_signature(self, token, algorithms=None):
+        if self.verifiers is not None:
+            return self.verifiers.verify(token, algorithms)
+        return jwt.decode(
+            token,
+            self.public_key,
+            algorithms=algorithms or [self.algorithm],
+            options=self.jwt_decode_options,
+        )
+
+    # Decrypted claims are cached by token digest. A copy is returned so
+    # callers can not change the cached claims.
+    def _decrypt(self, token, algorithms=None):
+        encryption = self.encryption
+        if isinstance(token, str):
+            token = token.encode("ascii", "replace")
+        cache_key = hashlib.sha256(token).digest()
+        if algorithms:
+            cache_key = (cache_key, tuple(algorithms))
+        now = self.clock()
+        entry = encryption.cache.get(cache_key)
+        if entry is not None and (entry[1] is None or entry[1] > now):
+            return dict(entry[0])
+
+        header, plaintext = encryption.decrypt(token)
+        if header.get("cty", "").upper() == "JWT":
+            claims = self._verify_signature(plaintext, algorithms)
+        elif encryption.nested:
+            raise jwt.DecodeError("Expected a signed token")
+        else:
+            try:
+                claims = json.loads(plaintext)
+            except ValueError:
+                raise jwt.DecodeError("Invalid claims")
+            if not isinstance(claims, dict):
+                raise jwt.DecodeError("Invalid claims")
+
+        expires = claims.get("exp")
+        if not isinstance(expires, int):
+            expires = None
+        if encryption.cache_ttl is not None:
+            ttl_expires = now + encryption.cache_ttl
+            expires = ttl_expires if expires is None else min(expires, ttl_expires)
+        encryption.cache.set(cache_key, (claims, expires))
+        return dict(claims)
+
+    # Tokens with a cnf claim are bound to the key of a client and must be
+    # sent with a proof signed by that key.
+    def _check_proof(self, request, token, claims):
+        state = request_state(request) if request is not None else None
+        if state is not None and state.proof_checked is claims:
+            return
+        cnf = claims.get("cnf")
+        jkt = cnf.get("jkt") if isinstance(cnf, dict) else None
+        if not jkt or not isinstance(jkt, str):
+            if self.dpop.required:
+                raise InvalidProofError("Token is not bound to a key")
+            return
+        proof = self.dpop.get_proof(request) if state is not None else None
+        if proof is None:
+            raise InvalidProofError("Missing proof of possession")
+        thumbprint = self.dpop.verify(
+            request, proof, self.clock(), token, self.replay_store
+        )
+        if not hmac.compare_digest(thumbprint, jkt):
+            raise InvalidProofError("Proof is signed by another key")
+        state.proof_checked = claims
+
+    def proof_thumbprint(self, request):
+        """Verify the proof sent with a request for a new token.
+
+        Returns the thumbprint of the client key, to be used in a ``cnf``
+        claim, or None if the request has no proof.
+        """
+        if self.dpop is None:
+            raise ValueError("Proof of possession is not enabled")
+        proof = self.dpop.get_proof(request)
+        if proof is None:
+            return None
+        return self.dpop.verify(request, proof, self.clock(), None, self.replay_store)
+
+    def verify_times(self, claims, leeway=None, future_leeway=None):
+        leeway = self.leeway if leeway is None else leeway
+        if isinstance(leeway, datetime.timedelta):
+            leeway = leeway.total_seconds()
+        future_leeway = leeway if future_leeway is None else future_leeway
+        if isinstance(future_leeway, datetime.timedelta):
+            future_leeway = future_leeway.total_seconds()
+        now = self.clock()
+
+        try:
+            if "exp" in claims and int(claims["exp"]) <= now - leeway:
+                raise jwt.ExpiredSignatureError("Signature has expired")
+            if "nbf" in claims and int(claims["nbf"]) > now + future_leeway:
+                raise jwt.ImmatureSignatureError("The token is not yet valid (nbf)")
+            if "iat" in claims and int(claims["iat"]) > now + future_leeway:
+                raise jwt.ImmatureSignatureError("The token is not yet valid (iat)")
+        except (TypeError, ValueError):
+            raise jwt.DecodeError("Time based claims must be integers")
+
+    def create_refresh_token(self, principal, **claims):
+        if self.refresh_tokens is None:
+            raise ValueError("No refresh token store configured")
+        return self.refresh_tokens.issue(principal, claims)
+
+    def refresh_token(self, refresh_token, expiration=None, audience=None):
+        if self.refresh_tokens is None:
+            raise ValueError("No refresh token store configured")
+        result = self.refresh_tokens.rotate(refresh_token)
+        if result is None:
+            return None
+        principal, claims, refresh_token = result
+        token = self.create_token(principal, expiration, audience, **claims)
+        return token, refresh_token
+
+    def revoke_token(self, token):
+        if self.reference_tokens is None:
+            raise ValueError("Only reference tokens can be revoked")
+        self.reference_tokens.revoke(token)
+
+    def start_profiling(self, directory, requests=100):
+        self.profiler = AuthProfiler(self, directory, requests)
+        return self.profiler
+
+    def authenticated_userid(self, request):
+        profiler = self.profiler
+        if profiler is None:
+            return super().authenticated_userid(request)
+        return profiler.run(request, super().authenticated_userid, request)
+
+    def effective_principals(self, request):
+        profiler = self.profiler
+        if profiler is None:
+            return super().effective_principals(request)
+        return profiler.run(request, super().effective_principals, request)
+
+    def warm_up(self, snapshot=None):
+        """Do the work that is otherwise done by the first requests.
+
+        This prepares the keys, signers and JSON encoder with a token round
+        trip for every algorithm the policy accepts, starts the clock, and
+        fills the decryption and reference token caches with the tokens
+        listed, one per line, in the ``snapshot`` file. Returns the number of
+        snapshot tokens that were cached.
+        """
+        self.clock()
+        if self.private_key is not None:
+            payload = {"sub": "warm-up", "iat": int(self.clock())}
+            token = jwt.encode(
+                payload,
+                self.private_key,
+                algorithm=self.algorithm,
+                json_encoder=self.json_encoder,
+            )
+            if not isinstance(token, str):
+                token = token.decode("ascii")
+            self._sign(json.dumps(payload).encode("ascii"))
+            self._verify_signature(token)
+            if self.encryption is not None:
+                self.encryption.decrypt(self.encryption.encrypt(token))
+        if self.verifiers is not None:
+            # The keys were prepared by VerifierPool already, this runs every
+            # verifier once with an invalid signature.
+            for name in self.verifiers.algorithms:
+                header = base64url_encode(json.dumps({"alg": name}).encode("ascii"))
+                try:
+                    self.verifiers.verify(header + b".e30.AA", [name])
+                except jwt.InvalidTokenError:
+                    pass
+        return self._load_snapshot(snapshot) if snapshot else 0
+
+    def _load_snapshot(self, path):
+        count = 0
+        with open(path) as f:
+            for line in f:
+                token = line.strip()
+                if not token:
+                    continue
+                if self.reference_tokens is not None:
+                    token = self.reference_tokens.resolve(token)
+                    if token is None:
+                        continue
+                    if self.encryption is None:
+                        count += 1
+                        continue
+                if self.encryption is None:
+                    continue
+                try:
+                    self._decrypt(token)
+                except jwt.InvalidTokenError:
+                    continue
+                count += 1
+        return count
 
     def unauthenticated_userid(self, request):
         return request.jwt_claims.get("sub")
@@ -181,6 +612,17 @@ class JWTCookieAuthenticationPolicy(JWTAuthenticationPolicy):
         accept_header=False,
         header_first=False,
         reissue_callback=None,
+        cookie_chunk_size=None,
+        reference_tokens=None,
+        refresh_tokens=None,
+        clock=None,
+        credential_sources=None,
+        verification_keys=None,
+        serializer=None,
+        replay_store=None,
+        dpop=None,
+        encryption=None,
+        skew_monitor=None,
     ):
         super(JWTCookieAuthenticationPolicy, self).__init__(
             private_key,
@@ -194,12 +636,23 @@ class JWTCookieAuthenticationPolicy(JWTAuthenticationPolicy):
             callback,
             json_encoder,
             audience,
+            reference_tokens,
+            refresh_tokens,
+            clock,
+            credential_sources,
+            verification_keys,
+            serializer,
+            replay_store,
+            dpop,
+            encryption,
+            skew_monitor,
         )
 
         self.https_only = asbool(https_only)
         self.samesite = samesite
         self.cookie_name = cookie_name or "Authorization"
         self.max_age = self.expiration and self.expiration.total_seconds()
+        self.cookie_chunk_size = int(cookie_chunk_size or COOKIE_CHUNK_SIZE)
 
         if reissue_time and isinstance(reissue_time, datetime.timedelta):
             reissue_time = reissue_time.total_seconds()
@@ -208,21 +661,36 @@ class JWTCookieAuthenticationPolicy(JWTAuthenticationPolicy):
         self.header_first = asbool(header_first)
 
         def _default_reissue_callback(request, principal, **claims):
-            return self.create_token(
-                principal, self.expiration, self.audience, **claims
-            )
+            return self._reissue_token(principal, claims)
 
         self.reissue_callback = reissue_callback or _default_reissue_callback
 
-        self.cookie_profile = CookieProfile(
-            cookie_name=self.cookie_name,
+        self.cookie_path = cookie_path
+        self.cookie_profile = self._make_cookie_profile(self.cookie_name)
+        self._chunk_profiles = {}
+        self._reissue_templates = LRUCache(1024)
+
+    def _make_cookie_profile(self, cookie_name):
+        return CookieProfile(
+            cookie_name=cookie_name,
             secure=self.https_only,
             samesite=self.samesite,
             max_age=self.max_age,
             httponly=True,
-            path=cookie_path,
+            path=self.cookie_path,
         )
 
+    def _chunk_profile(self, index, cache=True):
+        # Only profiles for chunks we write are kept. The indexes of stale
+        # chunks come from the request and get a throwaway profile.
+        profile = self._chunk_profiles.get(index)
+        if profile is None:
+            name = "%s.%d" % (self.cookie_name, index)
+            profile = self._make_cookie_profile(name)
+            if cache:
+                profile = self._chunk_profiles.setdefault(index, profile)
+        return profile
+
     @staticmethod
     def make_from(policy, **kwargs):
         if not isinstance(policy, JWTAuthenticationPolicy):
@@ -241,6 +709,16 @@ class JWTCookieAuthenticationPolicy(JWTAuthenticationPolicy):
             callback=policy.callback,
             json_encoder=policy.json_encoder,
             audience=policy.audience,
+            reference_tokens=policy.reference_tokens,
+            refresh_tokens=policy.refresh_tokens,
+            clock=policy.clock,
+            credential_sources=policy.credential_sources,
+            verification_keys=policy.verification_keys,
+            serializer=policy.serializer,
+            replay_store=policy.replay_store,
+            dpop=policy.dpop,
+            encryption=policy.encryption,
+            skew_monitor=policy.skew_monitor,
             **kwargs
         )
 
@@ -253,29 +731,92 @@ class JWTCookieAuthenticationPolicy(JWTAuthenticationPolicy):
         if max_age is not None:
             kw["max_age"] = max_age
 
-        headers = profile.get_headers(value, **kw)
+        stale = self._cookie_chunk_indexes(request)
+        size = self.cookie_chunk_size
+        if value is None or len(value) <= size:
+            headers = profile.get_headers(value, **kw)
+        else:
+            chunks = [value[i : i + size] for i in range(0, len(value), size)]
+            headers = []
+            for index, chunk in enumerate(chunks):
+                headers.extend(self._chunk_profile(index).get_headers(chunk, **kw))
+            stale = [index for index in stale if index >= len(chunks)]
+            if self.cookie_name in request.cookies:
+                headers.extend(profile.get_headers(None, domains=domains))
+
+        for index in stale:
+            headers.extend(
+                self._chunk_profile(index, cache=False).get_headers(
+                    None, domains=domains
+                )
+            )
         return headers
 
-    def remember(self, request, token, **kw):
-        if hasattr(request, "_jwt_cookie_reissued") and request._jwt_cookie_reissued:
-            request._jwt_cookie_reissue_revoked = True
+    def _cookie_chunk_indexes(self, request):
+        prefix = self.cookie_name + "."
+        indexes = [
+            int(name[len(prefix) :])
+            for name in request.cookies
+            if name.startswith(prefix) and name[len(prefix) :].isdigit()
+        ]
+        return [index for index in indexes if index < COOKIE_MAX_CHUNKS]
+
+    def _get_cookie_value(self, request):
+        cookies = request.cookies
+        loads = self.cookie_profile.serializer.loads
+        cookie = cookies.get(self.cookie_name)
+        try:
+            if cookie is not None:
+                return loads(cookie.encode("latin-1"))
+
+            prefix = self.cookie_name + "."
+            chunks = {}
+            for name, chunk in cookies.items():
+                if name.startswith(prefix) and name[len(prefix) :].isdigit():
+                    chunks[int(name[len(prefix) :])] = chunk
+            if not chunks:
+                return None
+            return "".join(
+                loads(chunks[index].encode("latin-1")) for index in range(len(chunks))
+            )
+        except (KeyError, ValueError, TypeError):
+            return None
 
+    def remember(self, request, token, **kw):
+        self.revoke_reissue(request)
         return self._get_cookies(
             request, token, self.max_age, domains=kw.get("domains")
         )
 
     def forget(self, request):
-        request._jwt_cookie_reissue_revoked = True
+        self.revoke_reissue(request)
         return self._get_cookies(request, None)
 
+    def revoke_reissue(self, request):
+        """Do not reissue the cookie of this request.
+
+        This can be called before or after the cookie was looked at.
+        """
+        request_state(request).revoke_reissue()
+
     def get_token(self, request):
+        if self.credential_sources is not None:
+            token, claims, source = self._resolve_credentials(request)
+            if (
+                token
+                and self.reissue_time is not None
+                and source.reissue
+                and request_state(request).start_reissue()
+            ):
+                self._handle_reissue(request, claims)
+            return token
+
         if self.accept_header:
             token = super().get_token(request)
             if token and self.header_first:
                 return token
 
-        profile = self.cookie_profile.bind(request)
-        cookie = profile.get_value()
+        cookie = self._get_cookie_value(request)
 
         if not cookie and self.accept_header:
             return token
@@ -285,7 +826,7 @@ class JWTCookieAuthenticationPolicy(JWTAuthenticationPolicy):
         if (
             cookie
             and self.reissue_time is not None
-            and not hasattr(request, "_jwt_cookie_reissued")
+            and request_state(request).start_reissue()
         ):
             claims = self._internal_jwt_claims(request, cookie)
             if claims:
@@ -295,17 +836,57 @@ class JWTCookieAuthenticationPolicy(JWTAuthenticationPolicy):
 
     # store claims in request to avoid decoding twice in reissue_callback
     def _internal_jwt_claims(self, request, token):
-        if not hasattr(request, "_internal_jwt_claims"):
-            request._internal_jwt_claims = self.jwt_decode(request, token)
-        return request._internal_jwt_claims
+        state = request_state(request)
+        if state.claims is None:
+            state.claims = self.jwt_decode(request, token)
+        return state.claims
 
     # redefined get_claims to use internally stored claims
     def get_claims(self, request):
+        if self.credential_sources is not None:
+            self.get_token(request)
+            return self._resolve_credentials(request)[1]
         token = self.get_token(request)
         if not token:
             return {}
         return self._internal_jwt_claims(request, token)
 
+    # A reissued token only differs from the old one in its iat and exp
+    # claims. The other claims are serialized once per principal and the new
+    # times are appended, so reissuing costs a single signature. Tokens that
+    # need more than new times go through create_token.
+    def _reissue_token(self, principal, claims):
+        if (
+            self.reference_tokens is not None
+            or self.encryption is not None
+            or self.replay_store is not None
+            or not self.expiration
+            or (self.audience and claims.get("aud") != self.audience)
+            or type(principal) not in (str, int)
+            or claims.get("sub") != principal
+        ):
+            return self.create_token(
+                principal, self.expiration, self.audience, **claims
+            )
+
+        base = claims.copy()
+        base.pop("iat", None)
+        base.pop("exp", None)
+        entry = self._reissue_templates.get(principal)
+        if entry is None or entry[0] != base:
+            if self._fast_dumps is not None and is_plain(base):
+                serialized = self._fast_dumps(base)
+            else:
+                serialized = json.dumps(
+                    base, separators=(",", ":"), cls=self.json_encoder
+                ).encode("utf-8")
+            entry = (base, serialized[:-1] + b",")
+            self._reissue_templates.set(principal, entry)
+
+        iat = int(self.clock())
+        exp = iat + int(self.expiration.total_seconds())
+        return self._sign(entry[1] + b'"iat":%d,"exp":%d}' % (iat, exp))
+
     def _handle_reissue(self, request, claims):
         if not request or not claims:
             raise ValueError("Cannot handle JWT reissue: insufficient arguments")
@@ -315,12 +896,9 @@ class JWTCookieAuthenticationPolicy(JWTAuthenticationPolicy):
         if "sub" not in claims:
             raise ReissueError("Token claim's is missing SUB")
 
-        # avoid getting called again from reissue_callback via get_token() or get_claims()
-        request._jwt_cookie_reissued = False
-
         token_dt = claims["iat"]
         principal = claims["sub"]
-        now = time.time()
+        now = self.clock()
 
         if now < token_dt + self.reissue_time:
             # Token not yet eligible for reissuing
@@ -331,12 +909,7 @@ class JWTCookieAuthenticationPolicy(JWTAuthenticationPolicy):
         except Exception as e:
             raise ReissueError("Callback raised exception") from e
 
-        def reissue_jwt_cookie(request, response):
-            if not hasattr(request, "_jwt_cookie_reissue_revoked"):
-                for k, v in headers:
-                    response.headerlist.append((k, v))
-
         if token:
-            headers = self.remember(request, token)
-            request.add_response_callback(reissue_jwt_cookie)
-            request._jwt_cookie_reissued = True
+            headers = self._get_cookies(request, token, self.max_age)
+            request_state(request).schedule_reissue(request, headers)
+            self.stats.reissued += 1
@@ -0,0 +1,112 @@
+import cProfile
+import logging
+import os
+import pstats
+import signal
+import threading
+import time
+
+from pyramid.settings import asbool
+
+from .state import request_state
+
+log = logging.getLogger("pyramid_jwt")
+
+
+class AuthProfiler:
+    """Profile authentication for a number of requests.
+
+    Every request is profiled with its own :class:`cProfile.Profile`, since
+    a profile only sees the thread that enabled it, and the results are
+    merged. Python 3.12 allows only one active profile, so requests arriving
+    while another one is profiled run unprofiled. Once ``requests`` requests have been seen the merged statistics
+    are written to ``directory`` in pstats format and the profiler removes
+    itself from the policy.
+    """
+
+    def __init__(self, policy, directory, requests=100):
+        self.policy = policy
+        self.directory = directory
+        self.requests = requests
+        self.path = None
+        self._seen = 0
+        self._stats = None
+        self._lock = threading.Lock()
+        self._busy = threading.Lock()
+        self._local = threading.local()
+
+    def run(self, request, function, *args):
+        if getattr(self._local, "active", False):
+            # Already profiling this thread, e.g. effective_principals
+            # calling the callback which needs the userid.
+            return function(*args)
+        if not self._busy.acquire(blocking=False):
+            return function(*args)
+        try:
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:  # Another profiling tool is active
+                return function(*args)
+            state = request_state(request)
+            if not state.profiled:
+                with self._lock:
+                    done = self._seen >= self.requests
+                    if not done:
+                        self._seen += 1
+                if done:
+                    profile.disable()
+                    return function(*args)
+                state.profiled = True
+
+            self._local.active = True
+            try:
+                return function(*args)
+            finally:
+                profile.disable()
+                self._local.active = False
+                self._collect(profile)
+        finally:
+            self._busy.release()
+
+    def _collect(self, profile):
+        with self._lock:
+            if self._stats is None:
+                self._stats = pstats.Stats(profile)
+            else:
+                self._stats.add(profile)
+            if self._seen < self.requests or self.path is not None:
+                return
+            self.path = os.path.join(
+                self.directory,
+                "pyramid_jwt-%d-%d.pstats" % (os.getpid(), int(time.time())),
+            )
+            stats = self._stats
+        if self.policy.profiler is self:
+            self.policy.profiler = None
+        os.makedirs(self.directory, exist_ok=True)
+        stats.dump_stats(self.path)
+        log.warning("Wrote authentication profile to %s", self.path)
+
+
+def profiler_from_settings(policy, settings):
+    directory = settings.get("jwt.profile_dir")
+    if not directory:
+        return
+    requests = int(settings.get("jwt.profile_requests", 100))
+    if asbool(settings.get("jwt.profile_on_start", False)):
+        policy.start_profiling(directory, requests)
+
+    signal_name = settings.get("jwt.profile_signal")
+    if signal_name:
+        signum = getattr(signal, signal_name.upper(), None)
+        if not isinstance(signum, signal.Signals):
+            raise ValueError("Unknown signal %s" % signal_name)
+
+        def handler(signum, frame):
+            policy.start_profiling(directory, requests)
+
+        try:
+            signal.signal(signum, handler)
+        except ValueError:  # Not called from the main thread
+            log.warning("Cannot install a %s handler for profiling", signal_name)
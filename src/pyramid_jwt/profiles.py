@@ -0,0 +1,81 @@
+import datetime
+
+from zope.interface import Interface
+
+
+class IJWTRouteProfiles(Interface):
+    """Marker for the mapping of route names to :class:`RouteProfile`."""
+
+
+class RouteProfile:
+    """Token settings that override the policy for a group of routes.
+
+    Values are normalised once when the profile is added, so applying a
+    profile on a request is only a few attribute lookups. ``None`` means the
+    policy setting is used.
+    """
+
+    def __init__(self, name, audience=None, leeway=None, expiration=None, replay=None):
+        self.name = name
+        self.replay = replay
+        self.audience = audience or None
+        if isinstance(leeway, datetime.timedelta):
+            leeway = leeway.total_seconds()
+        self.leeway = int(leeway) if leeway is not None else None
+        if expiration and not isinstance(expiration, datetime.timedelta):
+            expiration = datetime.timedelta(seconds=int(expiration))
+        self.expiration = expiration or None
+
+
+class RouteProfiles(dict):
+    """Route profiles by route name, tracking the largest leeway."""
+
+    max_leeway = 0
+
+    def add(self, route_name, profile):
+        self[route_name] = profile
+        if profile.leeway is not None and profile.leeway > self.max_leeway:
+            self.max_leeway = profile.leeway
+
+
+def add_jwt_route_profile(
+    config,
+    route_names,
+    audience=None,
+    leeway=None,
+    expiration=None,
+    replay=None,
+    name=None,
+):
+    if isinstance(route_names, str):
+        route_names = [route_names]
+    route_names = list(route_names)
+    if not route_names:
+        raise ValueError("A JWT route profile needs at least one route name")
+    profile = RouteProfile(name or route_names[0], audience, leeway, expiration, replay)
+
+    def register(route_name):
+        registry = config.registry
+        profiles = registry.queryUtility(IJWTRouteProfiles)
+        if profiles is None:
+            profiles = RouteProfiles()
+            registry.registerUtility(profiles, IJWTRouteProfiles)
+        profiles.add(route_name, profile)
+
+    for route_name in route_names:
+        config.action(("jwt-route-profile", route_name), register, args=(route_name,))
+
+
+def get_route_profile(request):
+    route = getattr(request, "matched_route", None)
+    if route is None:
+        return None
+    profiles = request.registry.queryUtility(IJWTRouteProfiles)
+    if profiles is None:
+        return None
+    return profiles.get(route.name)
+
+
+def max_profile_leeway(registry):
+    profiles = registry.queryUtility(IJWTRouteProfiles)
+    return profiles.max_leeway if profiles is not None else 0
@@ -0,0 +1,210 @@
+import secrets
+import sqlite3
+import threading
+import time
+
+import jwt
+
+from .cache import LRUCache
+
+
+class UnknownReferenceError(jwt.InvalidTokenError):
+    pass
+
+
+class MemoryTokenStore:
+    """Keep reference tokens in a dictionary local to this process.
+
+    Expired tokens are dropped when they are looked up, and all of them at
+    most once every ``sweep_interval`` seconds when a token is stored.
+    """
+
+    def __init__(self, sweep_interval=60, clock=None):
+        self.sweep_interval = sweep_interval
+        self.clock = clock if clock is not None else time.time
+        self._tokens = {}
+        self._lock = threading.Lock()
+        self._next_sweep = self.clock() + sweep_interval
+
+    def get(self, handle):
+        entry = self._tokens.get(handle)
+        if entry is None:
+            return None
+        token, expires = entry
+        if expires is not None and expires < self.clock():
+            self.delete(handle)
+            return None
+        return entry
+
+    def set(self, handle, token, expires=None):
+        now = self.clock()
+        with self._lock:
+            if now >= self._next_sweep:
+                self._sweep(now)
+            self._tokens[handle] = (token, expires)
+
+    def _sweep(self, now):
+        self._next_sweep = now + self.sweep_interval
+        expired = [
+            handle
+            for handle, (_, expires) in self._tokens.items()
+            if expires is not None and expires < now
+        ]
+        for handle in expired:
+            del self._tokens[handle]
+
+    def replace(self, handle, old, token, expires=None):
+        """Store a new value only if the current one is ``old``."""
+        with self._lock:
+            entry = self._tokens.get(handle)
+            if entry is None or entry[0] != old:
+                return False
+            self._tokens[handle] = (token, expires)
+            return True
+
+    def delete(self, handle):
+        with self._lock:
+            self._tokens.pop(handle, None)
+
+
+class SQLiteTokenStore:
+    """Keep reference tokens in a SQLite database.
+
+    The database can be shared by all processes on a host, so a token
+    revoked by one worker is unknown to the others once their local
+    cache entry goes stale. Expired tokens are deleted at most once every
+    ``sweep_interval`` seconds when a token is stored.
+    """
+
+    def __init__(self, path, sweep_interval=60, clock=None):
+        self.path = path
+        self.sweep_interval = sweep_interval
+        self.clock = clock if clock is not None else time.time
+        self._next_sweep = self.clock() + sweep_interval
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS jwt_reference_tokens "
+                "(handle TEXT PRIMARY KEY, token TEXT NOT NULL, expires REAL)"
+            )
+
+    def get(self, handle):
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT token, expires FROM jwt_reference_tokens WHERE handle = ?",
+                (handle,),
+            ).fetchone()
+        if row is None:
+            return None
+        token, expires = row
+        if expires is not None and expires < self.clock():
+            self.delete(handle)
+            return None
+        return token, expires
+
+    def set(self, handle, token, expires=None):
+        now = self.clock()
+        with self._lock, self._connection:
+            if now >= self._next_sweep:
+                self._next_sweep = now + self.sweep_interval
+                self._connection.execute(
+                    "DELETE FROM jwt_reference_tokens WHERE expires < ?", (now,)
+                )
+            self._connection.execute(
+                "INSERT OR REPLACE INTO jwt_reference_tokens VALUES (?, ?, ?)",
+                (handle, token, expires),
+            )
+
+    def replace(self, handle, old, token, expires=None):
+        """Store a new value only if the current one is ``old``.
+
+        This is a single UPDATE, so it is atomic across processes sharing
+        the database.
+        """
+        with self._lock, self._connection:
+            cursor = self._connection.execute(
+                "UPDATE jwt_reference_tokens SET token = ?, expires = ? "
+                "WHERE handle = ? AND token = ?",
+                (token, expires, handle, old),
+            )
+        return cursor.rowcount == 1
+
+    def delete(self, handle):
+        with self._lock, self._connection:
+            self._connection.execute(
+                "DELETE FROM jwt_reference_tokens WHERE handle = ?", (handle,)
+            )
+
+
+class ReferenceTokens:
+    """Map opaque handles to signed JWTs.
+
+    Resolved handles are kept in an in-process LRU cache. If ``cache_ttl`` is
+    set cached entries are looked up in the store again after that many
+    seconds, which bounds how long a revocation made by another process can
+    go unnoticed.
+    """
+
+    def __init__(
+        self, store=None, cache_size=1024, cache_ttl=None, handle_bytes=24, clock=None
+    ):
+        self.clock = clock if clock is not None else time.time
+        self.store = store if store is not None else MemoryTokenStore(clock=clock)
+        self.cache = LRUCache(cache_size)
+        self.cache_ttl = cache_ttl
+        self.handle_bytes = handle_bytes
+
+    def issue(self, token, expires=None):
+        handle = secrets.token_urlsafe(self.handle_bytes)
+        self.store.set(handle, token, expires)
+        self._cache(handle, token, expires)
+        return handle
+
+    def resolve(self, handle):
+        entry = self.cache.get(handle)
+        if entry is not None:
+            token, valid_until = entry
+            if valid_until is None or valid_until >= self.clock():
+                return token
+            self.cache.pop(handle)
+
+        entry = self.store.get(handle)
+        if entry is None:
+            return None
+        token, expires = entry
+        self._cache(handle, token, expires)
+        return token
+
+    def revoke(self, handle):
+        self.store.delete(handle)
+        self.cache.pop(handle)
+
+    def _cache(self, handle, token, expires):
+        valid_until = expires
+        if self.cache_ttl is not None:
+            stale_at = self.clock() + self.cache_ttl
+            valid_until = stale_at if expires is None else min(expires, stale_at)
+        self.cache.set(handle, (token, valid_until))
+
+
+def token_store_from_url(url, clock=None):
+    if url == "memory":
+        return MemoryTokenStore(clock=clock)
+    if url.startswith("sqlite://"):
+        return SQLiteTokenStore(url[len("sqlite://") :] or ":memory:", clock=clock)
+    raise ValueError("Unsupported token store %s" % url)
+
+
+def reference_tokens_from_settings(settings, clock=None):
+    store = settings.get("jwt.reference_store")
+    if not store:
+        return None
+
+    cache_ttl = settings.get("jwt.reference_cache_ttl")
+    return ReferenceTokens(
+        token_store_from_url(store, clock),
+        cache_size=int(settings.get("jwt.reference_cache_size", 1024)),
+        cache_ttl=int(cache_ttl) if cache_ttl else None,
+        clock=clock,
+    )
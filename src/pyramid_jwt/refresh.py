@@ -0,0 +1,82 @@
+import json
+import logging
+import secrets
+import time
+
+from .reference import MemoryTokenStore, token_store_from_url
+
+log = logging.getLogger("pyramid_jwt")
+
+# Refresh tokens stay valid for two weeks after they were (re)issued.
+REFRESH_WINDOW = 14 * 24 * 60 * 60
+
+
+class RefreshTokens:
+    """Long-lived, single use refresh tokens.
+
+    Every refresh token belongs to a family that starts at login. Using a
+    refresh token rotates it: a new token from the same family is returned
+    and the old one is marked as used. Presenting a used token again means it
+    was leaked, so the whole family is revoked.
+
+    A token is marked as used with a compare-and-set in the store, so when
+    several processes share the store only one of them can rotate it.
+    """
+
+    def __init__(self, store=None, window=REFRESH_WINDOW, handle_bytes=32, clock=None):
+        self.clock = clock if clock is not None else time.time
+        self.store = store if store is not None else MemoryTokenStore(clock=clock)
+        self.window = window
+        self.handle_bytes = handle_bytes
+
+    def issue(self, principal, claims=None, family=None):
+        handle = secrets.token_urlsafe(self.handle_bytes)
+        record = {
+            "sub": principal,
+            "family": family or secrets.token_urlsafe(16),
+            "claims": claims or {},
+        }
+        self.store.set(handle, json.dumps(record), self.clock() + self.window)
+        return handle
+
+    def rotate(self, handle):
+        entry = self.store.get(handle)
+        if entry is None:
+            return None
+        value, expires = entry
+        record = json.loads(value)
+        family = record["family"]
+        if self.store.get("family:" + family) is not None:
+            return None
+        # Marking the token as used fails if another process rotated it
+        # first, which is treated like any other reuse.
+        if record.get("used") or not self.store.replace(
+            handle, value, json.dumps(dict(record, used=True)), expires
+        ):
+            log.warning("Refresh token reuse detected, revoking family %s", family)
+            self.revoke_family(family)
+            return None
+
+        claims = record["claims"]
+        return record["sub"], claims, self.issue(record["sub"], claims, family)
+
+    def revoke(self, handle):
+        entry = self.store.get(handle)
+        if entry is not None:
+            self.revoke_family(json.loads(entry[0])["family"])
+
+    def revoke_family(self, family):
+        # Tokens of a family are never older than the refresh window, so the
+        # revocation marker does not need to outlive it.
+        self.store.set("family:" + family, "revoked", self.clock() + self.window)
+
+
+def refresh_tokens_from_settings(settings, clock=None):
+    store = settings.get("jwt.refresh_store")
+    if not store:
+        return None
+    return RefreshTokens(
+        token_store_from_url(store, clock),
+        window=int(settings.get("jwt.refresh_window", REFRESH_WINDOW)),
+        clock=clock,
+    )
@@ -0,0 +1,179 @@
+import logging
+import threading
+import time
+from array import array
+
+import jwt
+from pyramid.settings import asbool
+
+log = logging.getLogger("pyramid_jwt")
+
+MASK64 = (1 << 64) - 1
+
+
+class ReplayedTokenError(jwt.InvalidTokenError):
+    pass
+
+
+class _Bucket:
+    # An open addressing hash set of 64 bit integers with linear probing.
+    # Zero marks an empty slot. The table is kept at most half full.
+
+    __slots__ = ("table", "mask", "count", "retain")
+
+    def __init__(self, size=1024):
+        self.table = array("Q", bytes(8 * size))
+        self.mask = size - 1
+        self.count = 0
+        self.retain = 0
+
+    def __contains__(self, key):
+        table = self.table
+        mask = self.mask
+        index = key & mask
+        while True:
+            value = table[index]
+            if value == key:
+                return True
+            if value == 0:
+                return False
+            index = (index + 1) & mask
+
+    def add(self, key):
+        table = self.table
+        mask = self.mask
+        index = key & mask
+        while True:
+            value = table[index]
+            if value == 0:
+                break
+            if value == key:
+                return False
+            index = (index + 1) & mask
+        table[index] = key
+        self.count += 1
+        if self.count * 2 > len(table):
+            self._grow()
+        return True
+
+    def _grow(self):
+        old = self.table
+        self.table = array("Q", bytes(16 * len(old)))
+        self.mask = len(self.table) - 1
+        self.count = 0
+        for key in old:
+            if key:
+                self.add(key)
+
+
+class ReplayCache:
+    """Remember the ``jti`` of seen tokens until they expire.
+
+    Identifiers are stored as 64 bit hashes in :mod:`array` backed hash
+    tables, one per ``bucket_seconds`` of expiry time. The bucket only
+    depends on the ``exp`` claim, so a token is found again whatever leeway
+    it was checked with. Once every token in a bucket has expired, leeway
+    included, the whole bucket is dropped, so no per token expiry
+    bookkeeping is needed. A token costs between 16 and 32 bytes. If
+    ``max_entries`` is set and reached new tokens are refused until buckets
+    expire, so memory use can not grow without bound.
+
+    The hashes are only stable within a process, so a cache can not be
+    shared. Use :class:`SharedReplayStore` for that.
+    """
+
+    def __init__(self, bucket_seconds=60, max_entries=None, clock=None):
+        self.bucket_seconds = int(bucket_seconds)
+        self.max_entries = max_entries
+        self.clock = clock if clock is not None else time.time
+        self._buckets = {}
+        self._count = 0
+        self._next_purge = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def memory(self):
+        return sum(len(b.table) * 8 for b in list(self._buckets.values()))
+
+    def add(self, jti, expires, leeway=0):
+        """Record a token identifier, returning False if it was seen before.
+
+        The identifier is remembered until ``expires + leeway``.
+        """
+        key = (hash(jti) & MASK64) or 1
+        expires = int(expires)
+        index = expires // self.bucket_seconds
+        now = self.clock()
+        with self._lock:
+            if now >= self._next_purge:
+                self._purge(now)
+            bucket = self._buckets.get(index)
+            if bucket is None:
+                bucket = self._buckets[index] = _Bucket()
+            elif key in bucket:
+                return False
+            if self.max_entries is not None and self._count >= self.max_entries:
+                log.warning("Replay cache is full, refusing token %s", jti)
+                return False
+            bucket.add(key)
+            bucket.retain = max(bucket.retain, expires + int(leeway))
+            self._count += 1
+            return True
+
+    def _purge(self, now):
+        for index, bucket in list(self._buckets.items()):
+            if bucket.retain < now:
+                self._count -= self._buckets.pop(index).count
+        self._next_purge = (int(now) // self.bucket_seconds + 1) * self.bucket_seconds
+
+
+class SharedReplayStore:
+    """Record token identifiers in a store shared by several processes.
+
+    ``client`` needs a ``set(name, value, nx=True, exat=expires)`` method
+    that only sets a missing key and returns a true value if it did so, such
+    as a ``redis.Redis`` client.
+    """
+
+    def __init__(self, client, prefix="pyramid_jwt:jti:"):
+        self.client = client
+        self.prefix = prefix
+
+    def add(self, jti, expires, leeway=0):
+        return bool(
+            self.client.set(
+                self.prefix + jti, b"1", nx=True, exat=int(expires) + int(leeway)
+            )
+        )
+
+
+class MemoryReplayClient:
+    """A stand-in for a shared store client, for tests and development."""
+
+    def __init__(self, clock=None):
+        self.clock = clock if clock is not None else time.time
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def set(self, name, value, nx=False, exat=None):
+        now = self.clock()
+        with self._lock:
+            entry = self._data.get(name)
+            if nx and entry is not None and (entry[1] is None or entry[1] > now):
+                return None
+            self._data[name] = (value, exat)
+            return True
+
+
+def replay_store_from_settings(settings, clock=None):
+    if not asbool(settings.get("jwt.replay_protection", False)):
+        return None
+    max_entries = settings.get("jwt.replay_max_entries")
+    return ReplayCache(
+        bucket_seconds=int(settings.get("jwt.replay_bucket_seconds", 60)),
+        max_entries=int(max_entries) if max_entries else None,
+        clock=clock,
+    )
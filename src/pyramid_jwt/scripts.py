@@ -0,0 +1,275 @@
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+
+import jwt
+from jwt.algorithms import get_default_algorithms
+from pyramid.config import Configurator
+
+from .clock import FixedClock
+from .keys import generate_key, public_key_for, serialize_key
+from .policy import JWTAuthenticationPolicy
+from .stats import failure_reason
+
+BENCHMARK_ALGORITHMS = ("HS256", "HS512", "EdDSA", "ES256", "ES384", "RS256", "PS256")
+
+
+def genkey(args):
+    key = generate_key(args.algorithm)
+    private = serialize_key(args.algorithm, key, args.format)
+    public = serialize_key(args.algorithm, public_key_for(key), args.format)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(private)
+        if public is not private:
+            with open(args.output + ".pub", "w") as f:
+                f.write(public)
+    else:
+        print(private)
+        if public is not private:
+            print(public)
+
+
+def _time(function, duration):
+    count = 0
+    start = time.perf_counter()
+    deadline = start + duration
+    while True:
+        function()
+        count += 1
+        now = time.perf_counter()
+        if now >= deadline:
+            return count / (now - start)
+
+
+def benchmark(args):
+    available = get_default_algorithms()
+    print("%-8s %12s %12s" % ("alg", "sign/s", "verify/s"))
+    for algorithm in args.algorithms or BENCHMARK_ALGORITHMS:
+        if algorithm not in available:
+            print("%-8s %12s %12s" % (algorithm, "n/a", "n/a"))
+            continue
+        key = generate_key(algorithm)
+        policy = JWTAuthenticationPolicy(
+            key, public_key_for(key), algorithm=algorithm, expiration=3600
+        )
+        token = policy.create_token("user", roles=["reader", "writer"])
+        sign = _time(lambda: policy.create_token("user", roles=["reader"]), args.time)
+        verify = _time(lambda: policy.jwt_decode(None, token), args.time)
+        print("%-8s %12.0f %12.0f" % (algorithm, sign, verify))
+
+
+def read_tokens(paths):
+    """Yield (source, line number, token) for every token in some files.
+
+    Lines may contain more than a token, for example ``JWT <token>``: the
+    last word of every non-empty line is used.
+    """
+    for path in paths or ["-"]:
+        f = sys.stdin if path == "-" else open(path)
+        try:
+            for number, line in enumerate(f, 1):
+                words = line.split()
+                if words:
+                    yield path, number, words[-1]
+        finally:
+            if f is not sys.stdin:
+                f.close()
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _make_policy(settings, now=None):
+    # Imported here since pyramid_jwt imports this module's package.
+    from . import create_jwt_authentication_policy
+
+    config = Configurator(settings=settings)
+    clock = FixedClock(now) if now is not None else None
+    policy = create_jwt_authentication_policy(config, clock=clock)
+    # Replayed tokens and proofs can not be judged offline.
+    policy.replay_store = None
+    policy.dpop = None
+    return policy
+
+
+def verify_batch(policy, batch):
+    results = []
+    for source, number, token in batch:
+        result = {"source": source, "line": number}
+        try:
+            claims = policy.jwt_verify(None, token)
+        except jwt.InvalidTokenError as e:
+            result.update(valid=False, error=failure_reason(e), message=str(e))
+        else:
+            result.update(valid=True, claims=claims)
+        results.append(result)
+    return results
+
+
+_worker_policy = None
+
+
+def _init_worker(settings, now):
+    global _worker_policy
+    _worker_policy = _make_policy(settings, now)
+
+
+def _verify_in_worker(batch):
+    return verify_batch(_worker_policy, batch)
+
+
+def verify_tokens(tokens, settings, now=None, jobs=1, batch_size=256):
+    """Verify tokens and yield a result per token, in input order.
+
+    With more than one job batches of tokens are verified by a pool of
+    processes, each of which loads the keys once. At most two batches per
+    process are in flight, so memory use does not depend on the number of
+    tokens.
+    """
+    batches = batched(tokens, batch_size)
+    if jobs <= 1:
+        policy = _make_policy(settings, now)
+        for batch in batches:
+            yield from verify_batch(policy, batch)
+        return
+
+    # Pool.imap reads its input as fast as it can, so limit the number of
+    # batches handed out but not yet returned.
+    in_flight = threading.Semaphore(jobs * 2)
+
+    def throttled():
+        for batch in batches:
+            in_flight.acquire()
+            yield batch
+
+    with multiprocessing.Pool(jobs, _init_worker, (settings, now)) as pool:
+        try:
+            for results in pool.imap(_verify_in_worker, throttled()):
+                in_flight.release()
+                yield from results
+        finally:
+            # Do not leave the feeder thread waiting if we stop early.
+            for i in range(jobs * 2):
+                in_flight.release()
+
+
+def _load_settings(args):
+    settings = {}
+    if args.config:
+        from pyramid.paster import get_appsettings
+
+        settings.update(get_appsettings(args.config))
+    options = {
+        "jwt.algorithm": args.algorithm,
+        "jwt.private_key": args.key,
+        "jwt.private_key_file": args.key_file,
+        "jwt.public_key_file": args.public_key_file,
+        "jwt.audience": args.audience,
+        "jwt.leeway": args.leeway,
+    }
+    settings.update((name, value) for name, value in options.items() if value)
+    if not any(
+        settings.get(name)
+        for name in ("jwt.private_key", "jwt.private_key_file", "jwt.public_key_file")
+    ) and not settings.get("jwt.public_key"):
+        raise SystemExit("No key given, use --config, --key or --key-file")
+    return settings
+
+
+def verify(args):
+    settings = _load_settings(args)
+    output = open(args.output, "w") if args.output else sys.stdout
+    counts = {}
+    try:
+        results = verify_tokens(
+            read_tokens(args.files),
+            settings,
+            now=args.now,
+            jobs=args.jobs or os.cpu_count() or 1,
+            batch_size=args.batch_size,
+        )
+        for result in results:
+            outcome = result.get("error", "ok")
+            counts[outcome] = counts.get(outcome, 0) + 1
+            output.write(json.dumps(result, default=str) + "\n")
+        output.flush()
+    except BrokenPipeError:
+        # The reader went away, for example when piping into head. Point
+        # stdout at devnull so flushing it at exit does not fail again.
+        if output is sys.stdout:
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        raise SystemExit(1)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    summary = ", ".join("%s: %d" % item for item in sorted(counts.items()))
+    print(summary or "No tokens", file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="pyramid_jwt")
+    commands = parser.add_subparsers(dest="command")
+    commands.required = True
+
+    parser_genkey = commands.add_parser("genkey", help="Generate a key pair")
+    parser_genkey.add_argument("-a", "--algorithm", default="EdDSA")
+    parser_genkey.add_argument("-f", "--format", choices=("pem", "jwk"), default="pem")
+    parser_genkey.add_argument(
+        "-o",
+        "--output",
+        help="Write the private key to this file and the public key to OUTPUT.pub",
+    )
+    parser_genkey.set_defaults(func=genkey)
+
+    parser_benchmark = commands.add_parser(
+        "benchmark", help="Measure signing and verification speed on this host"
+    )
+    parser_benchmark.add_argument("algorithms", nargs="*")
+    parser_benchmark.add_argument(
+        "-t", "--time", type=float, default=1.0, help="Seconds per measurement"
+    )
+    parser_benchmark.set_defaults(func=benchmark)
+
+    parser_verify = commands.add_parser(
+        "verify", help="Verify tokens read from files or stdin"
+    )
+    parser_verify.add_argument(
+        "files", nargs="*", help="Files with a token per line, - for stdin"
+    )
+    parser_verify.add_argument(
+        "-c", "--config", help="Read the jwt.* settings from this PasteDeploy file"
+    )
+    parser_verify.add_argument("-a", "--algorithm")
+    parser_verify.add_argument("--key", help="Secret or private key")
+    parser_verify.add_argument("--key-file", help="File with the key")
+    parser_verify.add_argument("--public-key-file")
+    parser_verify.add_argument("--audience")
+    parser_verify.add_argument("--leeway")
+    parser_verify.add_argument(
+        "--now", type=float, help="Check expiry at this time instead of now"
+    )
+    parser_verify.add_argument(
+        "-j", "--jobs", type=int, help="Number of processes, the CPU count by default"
+    )
+    parser_verify.add_argument("--batch-size", type=int, default=256)
+    parser_verify.add_argument("-o", "--output", help="Write results to this file")
+    parser_verify.set_defaults(func=verify)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":  # pragma: no cover
+    sys.exit(main())
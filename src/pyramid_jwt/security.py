@@ -0,0 +1,96 @@
+from pyramid.interfaces import IAuthenticationPolicy
+from zope.interface import implementer
+
+try:
+    from pyramid.authorization import ACLHelper, Authenticated, Everyone
+    from pyramid.interfaces import ISecurityPolicy
+    from pyramid.request import RequestLocalCache
+except ImportError:  # pragma: no cover
+    # Pyramid 1.x has no security policies.
+    from pyramid.security import Authenticated, Everyone
+
+    ACLHelper = ISecurityPolicy = RequestLocalCache = None
+
+
+class JWTIdentity:
+    """The identity of an authenticated request."""
+
+    __slots__ = ("userid", "claims", "principals")
+
+    def __init__(self, userid, claims, principals):
+        self.userid = userid
+        self.claims = claims
+        self.principals = principals
+
+    def __repr__(self):
+        return "<JWTIdentity %r>" % (self.userid,)
+
+
+class JWTSecurityPolicy:
+    """A Pyramid 2 security policy using a JWT authentication policy.
+
+    The token is decoded and the callback called at most once per request,
+    when the identity is first needed. ``authenticated_userid`` and
+    ``permits`` only use the cached identity. Permissions are checked with
+    the ACLs of the context, like ``ACLAuthorizationPolicy`` does.
+    """
+
+    def __init__(self, authentication_policy):
+        if RequestLocalCache is None:
+            raise ValueError("JWTSecurityPolicy requires Pyramid 2.0 or later")
+        self.authentication_policy = authentication_policy
+        self.acl = ACLHelper()
+        self._identity_cache = RequestLocalCache(self._load_identity)
+
+    def _load_identity(self, request):
+        policy = self.authentication_policy
+        profiler = policy.profiler
+        if profiler is not None:
+            return profiler.run(request, self._make_identity, request)
+        return self._make_identity(request)
+
+    def _make_identity(self, request):
+        policy = self.authentication_policy
+        claims = request.jwt_claims
+        userid = claims.get("sub")
+        if userid is None:
+            return None
+        principals = [Everyone, Authenticated, userid]
+        if policy.callback is not None:
+            groups = policy.callback(userid, request)
+            if groups is None:
+                return None
+            principals.extend(groups)
+        return JWTIdentity(userid, claims, principals)
+
+    def identity(self, request):
+        return self._identity_cache.get_or_create(request)
+
+    def authenticated_userid(self, request):
+        identity = self.identity(request)
+        return identity.userid if identity is not None else None
+
+    def permits(self, request, context, permission):
+        identity = self.identity(request)
+        principals = identity.principals if identity is not None else [Everyone]
+        return self.acl.permits(context, principals, permission)
+
+    def remember(self, request, userid, **kw):
+        return self.authentication_policy.remember(request, userid, **kw)
+
+    def forget(self, request, **kw):
+        return self.authentication_policy.forget(request)
+
+
+if ISecurityPolicy is not None:
+    JWTSecurityPolicy = implementer(ISecurityPolicy)(JWTSecurityPolicy)
+
+
+def find_authentication_policy(registry):
+    """Return the authentication policy, also if a security policy wraps it."""
+    policy = registry.queryUtility(IAuthenticationPolicy)
+    if policy is None and ISecurityPolicy is not None:
+        policy = registry.queryUtility(ISecurityPolicy)
+        if isinstance(policy, JWTSecurityPolicy):
+            policy = policy.authentication_policy
+    return policy
@@ -0,0 +1,77 @@
+import logging
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+try:
+    import ujson
+except ImportError:  # pragma: no cover
+    ujson = None
+
+log = logging.getLogger("pyramid_jwt")
+
+
+def _orjson_dumps(value):
+    return orjson.dumps(value)
+
+
+def _ujson_dumps(value):
+    return ujson.dumps(value, ensure_ascii=True, escape_forward_slashes=False).encode(
+        "ascii"
+    )
+
+
+def fast_dumps(serializer):
+    """Return a fast ``dumps`` function for a serializer name.
+
+    ``None`` means the standard library encoder should be used, either
+    because that was asked for or because the requested library is not
+    installed.
+    """
+    if not serializer or serializer == "json":
+        return None
+    if serializer in ("auto", "orjson") and orjson is not None:
+        return _orjson_dumps
+    if serializer in ("auto", "ujson") and ujson is not None:
+        return _ujson_dumps
+    if serializer not in ("auto", "orjson", "ujson"):
+        raise ValueError("Unknown JSON serializer %s" % serializer)
+    if serializer != "auto":
+        log.warning("%s is not installed, using the json module instead", serializer)
+    return None
+
+
+def is_plain(value):
+    """Check if a value is encoded identically by every serializer.
+
+    That holds for dictionaries, lists, booleans, None, 64 bit integers and
+    printable ASCII strings. Anything else, including floats and objects that
+    need a JSON adapter, has to go through the standard library encoder.
+    """
+    value_type = type(value)
+    if value_type is str:
+        if not value.isprintable():
+            return False
+        # str.isascii() needs Python 3.7.
+        try:
+            value.encode("ascii")
+        except UnicodeEncodeError:
+            return False
+        return True
+    if value_type is int:
+        return -(2**63) <= value < 2**64
+    if value_type is bool or value is None:
+        return True
+    if value_type is dict:
+        for key, item in value.items():
+            if type(key) is not str or not is_plain(key) or not is_plain(item):
+                return False
+        return True
+    if value_type is list or value_type is tuple:
+        for item in value:
+            if not is_plain(item):
+                return False
+        return True
+    return False
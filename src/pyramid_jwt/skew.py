@@ -0,0 +1,155 @@
+import datetime
+from array import array
+from bisect import bisect_left
+
+from pyramid.settings import asbool
+
+from .cache import LRUCache
+
+# Upper bounds, in seconds, of the histogram buckets for iat - now. The last
+# bucket holds everything above 300 seconds.
+SKEW_BUCKETS = (-300, -120, -60, -30, -10, -5, -2, -1, 0, 1, 2, 5, 10, 30, 60, 120, 300)
+
+
+def _seconds(value):
+    if isinstance(value, datetime.timedelta):
+        return value.total_seconds()
+    return value
+
+
+class SkewHistogram:
+    """Rolling histogram of the clock skew seen from one client.
+
+    Counts are kept for the current and the previous window, so the
+    histogram covers between one and two windows of recent tokens and never
+    grows.
+    """
+
+    __slots__ = ("window", "started", "current", "previous")
+
+    def __init__(self, window, now):
+        self.window = window
+        self.started = now
+        self.current = array("I", bytes(4 * (len(SKEW_BUCKETS) + 1)))
+        self.previous = array("I", bytes(4 * (len(SKEW_BUCKETS) + 1)))
+
+    def _rotate(self, now):
+        if now - self.started < self.window:
+            return
+        if now - self.started < 2 * self.window:
+            self.previous = self.current
+        else:
+            self.previous = array("I", bytes(len(self.current) * 4))
+        self.current = array("I", bytes(len(self.current) * 4))
+        self.started = now
+
+    def add(self, skew, now):
+        self._rotate(now)
+        self.current[bisect_left(SKEW_BUCKETS, skew)] += 1
+
+    def counts(self, now):
+        self._rotate(now)
+        return [a + b for a, b in zip(self.current, self.previous)]
+
+    @staticmethod
+    def percentile(counts, fraction):
+        """Return the upper bound of the bucket holding a percentile."""
+        total = sum(counts)
+        if not total:
+            return None
+        seen = 0
+        for index, count in enumerate(counts):
+            seen += count
+            if seen >= total * fraction:
+                if index < len(SKEW_BUCKETS):
+                    return SKEW_BUCKETS[index]
+                return float("inf")
+
+
+class SkewMonitor:
+    """Measure how far the ``iat`` of tokens is from the current time.
+
+    Tokens are grouped by client: their ``iss`` claim, or the address of the
+    request if there is none. Tokens issued by this application only show
+    their age, but tokens from an issuer whose clock runs ahead have an
+    ``iat`` in the future.
+
+    With ``max_leeway`` set the leeway for a client is raised to the 95th
+    percentile of its skew, up to ``max_leeway`` seconds, once
+    ``min_samples`` tokens were seen. Otherwise the monitor only measures.
+
+    Like :class:`pyramid_jwt.stats.DecodeStats` the histograms are updated
+    without a lock, so a few tokens may go uncounted when many threads
+    record tokens of the same client at once.
+    """
+
+    def __init__(self, window=300, max_clients=1024, max_leeway=None, min_samples=20):
+        self.window = window
+        self.max_leeway = max_leeway
+        self.min_samples = min_samples
+        self.clients = LRUCache(max_clients)
+
+    @staticmethod
+    def client(request, claims):
+        issuer = claims.get("iss")
+        if isinstance(issuer, str):
+            return issuer
+        return request.remote_addr if request is not None else None
+
+    def observe(self, request, claims, now):
+        """Record the skew of a verified token."""
+        iat = claims.get("iat")
+        if type(iat) is not int:
+            return
+        client = self.client(request, claims)
+        histogram = self.clients.get(client)
+        if histogram is None:
+            histogram = SkewHistogram(self.window, now)
+            self.clients.set(client, histogram)
+        histogram.add(iat - now, now)
+
+    def leeway(self, request, claims, now, leeway):
+        """Return the leeway to use for a token of a client."""
+        if self.max_leeway is None:
+            return leeway
+        histogram = self.clients.peek(self.client(request, claims))
+        if histogram is None:
+            return leeway
+        counts = histogram.counts(now)
+        if sum(counts) < self.min_samples:
+            return leeway
+        skew = SkewHistogram.percentile(counts, 0.95)
+        if skew <= _seconds(leeway):
+            return leeway
+        return min(skew, self.max_leeway)
+
+    def metrics(self, now, top=10):
+        entries = [
+            (client, histogram.counts(now))
+            for client, histogram in self.clients.items()
+        ]
+        entries.sort(key=lambda entry: -sum(entry[1]))
+        result = {}
+        for client, counts in entries[:top]:
+            buckets = ["<=%d" % bound for bound in SKEW_BUCKETS] + [
+                ">%d" % SKEW_BUCKETS[-1]
+            ]
+            result[str(client)] = {
+                "tokens": sum(counts),
+                "skew": dict(zip(buckets, counts)),
+                "p50": SkewHistogram.percentile(counts, 0.5),
+                "p95": SkewHistogram.percentile(counts, 0.95),
+            }
+        return result
+
+
+def skew_monitor_from_settings(settings):
+    max_leeway = settings.get("jwt.leeway_max")
+    if not (asbool(settings.get("jwt.skew_tracking", False)) or max_leeway):
+        return None
+    return SkewMonitor(
+        window=int(settings.get("jwt.skew_window", 300)),
+        max_clients=int(settings.get("jwt.skew_clients", 1024)),
+        max_leeway=int(max_leeway) if max_leeway else None,
+        min_samples=int(settings.get("jwt.skew_min_samples", 20)),
+    )
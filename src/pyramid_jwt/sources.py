@@ -0,0 +1,120 @@
+from pyramid.settings import aslist
+
+from .policy import marker
+
+
+class CredentialSource:
+    """A place in the request a token can be read from.
+
+    ``probe`` must be cheap: it only looks for the presence of a token and
+    returns it, verification is left to the policy. ``algorithms`` and
+    ``audience`` override the policy settings for tokens found here.
+    """
+
+    name = None
+    # Whether tokens from this source are reissued by the cookie policy.
+    reissue = False
+
+    def __init__(self, name=None, algorithms=None, audience=marker):
+        if name is not None:
+            self.name = name
+        self.algorithms = algorithms
+        self.audience = audience
+
+    def probe(self, policy, request):
+        raise NotImplementedError
+
+    def check(self, policy):
+        """Raise ValueError if this source can not be used with a policy."""
+
+
+class AuthorizationHeaderSource(CredentialSource):
+    name = "authorization"
+
+    def __init__(self, auth_type="JWT", **kw):
+        super().__init__(**kw)
+        self.auth_type = auth_type
+
+    def probe(self, policy, request):
+        if "HTTP_AUTHORIZATION" not in request.environ:
+            return None
+        try:
+            authorization = request.authorization
+        except ValueError:  # Invalid Authorization header
+            return None
+        if authorization is None:
+            return None
+        auth_type, token = authorization
+        if auth_type != self.auth_type:
+            return None
+        return token
+
+
+class HeaderSource(CredentialSource):
+    def __init__(self, header, **kw):
+        kw.setdefault("name", "header:" + header)
+        super().__init__(**kw)
+        self.header = header
+        self.environ_key = "HTTP_" + header.upper().replace("-", "_")
+
+    def probe(self, policy, request):
+        return request.environ.get(self.environ_key) or None
+
+
+class QueryParamSource(CredentialSource):
+    def __init__(self, param="access_token", **kw):
+        kw.setdefault("name", "query:" + param)
+        super().__init__(**kw)
+        self.param = param
+
+    def probe(self, policy, request):
+        if self.param not in request.environ.get("QUERY_STRING", ""):
+            return None
+        return request.GET.get(self.param) or None
+
+
+class CookieSource(CredentialSource):
+    """Read a token from a cookie.
+
+    Without a ``cookie_name`` the cookie of a
+    :class:`JWTCookieAuthenticationPolicy` is used, including its encoding
+    and support for chunked cookies, and the cookie policy reissues it. A
+    named cookie must contain the token as-is and is never reissued.
+    """
+
+    def __init__(self, cookie_name=None, **kw):
+        kw.setdefault("name", "cookie:" + cookie_name if cookie_name else "cookie")
+        super().__init__(**kw)
+        self.cookie_name = cookie_name
+        self.reissue = cookie_name is None
+
+    def check(self, policy):
+        if self.cookie_name is None and not hasattr(policy, "_get_cookie_value"):
+            raise ValueError(
+                "A cookie credential source needs a cookie name unless it is "
+                "used with JWTCookieAuthenticationPolicy"
+            )
+
+    def probe(self, policy, request):
+        if "HTTP_COOKIE" not in request.environ:
+            return None
+        if self.cookie_name is None:
+            return policy._get_cookie_value(request)
+        return request.cookies.get(self.cookie_name) or None
+
+
+def sources_from_settings(value, auth_type="JWT"):
+    sources = []
+    for spec in aslist(value):
+        kind, _, arg = spec.partition(":")
+        if kind == "authorization":
+            sources.append(AuthorizationHeaderSource(arg or auth_type))
+        elif kind == "header" and arg:
+            sources.append(HeaderSource(arg))
+        elif kind == "query":
+            sources.append(QueryParamSource(arg or "access_token"))
+        elif kind == "cookie":
+            sources.append(CookieSource(arg or None))
+        else:
+            raise ValueError("Invalid credential source %s" % spec)
+    return sources
@@ -0,0 +1,75 @@
+# States of cookie reissuing within a request.
+REISSUE_PENDING = 0  # Not looked at yet.
+REISSUE_CHECKED = 1  # Checked, the token did not need reissuing.
+REISSUE_SCHEDULED = 2  # A new cookie will be added to the response.
+REISSUE_REVOKED = 3  # The cookie was remembered or forgotten, never reissue.
+
+
+class RequestState:
+    """Everything the JWT policies remember about a request.
+
+    One instance is created per request, on first use, and stored as
+    ``request._jwt_state``.
+    """
+
+    __slots__ = (
+        "credentials",
+        "verified",
+        "replay_checked",
+        "proof_checked",
+        "claims",
+        "profiled",
+        "reissue",
+        "reissue_headers",
+    )
+
+    def __init__(self):
+        self.credentials = None
+        self.verified = None
+        self.replay_checked = None
+        self.proof_checked = None
+        self.claims = None
+        self.profiled = False
+        self.reissue = REISSUE_PENDING
+        self.reissue_headers = None
+
+    def start_reissue(self):
+        """Return True if the token of the request may be reissued."""
+        if self.reissue != REISSUE_PENDING:
+            return False
+        self.reissue = REISSUE_CHECKED
+        return True
+
+    def schedule_reissue(self, request, headers):
+        if self.reissue > REISSUE_CHECKED:
+            return
+        self.reissue = REISSUE_SCHEDULED
+        self.reissue_headers = headers
+        request.add_response_callback(add_reissue_headers)
+
+    def revoke_reissue(self):
+        self.reissue = REISSUE_REVOKED
+        self.reissue_headers = None
+
+    @property
+    def reissued(self):
+        return self.reissue == REISSUE_SCHEDULED
+
+
+def request_state(request):
+    try:
+        return request._jwt_state
+    except AttributeError:
+        state = request._jwt_state = RequestState()
+        return state
+
+
+# Shared by all requests, so scheduling a reissue does not create a closure.
+# Applications used to revoke the reissue by setting
+# request._jwt_cookie_reissue_revoked, which is still honoured.
+def add_reissue_headers(request, response):
+    state = request._jwt_state
+    if state.reissue == REISSUE_SCHEDULED and not hasattr(
+        request, "_jwt_cookie_reissue_revoked"
+    ):
+        response.headerlist.extend(state.reissue_headers)
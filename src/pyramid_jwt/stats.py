@@ -0,0 +1,161 @@
+import threading
+import time
+
+import jwt
+from pyramid.httpexceptions import HTTPNotFound
+from pyramid.settings import asbool
+
+from .dpop import InvalidProofError
+from .reference import UnknownReferenceError
+from .replay import ReplayCache, ReplayedTokenError
+from .security import find_authentication_policy
+
+# Reasons are reported by name. Checked in order, so subclasses come first.
+REASONS = (
+    (UnknownReferenceError, "unknown_reference"),
+    (ReplayedTokenError, "replayed"),
+    (InvalidProofError, "invalid_proof"),
+    (jwt.ExpiredSignatureError, "expired"),
+    (jwt.ImmatureSignatureError, "immature"),
+    (jwt.InvalidSignatureError, "invalid_signature"),
+    (jwt.InvalidAlgorithmError, "invalid_algorithm"),
+    (jwt.InvalidAudienceError, "invalid_audience"),
+    (jwt.MissingRequiredClaimError, "missing_claim"),
+    (jwt.DecodeError, "malformed"),
+)
+
+
+def failure_reason(error):
+    for error_type, reason in REASONS:
+        if isinstance(error, error_type):
+            return reason
+    return "invalid"
+
+
+class TopCounter:
+    """Approximate the most frequent keys with a fixed amount of memory.
+
+    This is the space-saving algorithm: at most ``capacity`` keys are
+    tracked, and a new key replaces the one with the lowest count, inheriting
+    that count. Counts can therefore be overestimated, but a key that occurs
+    more often than ``total / capacity`` times is never lost.
+    """
+
+    def __init__(self, capacity=32):
+        self.capacity = capacity
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def add(self, key):
+        with self._lock:
+            counts = self._counts
+            if key in counts:
+                counts[key] += 1
+            elif len(counts) < self.capacity:
+                counts[key] = 1
+            else:
+                smallest = min(counts, key=counts.get)
+                counts[key] = counts.pop(smallest) + 1
+
+    def most_common(self, n=None):
+        with self._lock:
+            items = sorted(self._counts.items(), key=lambda item: -item[1])
+        return items[:n] if n is not None else items
+
+    def clear(self):
+        with self._lock:
+            self._counts.clear()
+
+
+class DecodeStats:
+    """Counters for token verification, kept by every policy.
+
+    Incrementing a counter is a dictionary update without a lock, so counts
+    may be slightly low when many threads update the same counter at once.
+    Only failures, which are rare in normal operation, take a lock to track
+    the client addresses they come from.
+    """
+
+    def __init__(self, top_size=32):
+        self.outcomes = {}
+        self.reissued = 0
+        self.failing_addresses = TopCounter(top_size)
+        self.started = time.time()
+
+    def success(self):
+        self.outcomes["ok"] = self.outcomes.get("ok", 0) + 1
+
+    def failure(self, reason, address=None):
+        self.outcomes[reason] = self.outcomes.get(reason, 0) + 1
+        if address:
+            self.failing_addresses.add(address)
+
+    def reset(self):
+        self.outcomes = {}
+        self.reissued = 0
+        self.failing_addresses.clear()
+        self.started = time.time()
+
+
+def _cache_stats(cache):
+    lookups = cache.hits + cache.misses
+    return {
+        "size": len(cache),
+        "maxsize": cache.maxsize,
+        "hits": cache.hits,
+        "misses": cache.misses,
+        "hit_rate": cache.hits / lookups if lookups else None,
+    }
+
+
+def policy_stats(policy, top=10):
+    stats = policy.stats
+    outcomes = dict(stats.outcomes)
+    result = {
+        "policy": policy.__class__.__name__,
+        "since": stats.started,
+        "decoded": sum(outcomes.values()),
+        "outcomes": outcomes,
+        "reissued": stats.reissued,
+        "failing_addresses": [
+            {"address": address, "failures": count}
+            for address, count in stats.failing_addresses.most_common(top)
+        ],
+        "caches": {},
+    }
+    if policy.reference_tokens is not None:
+        result["caches"]["reference_tokens"] = _cache_stats(
+            policy.reference_tokens.cache
+        )
+    if policy.encryption is not None:
+        result["caches"]["decrypted_tokens"] = _cache_stats(policy.encryption.cache)
+    if isinstance(policy.replay_store, ReplayCache):
+        result["replay_cache"] = {
+            "entries": len(policy.replay_store),
+            "memory": policy.replay_store.memory,
+        }
+    if policy.skew_monitor is not None:
+        result["clock_skew"] = policy.skew_monitor.metrics(policy.clock(), top)
+    return result
+
+
+def stats_view(request):
+    from .policy import JWTAuthenticationPolicy  # circular import
+
+    policy = find_authentication_policy(request.registry)
+    if not isinstance(policy, JWTAuthenticationPolicy):
+        raise HTTPNotFound()
+    if request.method == "POST" and asbool(request.params.get("reset")):
+        policy.stats.reset()
+    return policy_stats(policy)
+
+
+def add_stats_view(config, path, permission):
+    config.add_route("pyramid_jwt.stats", path)
+    config.add_view(
+        stats_view,
+        route_name="pyramid_jwt.stats",
+        renderer="json",
+        permission=permission,
+        http_cache=0,
+    )
@@ -0,0 +1,166 @@
+import threading
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from webob import Request
+
+from pyramid_jwt.algorithms import (
+    VerifierPool,
+    verification_keys_from_settings,
+    verify_audience,
+)
+from pyramid_jwt.policy import JWTAuthenticationPolicy
+
+
+@pytest.fixture(scope="module")
+def ec_keys():
+    private_key = ec.generate_private_key(ec.SECP256R1())
+    private_pem = private_key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    )
+    public_pem = private_key.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+    return private_pem, public_pem
+
+
+def claims_for(policy, token):
+    request = Request.blank("/")
+    request.authorization = ("JWT", token)
+    return policy.get_claims(request)
+
+
+def test_mixed_fleet(ec_keys):
+    private_pem, public_pem = ec_keys
+    old = JWTAuthenticationPolicy("secret", algorithm="HS512")
+    new = JWTAuthenticationPolicy(
+        private_pem,
+        public_pem,
+        algorithm="ES256",
+        verification_keys={"HS512": "secret"},
+    )
+    assert claims_for(new, old.create_token("old"))["sub"] == "old"
+    assert claims_for(new, new.create_token("new"))["sub"] == "new"
+
+
+def test_unlisted_algorithm_rejected():
+    policy = JWTAuthenticationPolicy("secret", verification_keys={"HS256": "secret"})
+    token = jwt.encode({"sub": "user"}, "secret", algorithm="HS384")
+    assert claims_for(policy, token) == {}
+
+
+def test_none_algorithm_rejected():
+    policy = JWTAuthenticationPolicy("secret", verification_keys={"HS256": "secret"})
+    token = jwt.encode({"sub": "user"}, None, algorithm="none")
+    assert claims_for(policy, token) == {}
+
+
+def test_wrong_key_rejected():
+    policy = JWTAuthenticationPolicy("secret", verification_keys={"HS256": "other"})
+    token = jwt.encode({"sub": "user"}, "secret", algorithm="HS256")
+    assert claims_for(policy, token) == {}
+
+
+def test_tampered_payload_rejected():
+    policy = JWTAuthenticationPolicy("secret", verification_keys={"HS256": "secret"})
+    header, payload, signature = policy.create_token("user").split(".")
+    forged = JWTAuthenticationPolicy("other").create_token("admin").split(".")[1]
+    assert claims_for(policy, ".".join([header, forged, signature])) == {}
+    assert claims_for(policy, "garbage") == {}
+    assert claims_for(policy, "a.b.c") == {}
+
+
+def test_restrict_algorithms():
+    pool = VerifierPool({"HS256": "secret", "HS512": "secret"})
+    token = jwt.encode({"sub": "user"}, "secret", algorithm="HS256")
+    assert pool.verify(token)["sub"] == "user"
+    with pytest.raises(jwt.InvalidAlgorithmError):
+        pool.verify(token, algorithms=["HS512"])
+
+
+def test_unsupported_algorithm():
+    with pytest.raises(NotImplementedError):
+        VerifierPool({"SHA1": "secret"})
+
+
+def test_threads_share_pool():
+    pool = VerifierPool({"HS256": "secret"})
+    tokens = [
+        jwt.encode({"sub": str(i)}, "secret", algorithm="HS256") for i in range(50)
+    ]
+    errors = []
+
+    def worker():
+        try:
+            for i, token in enumerate(tokens):
+                assert pool.verify(token)["sub"] == str(i)
+        except Exception as e:  # pragma: no cover
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+
+
+def test_verify_audience():
+    verify_audience({}, None)
+    verify_audience({"aud": "a"}, "a")
+    verify_audience({"aud": ["a", "b"]}, ["c", "b"])
+    with pytest.raises(jwt.InvalidAudienceError):
+        verify_audience({"aud": "a"}, None)
+    with pytest.raises(jwt.MissingRequiredClaimError):
+        verify_audience({}, "a")
+    with pytest.raises(jwt.InvalidAudienceError):
+        verify_audience({"aud": "a"}, "b")
+    with pytest.raises(jwt.InvalidAudienceError):
+        verify_audience({"aud": 1}, "a")
+
+
+def test_from_settings(ec_keys):
+    assert verification_keys_from_settings({}) is None
+    keys = verification_keys_from_settings(
+        {
+            "jwt.verification_algorithms": "ES256 HS256",
+            "jwt.public_key.ES256": ec_keys[1],
+            "jwt.public_key.HS256": "secret",
+        }
+    )
+    assert keys["HS256"] == "secret"
+    assert keys["ES256"].public_numbers() == (
+        serialization.load_pem_public_key(ec_keys[1]).public_numbers()
+    )
+    with pytest.raises(ValueError):
+        verification_keys_from_settings({"jwt.verification_algorithms": "ES256"})
+
+
+def test_from_settings_validates_keys(ec_keys):
+    with pytest.raises(ValueError):
+        verification_keys_from_settings(
+            {
+                "jwt.verification_algorithms": "ES384",
+                "jwt.public_key.ES384": ec_keys[1],
+            }
+        )
+
+
+def test_from_settings_key_file(ec_keys, tmp_path):
+    (tmp_path / "key.pub").write_bytes(ec_keys[1])
+    (tmp_path / "secret").write_text("secret\n")
+    keys = verification_keys_from_settings(
+        {
+            "jwt.verification_algorithms": "ES256 HS256",
+            "jwt.public_key_file.ES256": str(tmp_path / "key.pub"),
+            "jwt.public_key_file.HS256": str(tmp_path / "secret"),
+        }
+    )
+    assert keys["HS256"] == b"secret"
+    private_key = serialization.load_pem_private_key(ec_keys[0], password=None)
+    token = jwt.encode({"sub": "user"}, private_key, algorithm="ES256")
+    assert jwt.decode(token, keys["ES256"], algorithms=["ES256"]) == {"sub": "user"}
@@ -0,0 +1,89 @@
+import time
+
+import jwt
+from webob import Request
+
+from pyramid_jwt.clock import CoarseClock, FixedClock
+from pyramid_jwt.policy import JWTAuthenticationPolicy
+
+
+def claims_for(policy, token):
+    request = Request.blank("/")
+    request.authorization = ("JWT", token)
+    return policy.get_claims(request)
+
+
+def test_fixed_clock():
+    clock = FixedClock(1000)
+    assert clock() == 1000
+    clock.tick(5)
+    assert clock() == 1005
+
+
+def test_coarse_clock_updates_in_background():
+    ticks = iter(range(100, 10000))
+    clock = CoarseClock(resolution=0.01, source=lambda: next(ticks))
+    first = clock()
+    time.sleep(0.1)
+    assert clock() > first
+
+
+def test_coarse_clock_is_integer():
+    clock = CoarseClock(resolution=60)
+    assert isinstance(clock(), int)
+    assert abs(clock() - time.time()) < 2
+
+
+def test_create_token_uses_clock():
+    policy = JWTAuthenticationPolicy("secret", expiration=10, clock=FixedClock(1000))
+    claims = jwt.decode(
+        policy.create_token(15),
+        "secret",
+        algorithms=["HS512"],
+        options={"verify_exp": False, "verify_iat": False},
+    )
+    assert claims["iat"] == 1000
+    assert claims["exp"] == 1010
+
+
+def test_expiry_uses_clock():
+    clock = FixedClock(1000)
+    policy = JWTAuthenticationPolicy("secret", expiration=10, clock=clock)
+    token = policy.create_token(15)
+    clock.tick(9)
+    assert claims_for(policy, token)["sub"] == 15
+    clock.tick(1)
+    assert claims_for(policy, token) == {}
+
+
+def test_leeway_uses_clock():
+    clock = FixedClock(1000)
+    policy = JWTAuthenticationPolicy("secret", expiration=10, leeway=5, clock=clock)
+    token = policy.create_token(15)
+    clock.tick(14)
+    assert claims_for(policy, token)["sub"] == 15
+    clock.tick(1)
+    assert claims_for(policy, token) == {}
+
+
+def test_token_from_the_future():
+    clock = FixedClock(1000)
+    policy = JWTAuthenticationPolicy("secret", clock=clock)
+    token = policy.create_token(15)
+    clock.tick(-10)
+    assert claims_for(policy, token) == {}
+
+
+def test_not_before():
+    clock = FixedClock(1000)
+    policy = JWTAuthenticationPolicy("secret", clock=clock)
+    token = policy.create_token(15, nbf=1010)
+    assert claims_for(policy, token) == {}
+    clock.tick(10)
+    assert claims_for(policy, token)["sub"] == 15
+
+
+def test_invalid_time_claim():
+    policy = JWTAuthenticationPolicy("secret", clock=FixedClock(1000))
+    token = policy.create_token(15, nbf="soon")
+    assert claims_for(policy, token) == {}
@@ -0,0 +1,76 @@
+import threading
+
+import jwt
+from pyramid.config import Configurator
+from pyramid.renderers import JSON
+from pyramid.threadlocal import manager
+
+from pyramid_jwt import create_jwt_authentication_policy
+from pyramid_jwt.policy import JWTAuthenticationPolicy
+
+
+class Claim:
+    pass
+
+
+def make_policy(label):
+    renderer = JSON()
+    renderer.add_adapter(Claim, lambda obj, request: label)
+    config = Configurator()
+    config.include("pyramid_jwt")
+    config.add_renderer("json", renderer)
+    config.commit()
+    return create_jwt_authentication_policy(config, "secret")
+
+
+def decode(token):
+    return jwt.decode(token, "secret", algorithms=["HS512"])
+
+
+def test_create_token_across_registries():
+    policies = {label: make_policy(label) for label in ("first", "second", "third")}
+    errors = []
+    barrier = threading.Barrier(12)
+
+    def worker(label):
+        policy = policies[label]
+        barrier.wait()
+        try:
+            for _ in range(200):
+                assert (
+                    decode(policy.create_token("user", claim=Claim()))["claim"] == label
+                )
+        except Exception as e:  # pragma: no cover
+            errors.append(e)
+
+    threads = [
+        threading.Thread(target=worker, args=(label,)) for label in list(policies) * 4
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+
+
+def test_include_leaves_shared_factory_alone():
+    from pyramid_jwt.policy import json_encoder_factory
+
+    make_policy("first")
+    assert json_encoder_factory.registry is None
+
+
+def test_default_factory_uses_current_registry():
+    config = Configurator()
+    renderer = JSON()
+    renderer.add_adapter(Claim, lambda obj, request: "current")
+    config.add_renderer("json", renderer)
+    config.commit()
+    policy = JWTAuthenticationPolicy("secret")
+
+    manager.push({"registry": config.registry, "request": None})
+    try:
+        token = policy.create_token("user", claim=Claim())
+    finally:
+        manager.pop()
+    assert decode(token)["claim"] == "current"
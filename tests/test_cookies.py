@@ -6,6 +6,7 @@ from pyramid.interfaces import IAuthenticationPolicy
 from webob import Request
 from zope.interface.verify import verifyObject
 
+from pyramid_jwt.clock import FixedClock
 from pyramid_jwt.policy import JWTCookieAuthenticationPolicy
 
 
@@ -102,18 +103,157 @@ def test_cookie_max_age(principal):
     assert "expires" in meta
 
 
-@pytest.mark.freeze_time
-def test_expired_token(principal, freezer):
+def test_expired_token(principal):
+    clock = FixedClock()
     dummy_request = Request.blank("/")
-    policy = JWTCookieAuthenticationPolicy("secret", cookie_name="auth", expiration=1)
+    policy = JWTCookieAuthenticationPolicy(
+        "secret", cookie_name="auth", expiration=1, clock=clock
+    )
     token = policy.create_token(principal)
     _, cookie = policy.remember(dummy_request, token).pop()
     name, value = cookie.split("=", 1)
 
-    freezer.tick(delta=2)
+    clock.tick(2)
 
     value, _ = value.split(";", 1)
     dummy_request.cookies = {name: value}
     claims = policy.get_claims(dummy_request)
 
     assert claims == {}
+
+
+def _cookie_pairs(headers):
+    pairs = {}
+    for _, cookie in headers:
+        name, value = cookie.split(";", 1)[0].split("=", 1)
+        pairs[name] = value
+    return pairs
+
+
+def test_large_token_split_in_chunks(principal):
+    dummy_request = Request.blank("/")
+    policy = JWTCookieAuthenticationPolicy("secret", cookie_name="auth")
+    token = policy.create_token(principal, blob="x" * 8000)
+    headers = policy.remember(dummy_request, token)
+
+    cookies = _cookie_pairs(headers)
+    assert sorted(cookies) == ["auth.0", "auth.1", "auth.2", "auth.3"]
+    assert all(len(cookie) <= 4093 for cookie in cookies.values())
+
+    dummy_request.cookies = cookies
+    assert policy.get_token(dummy_request) == token
+    assert policy.get_claims(dummy_request)["sub"] == principal
+
+
+def test_missing_chunk_is_rejected(principal):
+    dummy_request = Request.blank("/")
+    policy = JWTCookieAuthenticationPolicy("secret", cookie_name="auth")
+    token = policy.create_token(principal, blob="x" * 8000)
+    cookies = _cookie_pairs(policy.remember(dummy_request, token))
+    del cookies["auth.1"]
+
+    dummy_request.cookies = cookies
+    assert policy.get_token(dummy_request) is None
+    assert policy.get_claims(dummy_request) == {}
+
+
+def test_small_token_clears_stale_chunks(principal):
+    dummy_request = Request.blank("/")
+    policy = JWTCookieAuthenticationPolicy("secret", cookie_name="auth")
+    dummy_request.cookies = {"auth.0": "a", "auth.1": "b"}
+    headers = policy.remember(dummy_request, policy.create_token(principal))
+
+    assert [cookie.split("=", 1)[0] for _, cookie in headers] == [
+        "auth",
+        "auth.0",
+        "auth.1",
+    ]
+    assert "Max-Age=0" not in headers[0][1]
+    assert all("Max-Age=0" in cookie for _, cookie in headers[1:])
+
+
+def test_chunked_token_clears_single_cookie(principal):
+    dummy_request = Request.blank("/")
+    policy = JWTCookieAuthenticationPolicy("secret", cookie_name="auth")
+    dummy_request.cookies = {"auth": "a", "auth.5": "b"}
+    token = policy.create_token(principal, blob="x" * 4000)
+    headers = policy.remember(dummy_request, token)
+
+    expired = [c.split("=", 1)[0] for _, c in headers if "Max-Age=0" in c]
+    assert expired == ["auth", "auth.5"]
+
+
+def test_forget_clears_chunks():
+    dummy_request = Request.blank("/")
+    policy = JWTCookieAuthenticationPolicy("secret", cookie_name="auth")
+    dummy_request.cookies = {"auth.0": "a", "auth.1": "b", "other": "c"}
+    headers = policy.forget(dummy_request)
+
+    names = [cookie.split("=", 1)[0] for _, cookie in headers]
+    assert names == ["auth", "auth.0", "auth.1"]
+    assert all("Max-Age=0" in cookie for _, cookie in headers)
+
+
+def test_stale_chunk_profiles_are_not_kept():
+    dummy_request = Request.blank("/")
+    policy = JWTCookieAuthenticationPolicy("secret", cookie_name="auth")
+    dummy_request.cookies = {"auth.%d" % index: "x" for index in range(3, 100)}
+    headers = policy.forget(dummy_request)
+
+    names = {cookie.split("=", 1)[0] for _, cookie in headers}
+    assert names == {"auth"} | {"auth.%d" % index for index in range(3, 16)}
+    assert policy._chunk_profiles == {}
+
+
+def _reissue(policy, claims):
+    return policy.reissue_callback(None, claims["sub"], **claims)
+
+
+def test_reissue_splices_times(principal):
+    clock = FixedClock(1000)
+    policy = JWTCookieAuthenticationPolicy(
+        "secret", expiration=60, reissue_time=10, clock=clock, audience="app"
+    )
+    token = policy.create_token(principal, roles=["a", "b"], profile={"x": "é"})
+    claims = policy.jwt_decode(Request.blank("/"), token)
+    clock.tick(30)
+    reissued = _reissue(policy, claims)
+    new_claims = policy.jwt_decode(Request.blank("/"), reissued)
+    assert new_claims == dict(claims, iat=1030, exp=1090)
+    expected = policy.create_token(principal, roles=["a", "b"], profile={"x": "é"})
+    assert policy.jwt_decode(Request.blank("/"), expected) == new_claims
+
+
+def test_reissue_reuses_template(principal, monkeypatch):
+    clock = FixedClock(1000)
+    policy = JWTCookieAuthenticationPolicy(
+        "secret", expiration=60, reissue_time=10, clock=clock
+    )
+    claims = policy.jwt_decode(Request.blank("/"), policy.create_token(principal))
+    _reissue(policy, claims)
+    monkeypatch.setattr(policy, "create_token", None)
+    clock.tick(10)
+    reissued = _reissue(policy, claims)
+    assert policy._reissue_templates.hits == 1
+    assert policy.jwt_decode(Request.blank("/"), reissued)["iat"] == 1010
+
+    # Changed claims are serialized again
+    reissued = _reissue(policy, dict(claims, role="admin"))
+    assert policy.jwt_decode(Request.blank("/"), reissued)["role"] == "admin"
+
+
+@pytest.mark.parametrize(
+    "kw", [{"expiration": None}, {"audience": "other"}, {"reference_tokens": True}]
+)
+def test_reissue_falls_back_to_create_token(principal, kw):
+    from pyramid_jwt.reference import ReferenceTokens
+
+    if kw.get("reference_tokens"):
+        kw["reference_tokens"] = ReferenceTokens()
+    kw.setdefault("expiration", 60)
+    policy = JWTCookieAuthenticationPolicy("secret", reissue_time=10, **kw)
+    calls = []
+    create_token = policy.create_token
+    policy.create_token = lambda *a, **k: calls.append(a) or create_token(*a, **k)
+    _reissue(policy, {"sub": principal, "iat": 1, "aud": "app"})
+    assert len(calls) == 1
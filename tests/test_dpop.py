@@ -0,0 +1,246 @@
+import uuid
+
+import jwt
+import pytest
+from jwt.algorithms import ECAlgorithm
+from pyramid.authorization import ACLAuthorizationPolicy
+from pyramid.config import Configurator
+from pyramid.testing import DummyRequest
+from webtest import TestApp
+
+from pyramid_jwt.clock import FixedClock
+from pyramid_jwt.dpop import (
+    InvalidProofError,
+    ProofVerifier,
+    access_token_hash,
+    jwk_thumbprint,
+    proof_verifier_from_settings,
+)
+from pyramid_jwt.keys import generate_key
+from pyramid_jwt.policy import JWTAuthenticationPolicy
+from pyramid_jwt.replay import ReplayCache
+
+pytest.importorskip("cryptography")
+
+URL = "http://example.com/resource"
+
+
+def test_thumbprint_rfc7638():
+    jwk = {
+        "kty": "RSA",
+        "n": "0vx7agoebGcQSuuPiLJXZptN9nndrQmbXEps2aiAFbWhM78LhWx4cbbfAAtVT86zwu1RK7aPFF"
+        "xuhDR1L6tSoc_BJECPebWKRXjBZCiFV4n3oknjhMstn64tZ_2W-5JsGY4Hc5n9yBXArwl93lqt7_RN"
+        "5w6Cf0h4QyQ5v-65YGjQR0_FDW2QvzqY368QQMicAtaSqzs8KJZgnYb9c7d0zgdAZHzu6qMQvRL5ha"
+        "jrn1n91CbOpbISD08qNLyrdkt-bFTWhAI4vMQFh6WeZu0fM4lFd2NcRwr3XPksINHaQ-G_xBniIqbw"
+        "0Ls1jF44-csFCur-kEgU8awapJzKnqDKgw",
+        "e": "AQAB",
+        "alg": "RS256",
+        "kid": "2011-04-29",
+    }
+    assert jwk_thumbprint(jwk) == "NzbLsXh8uDCcd-6MNwXF4W_7noWXFZAfHkxZsRGC9Xs"
+
+
+def test_thumbprint_unsupported_key():
+    with pytest.raises(InvalidProofError):
+        jwk_thumbprint({"kty": "oct", "k": "secret"})
+
+
+class Client:
+    def __init__(self):
+        self.key = generate_key("ES256")
+        self.jwk = ECAlgorithm.to_jwk(self.key.public_key(), as_dict=True)
+        self.thumbprint = jwk_thumbprint(self.jwk)
+
+    def proof(self, method="GET", url=URL, iat=1000, token=None, **extra):
+        payload = {"htm": method, "htu": url, "iat": iat, "jti": str(uuid.uuid4())}
+        if token is not None:
+            payload["ath"] = access_token_hash(token)
+        payload.update(extra)
+        headers = {"typ": "dpop+jwt", "jwk": self.jwk}
+        return jwt.encode(payload, self.key, algorithm="ES256", headers=headers)
+
+
+@pytest.fixture
+def client():
+    return Client()
+
+
+@pytest.fixture
+def clock():
+    return FixedClock(1000)
+
+
+@pytest.fixture
+def policy(clock):
+    return JWTAuthenticationPolicy(
+        "secret", expiration=60, clock=clock, dpop=ProofVerifier()
+    )
+
+
+def make_request(proof=None, method="GET"):
+    request = DummyRequest(remote_addr="10.0.0.1", path="/resource")
+    request.method = method
+    request.path_url = URL
+    if proof is not None:
+        request.environ["HTTP_DPOP"] = proof
+    return request
+
+
+def test_bound_token(policy, client):
+    token = policy.create_token("user", cnf={"jkt": client.thumbprint})
+    request = make_request(client.proof(token=token))
+    assert policy.jwt_decode(request, token)["sub"] == "user"
+    # The proof is only verified once per request
+    assert policy.jwt_decode(request, token)["sub"] == "user"
+
+
+def test_missing_proof(policy, client):
+    token = policy.create_token("user", cnf={"jkt": client.thumbprint})
+    assert policy.jwt_decode(make_request(), token) == {}
+    assert policy.stats.outcomes == {"invalid_proof": 1}
+
+
+def test_proof_from_other_key(policy, client):
+    token = policy.create_token("user", cnf={"jkt": client.thumbprint})
+    other = Client()
+    assert policy.jwt_decode(make_request(other.proof(token=token)), token) == {}
+
+
+@pytest.mark.parametrize(
+    "kw",
+    [
+        {"method": "POST"},
+        {"url": "http://example.com/other"},
+        {"iat": 900},
+        {"iat": 1100},
+        {"iat": float("nan")},
+        {"iat": float("inf")},
+        {"iat": True},
+        {"jti": None},
+    ],
+)
+def test_invalid_proof_claims(policy, client, kw):
+    token = policy.create_token("user", cnf={"jkt": client.thumbprint})
+    proof = client.proof(token=token, **kw)
+    assert policy.jwt_decode(make_request(proof), token) == {}
+
+
+def test_proof_for_other_token(policy, client):
+    token = policy.create_token("user", cnf={"jkt": client.thumbprint})
+    proof = client.proof(token=policy.create_token("other"))
+    assert policy.jwt_decode(make_request(proof), token) == {}
+    assert policy.jwt_decode(make_request(client.proof()), token) == {}
+
+
+def test_non_ascii_token_hash(policy, client):
+    token = policy.create_token("user", cnf={"jkt": client.thumbprint})
+    proof = client.proof(token=token, ath="\u00e9t\u00e9")
+    assert policy.jwt_decode(make_request(proof), token) == {}
+    assert policy.stats.outcomes == {"invalid_proof": 1}
+
+
+def test_tampered_proof(policy, client):
+    token = policy.create_token("user", cnf={"jkt": client.thumbprint})
+    header, payload, signature = client.proof(token=token).split(".")
+    other = client.proof(method="POST", token=token).split(".")[1]
+    proof = ".".join([header, other, signature])
+    assert policy.jwt_decode(make_request(proof), token) == {}
+
+
+def test_symmetric_proof_rejected(policy, client):
+    token = policy.create_token("user", cnf={"jkt": client.thumbprint})
+    proof = jwt.encode(
+        {"htm": "GET", "htu": URL, "iat": 1000, "jti": "x"},
+        "secret",
+        algorithm="HS256",
+        headers={"typ": "dpop+jwt", "jwk": client.jwk},
+    )
+    assert policy.jwt_decode(make_request(proof), token) == {}
+
+
+def test_bearer_tokens_still_accepted(policy, clock):
+    token = policy.create_token("user")
+    assert policy.jwt_decode(make_request(), token)["sub"] == "user"
+    policy.dpop.required = True
+    assert policy.jwt_decode(make_request(), token) == {}
+
+
+def test_client_keys_cached(policy, client):
+    token = policy.create_token("user", cnf={"jkt": client.thumbprint})
+    for i in range(3):
+        assert policy.jwt_decode(make_request(client.proof(token=token)), token)
+    assert len(policy.dpop.keys) == 1
+    assert policy.dpop.keys.hits == 2
+
+
+def test_proof_replay(clock, client):
+    policy = JWTAuthenticationPolicy(
+        "secret",
+        expiration=60,
+        clock=clock,
+        dpop=ProofVerifier(),
+        replay_store=ReplayCache(clock=clock),
+    )
+    token = policy.create_token("user", cnf={"jkt": client.thumbprint})
+    proof = client.proof(token=token)
+    assert policy.jwt_decode(make_request(proof), token)
+    assert policy.jwt_decode(make_request(proof), token) == {}
+    token = policy.create_token("user", cnf={"jkt": client.thumbprint})
+    proof = client.proof(token=token, iat=float("nan"))
+    assert policy.jwt_decode(make_request(proof), token) == {}
+    assert policy.stats.outcomes["invalid_proof"] == 2
+
+
+def test_stolen_token_does_not_use_up_jti(clock, client):
+    policy = JWTAuthenticationPolicy(
+        "secret",
+        expiration=60,
+        clock=clock,
+        dpop=ProofVerifier(),
+        replay_store=ReplayCache(clock=clock),
+    )
+    token = policy.create_token("user", cnf={"jkt": client.thumbprint})
+    assert policy.jwt_decode(make_request(), token) == {}
+    other = Client()
+    assert policy.jwt_decode(make_request(other.proof(token=token)), token) == {}
+    assert policy.jwt_decode(make_request(client.proof(token=token)), token)
+    assert policy.stats.outcomes == {"invalid_proof": 2, "ok": 1}
+
+
+def test_settings():
+    assert proof_verifier_from_settings({}) is None
+    verifier = proof_verifier_from_settings(
+        {"jwt.dpop": "true", "jwt.dpop_max_age": "30", "jwt.dpop_required": "true"}
+    )
+    assert verifier.max_age == 30
+    assert verifier.required
+
+
+def test_integration(client):
+    def login(request):
+        return {"token": request.create_jwt_token("user")}
+
+    def claims(request):
+        return request.jwt_claims
+
+    clock = FixedClock(1000)
+    config = Configurator(settings={"jwt.dpop": "true"})
+    config.set_authorization_policy(ACLAuthorizationPolicy())
+    config.include("pyramid_jwt")
+    config.set_jwt_authentication_policy(
+        "secret", expiration=60, auth_type="DPoP", clock=clock
+    )
+    config.add_route("login", "/login")
+    config.add_route("resource", "/resource")
+    config.add_view(login, route_name="login", renderer="json")
+    config.add_view(claims, route_name="resource", renderer="json")
+    app = TestApp(config.make_wsgi_app())
+
+    login_proof = client.proof("POST", "http://localhost/login")
+    token = app.post("/login", headers={"DPoP": login_proof}).json["token"]
+    proof = client.proof(url="http://localhost/resource", token=token)
+    headers = {"Authorization": "DPoP " + token, "DPoP": proof}
+    result = app.get("/resource", headers=headers).json
+    assert result["cnf"] == {"jkt": client.thumbprint}
+    headers = {"Authorization": "DPoP " + token}
+    assert app.get("/resource", headers=headers).json == {}
@@ -0,0 +1,199 @@
+import base64
+import json
+
+import pytest
+from pyramid.authorization import ACLAuthorizationPolicy
+from pyramid.config import Configurator
+from pyramid.response import Response
+from pyramid.security import Allow, Authenticated, remember
+from pyramid.testing import DummyRequest
+from webtest import TestApp
+
+from pyramid_jwt.clock import FixedClock
+from pyramid_jwt.encryption import (
+    InvalidEncryptionError,
+    TokenEncryption,
+    encryption_from_settings,
+)
+from pyramid_jwt.policy import JWTAuthenticationPolicy
+from pyramid_jwt.stats import policy_stats
+
+pytest.importorskip("cryptography")
+
+KEY = bytes(range(32))
+KEY_B64 = base64.urlsafe_b64encode(KEY).decode("ascii").rstrip("=")
+
+
+def decode(policy, token):
+    return policy.jwt_decode(DummyRequest(remote_addr="10.0.0.1"), token)
+
+
+@pytest.fixture
+def clock():
+    return FixedClock(1000)
+
+
+@pytest.fixture(params=[True, False], ids=["nested", "direct"])
+def policy(request, clock):
+    encryption = TokenEncryption(KEY, nested=request.param)
+    return JWTAuthenticationPolicy(
+        "secret", expiration=60, clock=clock, encryption=encryption
+    )
+
+
+def test_roundtrip(policy):
+    token = policy.create_token("user", ssn="123-45-6789")
+    assert token.count(".") == 4
+    assert b"123-45-6789" not in base64.urlsafe_b64decode(token.split(".")[3] + "===")
+    claims = decode(policy, token)
+    assert claims["sub"] == "user"
+    assert claims["ssn"] == "123-45-6789"
+
+
+def test_header(policy):
+    token = policy.create_token("user")
+    header = json.loads(base64.urlsafe_b64decode(token.split(".")[0] + "==="))
+    assert header["alg"] == "dir"
+    assert header["enc"] == "A256GCM"
+    assert ("cty" in header) == policy.encryption.nested
+
+
+def test_tampered_token(policy):
+    token = policy.create_token("user").split(".")
+    token[3] = token[3][:-2] + ("AA" if token[3][-2:] != "AA" else "BB")
+    assert decode(policy, ".".join(token)) == {}
+    assert policy.stats.outcomes == {"malformed": 1}
+
+
+def test_other_key(policy, clock):
+    token = policy.create_token("user")
+    other = JWTAuthenticationPolicy(
+        "secret", clock=clock, encryption=TokenEncryption(bytes(32))
+    )
+    assert decode(other, token) == {}
+
+
+def test_plain_jwt_rejected(policy, clock):
+    plain = JWTAuthenticationPolicy("secret", expiration=60, clock=clock)
+    assert decode(policy, plain.create_token("user")) == {}
+
+
+def test_nested_requires_signature(clock):
+    direct = JWTAuthenticationPolicy(
+        "secret", clock=clock, encryption=TokenEncryption(KEY, nested=False)
+    )
+    nested = JWTAuthenticationPolicy(
+        "secret", clock=clock, encryption=TokenEncryption(KEY)
+    )
+    assert decode(nested, direct.create_token("user")) == {}
+
+
+def test_cache(policy, clock):
+    token = policy.create_token("user")
+    claims = decode(policy, token)
+    claims["sub"] = "changed"
+    assert decode(policy, token)["sub"] == "user"
+    cache = policy.encryption.cache
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert policy_stats(policy)["caches"]["decrypted_tokens"]["hits"] == 1
+    clock.tick(61)
+    assert decode(policy, token) == {}
+
+
+def test_cache_ttl(clock):
+    encryption = TokenEncryption(KEY, cache_ttl=10)
+    policy = JWTAuthenticationPolicy(
+        "secret", expiration=60, clock=clock, encryption=encryption
+    )
+    token = policy.create_token("user")
+    decode(policy, token)
+    decode(policy, token)
+    clock.tick(20)
+    assert decode(policy, token)["sub"] == "user"
+    # The stale entry was found, but the token was decrypted again
+    assert (encryption.cache.hits, encryption.cache.misses) == (2, 1)
+    assert encryption.cache.get(next(iter(encryption.cache._data)))[1] == 1030
+
+
+def test_cache_size(clock):
+    encryption = TokenEncryption(KEY, cache_size=2)
+    policy = JWTAuthenticationPolicy(
+        "secret", expiration=60, clock=clock, encryption=encryption
+    )
+    for i in range(5):
+        decode(policy, policy.create_token("user%d" % i))
+    assert len(encryption.cache) == 2
+
+
+def test_invalid_configuration():
+    with pytest.raises(ValueError):
+        TokenEncryption(KEY, enc="A128CBC-HS256")
+    with pytest.raises(ValueError):
+        TokenEncryption(KEY[:16])
+    assert TokenEncryption(KEY[:16], enc="A128GCM").enc == "A128GCM"
+
+
+def test_decrypt_garbage():
+    with pytest.raises(InvalidEncryptionError):
+        TokenEncryption(KEY).decrypt("a.b.c")
+    with pytest.raises(InvalidEncryptionError):
+        TokenEncryption(KEY).decrypt("a.b.c.d.e")
+
+
+def test_settings(tmp_path):
+    assert encryption_from_settings({}) is None
+    encryption = encryption_from_settings(
+        {
+            "jwt.encryption_key": KEY_B64,
+            "jwt.encryption_nested": "false",
+            "jwt.encryption_cache_size": "10",
+            "jwt.encryption_cache_ttl": "30",
+        }
+    )
+    assert not encryption.nested
+    assert encryption.cache.maxsize == 10
+    assert encryption.cache_ttl == 30
+    path = tmp_path / "key"
+    path.write_text(KEY_B64 + "\n")
+    assert encryption_from_settings({"jwt.encryption_key_file": str(path)})
+
+
+class Root:
+    __acl__ = [(Allow, Authenticated, "read")]
+
+    def __init__(self, request):
+        pass
+
+
+def test_cookie_reissue(clock):
+    def login(request):
+        return Response(headers=remember(request, request.create_jwt_token("user")))
+
+    def secure(request):
+        return request.jwt_claims
+
+    config = Configurator(settings={"jwt.encryption_key": KEY_B64}, root_factory=Root)
+    config.set_authorization_policy(ACLAuthorizationPolicy())
+    config.include("pyramid_jwt")
+    config.set_jwt_cookie_authentication_policy(
+        "secret",
+        cookie_name="Token",
+        expiration=5,
+        reissue_time=1,
+        https_only=False,
+        clock=clock,
+    )
+    config.add_route("login", "/login")
+    config.add_route("secure", "/secure")
+    config.add_view(login, route_name="login")
+    config.add_view(secure, route_name="secure", renderer="json", permission="read")
+    app = TestApp(config.make_wsgi_app())
+
+    app.get("/login")
+    token = app.cookies["Token"]
+    assert app.get("/secure").json["sub"] == "user"
+    clock.tick(2)
+    assert app.get("/secure").json["sub"] == "user"
+    assert app.cookies["Token"] != token
+    clock.tick(2)
+    assert app.get("/secure").json["iat"] == 1002
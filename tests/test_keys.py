@@ -0,0 +1,134 @@
+import jwt
+import pytest
+from cryptography.hazmat.primitives import serialization
+from pyramid.testing import testConfig
+from webob import Request
+
+from pyramid_jwt import create_jwt_authentication_policy
+from pyramid_jwt.keys import generate_key, load_key, public_key_for, serialize_key
+from pyramid_jwt.scripts import main
+
+
+def roundtrip(policy):
+    request = Request.blank("/")
+    request.authorization = ("JWT", policy.create_token("user"))
+    return policy.get_claims(request).get("sub")
+
+
+@pytest.mark.parametrize("algorithm", ["EdDSA", "ES256", "ES384", "ES512", "RS256"])
+def test_pem_settings(algorithm):
+    key = generate_key(algorithm)
+    settings = {
+        "jwt.algorithm": algorithm,
+        "jwt.private_key": serialize_key(algorithm, key),
+        "jwt.public_key": serialize_key(algorithm, public_key_for(key)),
+    }
+    with testConfig(settings=settings) as config:
+        policy = create_jwt_authentication_policy(config)
+    assert roundtrip(policy) == "user"
+
+
+def test_jwk_settings():
+    key = generate_key("EdDSA")
+    settings = {
+        "jwt.algorithm": "EdDSA",
+        "jwt.private_key": serialize_key("EdDSA", key, "jwk"),
+    }
+    with testConfig(settings=settings) as config:
+        policy = create_jwt_authentication_policy(config)
+    assert roundtrip(policy) == "user"
+
+
+def test_key_files(tmp_path):
+    main(["genkey", "-a", "ES256", "-o", str(tmp_path / "key")])
+    settings = {
+        "jwt.algorithm": "ES256",
+        "jwt.private_key_file": str(tmp_path / "key"),
+        "jwt.public_key_file": str(tmp_path / "key.pub"),
+    }
+    with testConfig(settings=settings) as config:
+        policy = create_jwt_authentication_policy(config)
+    assert roundtrip(policy) == "user"
+
+
+def test_secret_looking_like_json():
+    assert load_key("HS256", '{"kty": "oct"}') == '{"kty": "oct"}'
+    settings = {"jwt.private_key": '{"not": "a jwk"}'}
+    with testConfig(settings=settings) as config:
+        policy = create_jwt_authentication_policy(config)
+    assert roundtrip(policy) == "user"
+
+
+def test_secret_file(tmp_path):
+    (tmp_path / "secret").write_text("secret\n")
+    settings = {"jwt.private_key_file": str(tmp_path / "secret")}
+    with testConfig(settings=settings) as config:
+        policy = create_jwt_authentication_policy(config)
+    assert policy.private_key == b"secret"
+    assert roundtrip(policy) == "user"
+
+
+def test_public_key_derived_from_private_key():
+    key = generate_key("EdDSA")
+    with testConfig() as config:
+        policy = create_jwt_authentication_policy(
+            config, private_key=serialize_key("EdDSA", key), algorithm="EdDSA"
+        )
+    assert roundtrip(policy) == "user"
+
+
+def test_verify_only():
+    key = generate_key("ES256")
+    with testConfig() as config:
+        policy = create_jwt_authentication_policy(
+            config,
+            public_key=serialize_key("ES256", public_key_for(key)),
+            algorithm="ES256",
+        )
+    assert policy.private_key is None
+
+
+@pytest.mark.parametrize("algorithm", ["EdDSA", "ES256", "RS256"])
+def test_openssh_public_key(algorithm):
+    key = generate_key(algorithm)
+    public_key = (
+        public_key_for(key)
+        .public_bytes(
+            serialization.Encoding.OpenSSH, serialization.PublicFormat.OpenSSH
+        )
+        .decode("ascii")
+    )
+    with testConfig() as config:
+        policy = create_jwt_authentication_policy(
+            config, public_key=public_key + "\n", algorithm=algorithm
+        )
+    token = jwt.encode({"sub": "user"}, key, algorithm=algorithm)
+    request = Request.blank("/")
+    request.authorization = ("JWT", token)
+    assert policy.get_claims(request)["sub"] == "user"
+
+
+@pytest.mark.parametrize(
+    "algorithm,other", [("ES256", "ES384"), ("ES256", "EdDSA"), ("EdDSA", "RS256")]
+)
+def test_curve_mismatch(algorithm, other):
+    with pytest.raises(ValueError):
+        load_key(algorithm, serialize_key(other, generate_key(other)))
+
+
+def test_symmetric_key_passthrough():
+    assert load_key("HS512", "secret") == "secret"
+    assert load_key("HS512") is None
+
+
+def test_genkey_stdout(capsys):
+    main(["genkey", "-a", "EdDSA"])
+    out = capsys.readouterr().out
+    assert "BEGIN PRIVATE KEY" in out
+    assert "BEGIN PUBLIC KEY" in out
+
+
+def test_benchmark(capsys):
+    main(["benchmark", "-t", "0.01", "HS256", "EdDSA", "XX999"])
+    lines = capsys.readouterr().out.splitlines()
+    assert [line.split()[0] for line in lines] == ["alg", "HS256", "EdDSA", "XX999"]
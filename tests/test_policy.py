@@ -15,6 +15,7 @@ from pyramid_jwt.policy import (
     PyramidJSONEncoderFactory,
     JWTCookieAuthenticationPolicy,
 )
+from pyramid_jwt.state import REISSUE_REVOKED, request_state
 import uuid
 import pytest
 from json.encoder import JSONEncoder
@@ -230,7 +231,7 @@ def test_cookie_policy_forget():
     assert cookie_values[0].startswith(f"{policy.cookie_name}=")
 
     assert "Max-Age=0" in chunks
-    assert hasattr(request, "_jwt_cookie_reissue_revoked")
+    assert request_state(request).reissue == REISSUE_REVOKED
 
 
 def test_cookie_policy_custom_domain_list():
@@ -269,7 +270,6 @@ def test_insecure_cookie_policy():
     assert "secure" not in chunks
 
 
-@pytest.mark.freeze_time
 def test_cookie_policy_max_age():
     expiry = timedelta(seconds=10)
     policy = JWTCookieAuthenticationPolicy("secret", expiration=expiry)
@@ -280,3 +280,23 @@ def test_cookie_policy_max_age():
     chunks = cookie.split("; ")
 
     assert "Max-Age=10" not in chunks
+
+
+def test_json_encoder_factory_reuses_encoders():
+    from pyramid.config import Configurator
+    from pyramid.renderers import JSON
+
+    config = Configurator()
+    config.commit()
+    factory = PyramidJSONEncoderFactory(config.registry)
+    encoder = factory(separators=(",", ":"))
+    assert factory(separators=(",", ":")) is encoder
+    assert factory(separators=(", ", ": ")) is not encoder
+
+    renderer = JSON()
+    renderer.add_adapter(UUID, lambda obj, request: "adapted")
+    config.add_renderer("json", renderer)
+    config.commit()
+    encoder = factory(separators=(",", ":"))
+    assert encoder.encode({"id": uuid.uuid4()}) == '{"id":"adapted"}'
+    assert factory(separators=(",", ":")) is encoder
@@ -0,0 +1,142 @@
+import cProfile
+import os
+import pstats
+import signal
+import threading
+
+import pytest
+from pyramid.authorization import ACLAuthorizationPolicy
+from pyramid.config import Configurator
+from pyramid.interfaces import IAuthenticationPolicy
+from pyramid.security import Authenticated, Allow
+from pyramid.testing import DummyRequest
+from webtest import TestApp
+
+from pyramid_jwt.policy import JWTAuthenticationPolicy
+from pyramid_jwt import profiler as profiler_module
+from pyramid_jwt.profiler import AuthProfiler, profiler_from_settings
+
+
+class Root:
+    __acl__ = [(Allow, Authenticated, "read")]
+
+    def __init__(self, request):
+        pass
+
+
+def secure_view(request):
+    return "OK"
+
+
+def make_app(settings, callback=None):
+    config = Configurator(settings=settings, root_factory=Root)
+    config.set_authorization_policy(ACLAuthorizationPolicy())
+    config.include("pyramid_jwt")
+    config.set_jwt_authentication_policy("secret", callback=callback)
+    config.add_route("secure", "/secure")
+    config.add_view(
+        secure_view, route_name="secure", renderer="json", permission="read"
+    )
+    app = config.make_wsgi_app()
+    return TestApp(app), app.registry.queryUtility(IAuthenticationPolicy)
+
+
+def test_disabled_by_default():
+    policy = JWTAuthenticationPolicy("secret")
+    assert policy.profiler is None
+
+
+def test_profile_requests(tmp_path):
+    callback_calls = []
+
+    def callback(userid, request):
+        callback_calls.append(userid)
+        return []
+
+    settings = {
+        "jwt.profile_dir": str(tmp_path),
+        "jwt.profile_requests": "3",
+        "jwt.profile_on_start": "true",
+    }
+    app, policy = make_app(settings, callback)
+    profiler = policy.profiler
+    assert profiler is not None
+    headers = {"Authorization": "JWT " + policy.create_token("user")}
+    for i in range(3):
+        app.get("/secure", headers=headers)
+    assert policy.profiler is None
+    assert os.listdir(str(tmp_path)) == [os.path.basename(profiler.path)]
+    functions = {name for (_, _, name) in pstats.Stats(profiler.path).stats}
+    assert "jwt_decode" in functions
+    assert "callback" in functions
+    # Requests after the profile was written are not profiled
+    app.get("/secure", headers=headers)
+    assert len(os.listdir(str(tmp_path))) == 1
+
+
+def test_not_started_without_on_start(tmp_path):
+    app, policy = make_app({"jwt.profile_dir": str(tmp_path)})
+    assert policy.profiler is None
+    profiler = policy.start_profiling(str(tmp_path), 1)
+    headers = {"Authorization": "JWT " + policy.create_token("user")}
+    app.get("/secure", headers=headers)
+    assert policy.profiler is None
+    assert os.path.exists(profiler.path)
+
+
+def test_one_request_profiled_at_a_time(tmp_path):
+    policy = JWTAuthenticationPolicy("secret")
+    profiler = AuthProfiler(policy, str(tmp_path), 2)
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow():
+        started.set()
+        release.wait(5)
+        return "slow"
+
+    results = []
+    thread = threading.Thread(
+        target=lambda: results.append(profiler.run(DummyRequest(), slow))
+    )
+    thread.start()
+    started.wait(5)
+    assert profiler.run(DummyRequest(), lambda: "fast") == "fast"
+    release.set()
+    thread.join()
+    assert results == ["slow"]
+    assert profiler._seen == 1
+
+
+def test_other_profiler_active(tmp_path, monkeypatch):
+    class Profile(cProfile.Profile):
+        def enable(self):
+            raise ValueError("Another profiling tool is already active")
+
+    monkeypatch.setattr(profiler_module.cProfile, "Profile", Profile)
+    policy = JWTAuthenticationPolicy("secret")
+    profiler = AuthProfiler(policy, str(tmp_path), 1)
+    assert profiler.run(DummyRequest(), lambda: "result") == "result"
+    assert profiler._seen == 0
+
+
+def test_signal(tmp_path):
+    policy = JWTAuthenticationPolicy("secret")
+    previous = signal.getsignal(signal.SIGUSR2)
+    try:
+        profiler_from_settings(
+            policy, {"jwt.profile_dir": str(tmp_path), "jwt.profile_signal": "sigusr2"}
+        )
+        os.kill(os.getpid(), signal.SIGUSR2)
+        assert policy.profiler is not None
+        assert policy.profiler.requests == 100
+    finally:
+        signal.signal(signal.SIGUSR2, previous)
+
+
+def test_unknown_signal(tmp_path):
+    policy = JWTAuthenticationPolicy("secret")
+    with pytest.raises(ValueError):
+        profiler_from_settings(
+            policy, {"jwt.profile_dir": str(tmp_path), "jwt.profile_signal": "SIGFOO"}
+        )
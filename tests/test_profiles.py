@@ -0,0 +1,112 @@
+from datetime import timedelta
+
+import pytest
+from pyramid.authorization import ACLAuthorizationPolicy
+from pyramid.config import Configurator
+from pyramid.testing import DummyRequest
+from webtest import TestApp
+
+from pyramid_jwt.clock import FixedClock
+from pyramid_jwt.policy import JWTAuthenticationPolicy
+from pyramid_jwt.profiles import RouteProfile
+
+
+def claims_view(request):
+    return request.jwt_claims
+
+
+def login_view(request):
+    return {"token": request.create_jwt_token("user")}
+
+
+@pytest.fixture
+def clock():
+    return FixedClock(1000)
+
+
+@pytest.fixture
+def app(clock):
+    config = Configurator()
+    config.set_authorization_policy(ACLAuthorizationPolicy())
+    config.include("pyramid_jwt")
+    config.set_jwt_authentication_policy(
+        "secret", expiration=60, audience="public", clock=clock
+    )
+    for name in ("public", "admin", "internal", "admin_login"):
+        config.add_route(name, "/" + name)
+    config.add_view(claims_view, route_name="public", renderer="json")
+    config.add_view(claims_view, route_name="admin", renderer="json")
+    config.add_view(claims_view, route_name="internal", renderer="json")
+    config.add_view(login_view, route_name="admin_login", renderer="json")
+    config.add_jwt_route_profile(
+        ["admin", "admin_login"], audience="admin", expiration=10
+    )
+    config.add_jwt_route_profile("internal", leeway=timedelta(seconds=30))
+    return TestApp(config.make_wsgi_app())
+
+
+@pytest.fixture
+def policy(clock):
+    return JWTAuthenticationPolicy("secret", expiration=60, clock=clock)
+
+
+def get_claims(app, path, token):
+    return app.get(path, headers={"Authorization": "JWT " + token}).json
+
+
+def test_audience_per_route(app, policy):
+    public = policy.create_token("user", audience="public")
+    admin = policy.create_token("user", audience="admin")
+    assert get_claims(app, "/public", public)["aud"] == "public"
+    assert get_claims(app, "/public", admin) == {}
+    assert get_claims(app, "/admin", admin)["aud"] == "admin"
+    assert get_claims(app, "/admin", public) == {}
+
+
+def test_leeway_per_route(app, policy, clock):
+    token = policy.create_token("user", audience="public")
+    clock.tick(70)
+    assert get_claims(app, "/public", token) == {}
+    assert get_claims(app, "/internal", token)["sub"] == "user"
+
+
+def test_expiration_and_audience_for_new_tokens(app, policy):
+    token = app.get("/admin_login").json["token"]
+    claims = get_claims(app, "/admin", token)
+    assert claims["aud"] == "admin"
+    assert claims["exp"] - claims["iat"] == 10
+
+
+def test_profile_normalises_values():
+    profile = RouteProfile(
+        "admin", audience="", leeway=timedelta(seconds=5), expiration=30
+    )
+    assert profile.audience is None
+    assert profile.leeway == 5
+    assert profile.expiration == timedelta(seconds=30)
+
+
+def test_conflicting_profiles():
+    from pyramid.exceptions import ConfigurationConflictError
+
+    config = Configurator()
+    config.include("pyramid_jwt")
+    config.add_jwt_route_profile("admin", audience="a")
+    config.add_jwt_route_profile("admin", audience="b")
+    with pytest.raises(ConfigurationConflictError):
+        config.commit()
+
+
+def test_signature_verified_once(policy, monkeypatch):
+    import jwt
+
+    token = policy.create_token("user", audience="admin")
+    calls = []
+    decode = jwt.decode
+    monkeypatch.setattr(
+        jwt, "decode", lambda *a, **kw: calls.append(1) or decode(*a, **kw)
+    )
+    request = DummyRequest(remote_addr="10.0.0.1")
+    assert policy.jwt_decode(request, token) == {}
+    assert policy.jwt_decode(request, token, audience="admin")["sub"] == "user"
+    assert len(calls) == 1
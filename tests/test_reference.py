@@ -0,0 +1,162 @@
+import time
+
+import pytest
+from webob import Request
+
+from pyramid_jwt.clock import FixedClock
+from pyramid_jwt.policy import JWTAuthenticationPolicy
+from pyramid_jwt.reference import (
+    MemoryTokenStore,
+    ReferenceTokens,
+    SQLiteTokenStore,
+    reference_tokens_from_settings,
+)
+
+
+@pytest.fixture
+def clock():
+    return FixedClock()
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path, clock):
+    if request.param == "memory":
+        return MemoryTokenStore(clock=clock)
+    return SQLiteTokenStore(str(tmp_path / "tokens.db"), clock=clock)
+
+
+def test_create_token_returns_handle(store):
+    policy = JWTAuthenticationPolicy("secret", reference_tokens=ReferenceTokens(store))
+    handle = policy.create_token(15)
+    assert "." not in handle
+    assert store.get(handle)[0].count(".") == 2
+
+
+def test_roundtrip(store):
+    policy = JWTAuthenticationPolicy("secret", reference_tokens=ReferenceTokens(store))
+    request = Request.blank("/")
+    request.authorization = ("JWT", policy.create_token(15, name="Jöhn"))
+    claims = policy.get_claims(request)
+    assert claims["sub"] == 15
+    assert claims["name"] == "Jöhn"
+
+
+def test_unknown_handle():
+    policy = JWTAuthenticationPolicy("secret", reference_tokens=ReferenceTokens())
+    request = Request.blank("/")
+    request.authorization = ("JWT", "no-such-handle")
+    assert policy.get_claims(request) == {}
+
+
+def test_revoke(store):
+    policy = JWTAuthenticationPolicy("secret", reference_tokens=ReferenceTokens(store))
+    request = Request.blank("/")
+    handle = policy.create_token(15)
+    request.authorization = ("JWT", handle)
+    assert policy.get_claims(request)
+    policy.revoke_token(handle)
+    assert policy.get_claims(request) == {}
+
+
+def test_revoke_requires_reference_tokens():
+    policy = JWTAuthenticationPolicy("secret")
+    with pytest.raises(ValueError):
+        policy.revoke_token(policy.create_token(15))
+
+
+def test_claims_still_validated():
+    policy = JWTAuthenticationPolicy(
+        "secret", audience="example.org", reference_tokens=ReferenceTokens()
+    )
+    request = Request.blank("/")
+    request.authorization = ("JWT", policy.create_token(15, audience="example.com"))
+    assert policy.get_claims(request) == {}
+
+
+def test_expired_handle_is_dropped(store):
+    store.set("handle", "token", time.time() - 1)
+    assert store.get("handle") is None
+
+
+def test_repeat_lookups_hit_cache():
+    class CountingStore(MemoryTokenStore):
+        lookups = 0
+
+        def get(self, handle):
+            self.lookups += 1
+            return super().get(handle)
+
+    store = CountingStore()
+    tokens = ReferenceTokens(store)
+    store.set("handle", "token")
+    assert tokens.resolve("handle") == "token"
+    assert tokens.resolve("handle") == "token"
+    assert store.lookups == 1
+    assert tokens.cache.hits == 1
+
+
+def test_cache_ttl_rechecks_store():
+    store = MemoryTokenStore()
+    tokens = ReferenceTokens(store, cache_ttl=-1)
+    handle = tokens.issue("token")
+    store.delete(handle)
+    assert tokens.resolve(handle) is None
+
+
+def test_cache_is_bounded():
+    tokens = ReferenceTokens(cache_size=2)
+    handles = [tokens.issue("token-%d" % i) for i in range(3)]
+    assert len(tokens.cache) == 2
+    assert handles[0] not in tokens.cache
+    assert tokens.resolve(handles[0]) == "token-0"
+
+
+def test_store_uses_clock(store, clock):
+    store.set("handle", "token", clock.now + 10)
+    clock.tick(11)
+    assert store.get("handle") is None
+
+
+def test_from_settings(tmp_path):
+    assert reference_tokens_from_settings({}) is None
+    tokens = reference_tokens_from_settings(
+        {"jwt.reference_store": "memory", "jwt.reference_cache_size": "10"}
+    )
+    assert isinstance(tokens.store, MemoryTokenStore)
+    assert tokens.cache.maxsize == 10
+    path = tmp_path / "tokens.db"
+    tokens = reference_tokens_from_settings(
+        {"jwt.reference_store": "sqlite://%s" % path}
+    )
+    assert isinstance(tokens.store, SQLiteTokenStore)
+    with pytest.raises(ValueError):
+        reference_tokens_from_settings({"jwt.reference_store": "redis://"})
+
+
+def test_store_replace(store):
+    store.set("handle", "old", time.time() + 60)
+    assert not store.replace("handle", "other", "new")
+    assert store.replace("handle", "old", "new")
+    assert store.get("handle")[0] == "new"
+    assert not store.replace("handle", "old", "newer")
+    assert not store.replace("missing", "old", "new")
+
+
+def stored_handles(store):
+    if isinstance(store, MemoryTokenStore):
+        return sorted(store._tokens)
+    rows = store._connection.execute("SELECT handle FROM jwt_reference_tokens")
+    return sorted(handle for (handle,) in rows)
+
+
+def test_expired_tokens_are_swept(store, clock):
+    now = clock.now
+    store.set("expired", "token", now + 10)
+    store.set("valid", "token", now + 600)
+    store.set("forever", "token")
+    clock.tick(30)
+    store.set("new", "token", now + 600)
+    assert stored_handles(store) == ["expired", "forever", "new", "valid"]
+    clock.tick(31)
+    store.set("newer", "token", now + 600)
+    assert stored_handles(store) == ["forever", "new", "newer", "valid"]
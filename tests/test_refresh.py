@@ -0,0 +1,157 @@
+import pytest
+from pyramid.authorization import ACLAuthorizationPolicy
+from pyramid.config import Configurator
+from webob import Request
+from webtest import TestApp
+
+from pyramid.testing import testConfig
+
+from pyramid_jwt import create_jwt_authentication_policy
+from pyramid_jwt.clock import FixedClock
+from pyramid_jwt.policy import JWTAuthenticationPolicy
+from pyramid_jwt.reference import SQLiteTokenStore
+from pyramid_jwt.refresh import RefreshTokens, refresh_tokens_from_settings
+
+
+@pytest.fixture
+def policy():
+    return JWTAuthenticationPolicy("secret", refresh_tokens=RefreshTokens())
+
+
+def claims_for(policy, token):
+    request = Request.blank("/")
+    request.authorization = ("JWT", token)
+    return policy.get_claims(request)
+
+
+def test_refresh_returns_new_tokens(policy):
+    refresh_token = policy.create_refresh_token(15, role="admin")
+    token, new_refresh_token = policy.refresh_token(refresh_token)
+    assert new_refresh_token != refresh_token
+    claims = claims_for(policy, token)
+    assert claims["sub"] == 15
+    assert claims["role"] == "admin"
+
+
+def test_refresh_chain(policy):
+    refresh_token = policy.create_refresh_token(15)
+    for _ in range(3):
+        token, refresh_token = policy.refresh_token(refresh_token)
+        assert claims_for(policy, token)["sub"] == 15
+
+
+def test_unknown_refresh_token(policy):
+    assert policy.refresh_token("unknown") is None
+
+
+def test_reuse_revokes_family(policy):
+    refresh_token = policy.create_refresh_token(15)
+    _, rotated = policy.refresh_token(refresh_token)
+    assert policy.refresh_token(refresh_token) is None
+    # The legitimate holder of the rotated token is logged out as well.
+    assert policy.refresh_token(rotated) is None
+
+
+def test_concurrent_rotation_across_processes(tmp_path):
+    path = str(tmp_path / "tokens.db")
+    worker = RefreshTokens(SQLiteTokenStore(path))
+    other = RefreshTokens(SQLiteTokenStore(path))
+    handle = worker.issue(15)
+    rotated = []
+    get = worker.store.get
+
+    def racing_get(key):
+        entry = get(key)
+        if key == handle and not rotated:
+            # Another worker rotates the token after this one read it.
+            rotated.append(other.rotate(handle))
+        return entry
+
+    worker.store.get = racing_get
+    assert worker.rotate(handle) is None
+    assert rotated[0] is not None
+    # Both copies were used, so the whole family is revoked.
+    assert other.rotate(rotated[0][2]) is None
+
+
+def test_other_families_unaffected(policy):
+    first = policy.create_refresh_token(15)
+    second = policy.create_refresh_token(15)
+    policy.refresh_token(first)
+    policy.refresh_token(first)
+    assert policy.refresh_token(second) is not None
+
+
+def test_revoke(policy):
+    refresh_token = policy.create_refresh_token(15)
+    policy.refresh_tokens.revoke(refresh_token)
+    assert policy.refresh_token(refresh_token) is None
+
+
+def test_expired_refresh_token():
+    policy = JWTAuthenticationPolicy("secret", refresh_tokens=RefreshTokens(window=-1))
+    assert policy.refresh_token(policy.create_refresh_token(15)) is None
+
+
+def test_refresh_window_uses_clock():
+    clock = FixedClock()
+    policy = JWTAuthenticationPolicy(
+        "secret", refresh_tokens=RefreshTokens(window=60, clock=clock), clock=clock
+    )
+    refresh_token = policy.create_refresh_token(15)
+    clock.tick(30)
+    _, refresh_token = policy.refresh_token(refresh_token)
+    clock.tick(61)
+    assert policy.refresh_token(refresh_token) is None
+
+
+def test_requires_store():
+    policy = JWTAuthenticationPolicy("secret")
+    with pytest.raises(ValueError):
+        policy.create_refresh_token(15)
+    with pytest.raises(ValueError):
+        policy.refresh_token("token")
+
+
+def test_from_settings():
+    assert refresh_tokens_from_settings({}) is None
+    tokens = refresh_tokens_from_settings(
+        {"jwt.refresh_store": "memory", "jwt.refresh_window": "60"}
+    )
+    assert tokens.window == 60
+
+
+def test_settings_use_policy_clock():
+    clock = FixedClock()
+    with testConfig(settings={"jwt.refresh_store": "memory"}) as config:
+        policy = create_jwt_authentication_policy(config, "secret", clock=clock)
+    assert policy.refresh_tokens.clock is clock
+    assert policy.refresh_tokens.store.clock is clock
+
+
+def test_request_methods():
+    def login(request):
+        return {"refresh_token": request.create_jwt_refresh_token(1)}
+
+    def refresh(request):
+        result = request.refresh_jwt_token(request.json_body["refresh_token"])
+        if result is None:
+            return {}
+        token, refresh_token = result
+        return {"token": token, "refresh_token": refresh_token}
+
+    config = Configurator(settings={"jwt.refresh_store": "memory"})
+    config.set_authorization_policy(ACLAuthorizationPolicy())
+    config.include("pyramid_jwt")
+    config.set_jwt_authentication_policy("secret")
+    config.add_route("login", "/login")
+    config.add_view(login, route_name="login", renderer="json")
+    config.add_route("refresh", "/refresh")
+    config.add_view(refresh, route_name="refresh", renderer="json")
+    app = TestApp(config.make_wsgi_app())
+
+    refresh_token = app.get("/login").json_body["refresh_token"]
+    body = app.post_json("/refresh", {"refresh_token": refresh_token}).json_body
+    assert body["token"]
+    assert body["refresh_token"] != refresh_token
+    assert app.post_json("/refresh", {"refresh_token": refresh_token}).json == {}
@@ -0,0 +1,199 @@
+import pytest
+from pyramid.authorization import ACLAuthorizationPolicy
+from pyramid.config import Configurator
+from pyramid.testing import DummyRequest
+from webtest import TestApp
+
+from pyramid_jwt.clock import FixedClock
+from pyramid_jwt.policy import JWTAuthenticationPolicy
+from pyramid_jwt.replay import (
+    MemoryReplayClient,
+    ReplayCache,
+    ReplayedTokenError,
+    SharedReplayStore,
+    replay_store_from_settings,
+)
+from pyramid_jwt.stats import policy_stats
+
+
+def decode(policy, token):
+    return policy.jwt_decode(DummyRequest(remote_addr="10.0.0.1"), token)
+
+
+@pytest.fixture
+def clock():
+    return FixedClock(1000)
+
+
+@pytest.fixture(params=["local", "shared"])
+def store(request, clock):
+    if request.param == "local":
+        return ReplayCache(clock=clock)
+    return SharedReplayStore(MemoryReplayClient(clock))
+
+
+def test_token_usable_once(store, clock):
+    policy = JWTAuthenticationPolicy(
+        "secret", expiration=60, clock=clock, replay_store=store
+    )
+    token = policy.create_token("user")
+    assert decode(policy, token)["sub"] == "user"
+    assert decode(policy, token) == {}
+    assert policy.stats.outcomes == {"ok": 1, "replayed": 1}
+    assert decode(policy, policy.create_token("user"))["sub"] == "user"
+
+
+def test_same_request_decodes_twice(store, clock):
+    policy = JWTAuthenticationPolicy(
+        "secret", expiration=60, clock=clock, replay_store=store
+    )
+    token = policy.create_token("user")
+    request = DummyRequest(remote_addr="10.0.0.1")
+    assert policy.jwt_decode(request, token)["sub"] == "user"
+    assert policy.jwt_decode(request, token)["sub"] == "user"
+
+
+def test_jti_and_exp_required(clock):
+    policy = JWTAuthenticationPolicy("secret", expiration=60, clock=clock)
+    token = policy.create_token("user")
+    assert "jti" not in decode(policy, token)
+    policy.replay_store = ReplayCache(clock=clock)
+    assert decode(policy, token) == {}
+    assert policy.stats.outcomes["missing_claim"] == 1
+
+    forever = JWTAuthenticationPolicy("secret", clock=clock, replay_store=ReplayCache())
+    assert decode(forever, forever.create_token("user")) == {}
+
+
+def test_cache_drops_expired_buckets(clock):
+    cache = ReplayCache(bucket_seconds=10, clock=clock)
+    for i in range(5000):
+        assert cache.add("token-%d" % i, 1005 + i % 30)
+    assert len(cache) == 5000
+    assert not cache.add("token-1", 1006)
+    clock.tick(10)
+    cache.add("other", 1100)
+    assert len(cache) < 5000
+    clock.tick(100)
+    cache.add("other", 1300)
+    assert len(cache) == 1
+    assert cache.add("token-1", 1300)
+
+
+def test_cache_grows_buckets(clock):
+    cache = ReplayCache(clock=clock)
+    for i in range(10000):
+        assert cache.add(str(i), 2000)
+    for i in range(10000):
+        assert not cache.add(str(i), 2000)
+    assert len(cache) == 10000
+    assert 16 * 10000 <= cache.memory <= 32 * 10000
+
+
+def test_cache_max_entries(clock):
+    cache = ReplayCache(max_entries=2, clock=clock)
+    assert cache.add("a", 1010)
+    assert cache.add("b", 1010)
+    assert not cache.add("c", 1010)
+    clock.tick(60)
+    assert cache.add("c", 1100)
+
+
+def test_shared_store_expiry(clock):
+    store = SharedReplayStore(MemoryReplayClient(clock))
+    assert store.add("a", 1010)
+    assert not store.add("a", 1010)
+    clock.tick(20)
+    assert store.add("a", 1050)
+
+
+def test_settings(clock):
+    assert replay_store_from_settings({}) is None
+    store = replay_store_from_settings(
+        {
+            "jwt.replay_protection": "true",
+            "jwt.replay_bucket_seconds": "30",
+            "jwt.replay_max_entries": "1000",
+        },
+        clock,
+    )
+    assert store.bucket_seconds == 30
+    assert store.max_entries == 1000
+    assert store.clock is clock
+
+
+def test_stats(clock):
+    policy = JWTAuthenticationPolicy(
+        "secret", expiration=60, clock=clock, replay_store=ReplayCache(clock=clock)
+    )
+    decode(policy, policy.create_token("user"))
+    assert policy_stats(policy)["replay_cache"]["entries"] == 1
+
+
+def test_route_profile_disables_replay_protection(clock):
+    def view(request):
+        return request.jwt_claims
+
+    config = Configurator(settings={"jwt.replay_protection": "true"})
+    config.set_authorization_policy(ACLAuthorizationPolicy())
+    config.include("pyramid_jwt")
+    config.set_jwt_authentication_policy("secret", expiration=60, clock=clock)
+    config.add_route("pay", "/pay")
+    config.add_route("profile", "/profile")
+    config.add_view(view, route_name="pay", renderer="json")
+    config.add_view(view, route_name="profile", renderer="json")
+    config.add_jwt_route_profile("profile", replay=False)
+    app = TestApp(config.make_wsgi_app())
+
+    policy = JWTAuthenticationPolicy("secret", expiration=60, clock=clock)
+    headers = {"Authorization": "JWT " + policy.create_token("user", jti="abc")}
+    assert app.get("/profile", headers=headers).json["sub"] == "user"
+    assert app.get("/profile", headers=headers).json["sub"] == "user"
+    assert app.get("/pay", headers=headers).json["sub"] == "user"
+    assert app.get("/pay", headers=headers).json == {}
+
+
+@pytest.mark.parametrize("leeways", [(0, 30), (30, 0)])
+def test_leeway_does_not_change_bucket(store, clock, leeways):
+    policy = JWTAuthenticationPolicy(
+        "secret", expiration=50, clock=clock, replay_store=store
+    )
+    claims = {"jti": "abc", "exp": 1050}
+    policy._check_replay(None, claims, leeways[0])
+    with pytest.raises(ReplayedTokenError):
+        policy._check_replay(None, dict(claims), leeways[1])
+
+
+def test_cache_keeps_bucket_for_leeway(clock):
+    cache = ReplayCache(bucket_seconds=10, clock=clock)
+    assert cache.add("a", 1005, 30)
+    clock.tick(20)
+    cache.add("other", 1100)
+    assert not cache.add("a", 1005)
+    clock.tick(20)
+    cache.add("other", 1100)
+    assert cache.add("a", 1005)
+
+
+def test_replay_across_route_leeways(clock):
+    def view(request):
+        return request.jwt_claims
+
+    config = Configurator(settings={"jwt.replay_protection": "true"})
+    config.set_authorization_policy(ACLAuthorizationPolicy())
+    config.include("pyramid_jwt")
+    config.set_jwt_authentication_policy("secret", expiration=60, clock=clock)
+    config.add_route("strict", "/strict")
+    config.add_route("lenient", "/lenient")
+    config.add_view(view, route_name="strict", renderer="json")
+    config.add_view(view, route_name="lenient", renderer="json")
+    config.add_jwt_route_profile("lenient", leeway=30)
+    app = TestApp(config.make_wsgi_app())
+
+    policy = JWTAuthenticationPolicy("secret", expiration=60, clock=clock)
+    headers = {"Authorization": "JWT " + policy.create_token("user", jti="abc")}
+    assert app.get("/strict", headers=headers).json["sub"] == "user"
+    assert app.get("/lenient", headers=headers).json == {}
+    # Still remembered once the token only passes with the larger leeway.
+    clock.tick(70)
+    assert app.get("/lenient", headers=headers).json == {}
@@ -0,0 +1,130 @@
+import pytest
+from pyramid.authorization import ALL_PERMISSIONS, Allow, Authenticated
+from pyramid.config import Configurator
+from pyramid.interfaces import ISecurityPolicy
+from pyramid.response import Response
+from pyramid.security import forget, remember
+from webtest import TestApp
+from zope.interface.verify import verifyObject
+
+from pyramid_jwt.clock import FixedClock
+from pyramid_jwt.policy import JWTAuthenticationPolicy
+from pyramid_jwt.security import JWTSecurityPolicy
+
+
+class Root:
+    __acl__ = [(Allow, Authenticated, "read"), (Allow, "group:admin", ALL_PERMISSIONS)]
+
+    def __init__(self, request):
+        pass
+
+
+def test_interface():
+    policy = JWTSecurityPolicy(JWTAuthenticationPolicy("secret"))
+    verifyObject(ISecurityPolicy, policy)
+
+
+@pytest.fixture
+def calls():
+    return []
+
+
+@pytest.fixture
+def app(calls):
+    def callback(userid, request):
+        calls.append(userid)
+        if userid == "banned":
+            return None
+        return ["group:admin"] if userid == "admin" else []
+
+    def whoami(request):
+        request.has_permission("read")
+        request.has_permission("write")
+        return {
+            "userid": request.authenticated_userid,
+            "identity": request.identity and request.identity.principals,
+        }
+
+    config = Configurator(root_factory=Root)
+    config.include("pyramid_jwt")
+    config.set_jwt_security_policy("secret", callback=callback)
+    config.add_route("whoami", "/whoami")
+    config.add_route("write", "/write")
+    config.add_view(whoami, route_name="whoami", renderer="json", permission="read")
+    config.add_view(whoami, route_name="write", renderer="json", permission="write")
+    return TestApp(config.make_wsgi_app())
+
+
+def auth(userid):
+    return {
+        "Authorization": "JWT " + JWTAuthenticationPolicy("secret").create_token(userid)
+    }
+
+
+def test_anonymous(app, calls):
+    app.get("/whoami", status=403)
+    assert calls == []
+
+
+def test_identity(app, calls):
+    result = app.get("/whoami", headers=auth("alice")).json
+    assert result == {
+        "userid": "alice",
+        "identity": ["system.Everyone", "system.Authenticated", "alice"],
+    }
+    # The callback is called once, despite several permission checks
+    assert calls == ["alice"]
+
+
+def test_permits(app):
+    app.get("/write", headers=auth("alice"), status=403)
+    assert app.get("/write", headers=auth("admin")).json["userid"] == "admin"
+
+
+def test_callback_rejects(app, calls):
+    app.get("/whoami", headers=auth("banned"), status=403)
+    assert calls == ["banned"]
+
+
+def test_invalid_token(app):
+    app.get("/whoami", headers={"Authorization": "JWT garbage"}, status=403)
+
+
+def test_cookie_security_policy():
+    clock = FixedClock(1000)
+
+    def login(request):
+        return Response(headers=remember(request, request.create_jwt_token("alice")))
+
+    def logout(request):
+        return Response(headers=forget(request))
+
+    def whoami(request):
+        return {"userid": request.authenticated_userid}
+
+    config = Configurator(root_factory=Root)
+    config.include("pyramid_jwt")
+    config.set_jwt_cookie_security_policy(
+        "secret",
+        cookie_name="Token",
+        expiration=60,
+        reissue_time=10,
+        https_only=False,
+        clock=clock,
+    )
+    config.add_route("login", "/login")
+    config.add_route("logout", "/logout")
+    config.add_route("whoami", "/whoami")
+    config.add_view(login, route_name="login")
+    config.add_view(logout, route_name="logout")
+    config.add_view(whoami, route_name="whoami", renderer="json", permission="read")
+    app = TestApp(config.make_wsgi_app())
+
+    app.get("/login")
+    token = app.cookies["Token"]
+    assert app.get("/whoami").json == {"userid": "alice"}
+    clock.tick(20)
+    assert app.get("/whoami").json == {"userid": "alice"}
+    assert app.cookies["Token"] != token
+    app.get("/logout")
+    app.get("/whoami", status=403)
@@ -0,0 +1,112 @@
+import json
+
+import jwt
+import pytest
+from pyramid.config import Configurator
+from pyramid.renderers import JSON
+
+from pyramid_jwt import create_jwt_authentication_policy, serializers
+from pyramid_jwt.clock import FixedClock
+from pyramid_jwt.keys import generate_key, public_key_for
+from pyramid_jwt.policy import JWTAuthenticationPolicy
+
+CLAIMS = {
+    "name": "John 'Doe' \"Quoted\" \\ / <tag>",
+    "roles": ["admin", "reader"],
+    "nested": {"a": [1, 2, {"b": None}], "c": True, "d": False},
+    "big": 2**62,
+}
+
+
+def make_policy(serializer, **kw):
+    return JWTAuthenticationPolicy(
+        "secret", serializer=serializer, clock=FixedClock(1000), expiration=60, **kw
+    )
+
+
+@pytest.mark.parametrize("serializer", ["orjson", "auto"])
+def test_byte_identical(serializer):
+    pytest.importorskip("orjson")
+    fast = make_policy(serializer)
+    assert fast._fast_dumps is not None
+    assert fast.create_token("user", **CLAIMS) == make_policy(None).create_token(
+        "user", **CLAIMS
+    )
+
+
+def test_byte_identical_ujson():
+    pytest.importorskip("ujson")
+    fast = make_policy("ujson")
+    assert fast.create_token("user", **CLAIMS) == make_policy(None).create_token(
+        "user", **CLAIMS
+    )
+
+
+def test_byte_identical_asymmetric():
+    pytest.importorskip("orjson")
+    key = generate_key("EdDSA")  # Ed25519 signatures are deterministic
+    fast = JWTAuthenticationPolicy(
+        key, public_key_for(key), "EdDSA", serializer="orjson", clock=FixedClock(1)
+    )
+    slow = JWTAuthenticationPolicy(
+        key, public_key_for(key), "EdDSA", clock=FixedClock(1)
+    )
+    assert fast.create_token("user", **CLAIMS) == slow.create_token("user", **CLAIMS)
+
+
+@pytest.mark.parametrize(
+    "claims",
+    [{"name": "Jöhn"}, {"ratio": 0.5}, {"line": "a\nb"}, {"huge": 2**70}, {1: "a"}],
+)
+def test_non_plain_claims_fall_back(claims):
+    pytest.importorskip("orjson")
+    assert not serializers.is_plain(claims)
+    policy = make_policy("orjson")
+    assert policy.create_token("user", **{"claim": claims}) == make_policy(
+        None
+    ).create_token("user", **{"claim": claims})
+
+
+def test_json_adapters_still_used():
+    pytest.importorskip("orjson")
+
+    class Account:
+        pass
+
+    renderer = JSON()
+    renderer.add_adapter(Account, lambda obj, request: "account")
+    config = Configurator(settings={"jwt.serializer": "orjson"})
+    config.add_renderer("json", renderer)
+    config.commit()
+    policy = create_jwt_authentication_policy(config, "secret")
+    assert policy.serializer == "orjson"
+    token = policy.create_token("user", account=Account())
+    assert jwt.decode(token, "secret", algorithms=["HS512"])["account"] == "account"
+
+
+def test_custom_json_encoder_disables_fast_path(monkeypatch):
+    class Encoder(json.JSONEncoder):
+        pass
+
+    policy = make_policy("auto", json_encoder=Encoder)
+    monkeypatch.setattr(policy, "_fast_encode", None)
+    assert policy.create_token("user")
+
+
+def test_missing_library_falls_back(monkeypatch):
+    monkeypatch.setattr(serializers, "orjson", None)
+    monkeypatch.setattr(serializers, "ujson", None)
+    assert serializers.fast_dumps("orjson") is None
+    assert serializers.fast_dumps("auto") is None
+    assert make_policy("orjson").create_token("user")
+
+
+def test_unknown_serializer():
+    with pytest.raises(ValueError):
+        serializers.fast_dumps("yaml")
+
+
+def test_unsupported_algorithm_still_raises():
+    policy = JWTAuthenticationPolicy("secret", algorithm="SHA1", serializer="auto")
+    with pytest.raises(NotImplementedError):
+        policy.create_token(15)
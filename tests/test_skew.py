@@ -0,0 +1,163 @@
+import threading
+
+import jwt
+import pytest
+from pyramid.testing import DummyRequest
+
+from pyramid_jwt.clock import FixedClock
+from pyramid_jwt.policy import JWTAuthenticationPolicy
+from pyramid_jwt.skew import (
+    SkewHistogram,
+    SkewMonitor,
+    skew_monitor_from_settings,
+)
+from pyramid_jwt.stats import policy_stats
+
+
+def foreign_token(issuer, iat, expiration=300):
+    payload = {"sub": "user", "iss": issuer, "iat": iat, "exp": iat + expiration}
+    return jwt.encode(payload, "secret", algorithm="HS512")
+
+
+def decode(policy, token):
+    return policy.jwt_decode(DummyRequest(remote_addr="10.0.0.1"), token)
+
+
+@pytest.fixture
+def clock():
+    return FixedClock(100000)
+
+
+def test_histogram_rolls_over(clock):
+    histogram = SkewHistogram(60, clock.now)
+    histogram.add(3, clock.now)
+    clock.tick(61)
+    histogram.add(-1, clock.now)
+    assert sum(histogram.counts(clock.now)) == 2
+    clock.tick(61)
+    assert sum(histogram.counts(clock.now)) == 1
+    clock.tick(200)
+    assert sum(histogram.counts(clock.now)) == 0
+
+
+def test_histogram_percentile():
+    counts = [0] * 18
+    counts[8] = 90  # <= 0
+    counts[11] = 10  # <= 5
+    assert SkewHistogram.percentile(counts, 0.5) == 0
+    assert SkewHistogram.percentile(counts, 0.95) == 5
+    assert SkewHistogram.percentile([0] * 18, 0.5) is None
+
+
+def test_skew_recorded_per_issuer(clock):
+    monitor = SkewMonitor()
+    policy = JWTAuthenticationPolicy("secret", clock=clock, skew_monitor=monitor)
+    decode(policy, foreign_token("ahead", int(clock.now) + 4))
+    decode(policy, foreign_token("behind", int(clock.now) - 20))
+    decode(policy, policy.create_token("user"))
+    metrics = policy_stats(policy)["clock_skew"]
+    assert metrics["ahead"]["tokens"] == 1
+    assert metrics["ahead"]["skew"]["<=5"] == 1
+    assert metrics["behind"]["p50"] == -10
+    assert metrics["10.0.0.1"]["skew"]["<=0"] == 1
+
+
+def test_skew_recorded_once_per_request(clock):
+    monitor = SkewMonitor()
+    policy = JWTAuthenticationPolicy("secret", clock=clock, skew_monitor=monitor)
+    request = DummyRequest(remote_addr="10.0.0.1")
+    token = policy.create_token("user")
+    policy.jwt_decode(request, token)
+    policy.jwt_decode(request, token)
+    assert monitor.metrics(clock.now)["10.0.0.1"]["tokens"] == 1
+
+
+def test_number_of_clients_is_bounded(clock):
+    monitor = SkewMonitor(max_clients=2)
+    policy = JWTAuthenticationPolicy("secret", clock=clock, skew_monitor=monitor)
+    for issuer in ("a", "b", "c"):
+        decode(policy, foreign_token(issuer, int(clock.now)))
+    assert sorted(monitor.metrics(clock.now)) == ["b", "c"]
+
+
+def test_measuring_does_not_change_leeway(clock):
+    monitor = SkewMonitor(min_samples=1)
+    policy = JWTAuthenticationPolicy("secret", clock=clock, skew_monitor=monitor)
+    for _ in range(5):
+        assert decode(policy, foreign_token("ahead", int(clock.now) + 8)) == {}
+
+
+def test_adaptive_leeway(clock):
+    monitor = SkewMonitor(max_leeway=30, min_samples=5)
+    policy = JWTAuthenticationPolicy(
+        "secret", leeway=2, clock=clock, skew_monitor=monitor
+    )
+    token = foreign_token("ahead", int(clock.now) + 8)
+    for _ in range(4):
+        assert decode(policy, token) == {}
+    # Once enough tokens were seen the leeway covers the skew of the issuer.
+    assert decode(policy, token)["iss"] == "ahead"
+    # Other issuers keep the configured leeway.
+    assert decode(policy, foreign_token("other", int(clock.now) + 8)) == {}
+
+
+def test_adaptive_leeway_does_not_extend_expiry(clock):
+    monitor = SkewMonitor(max_leeway=30, min_samples=5)
+    policy = JWTAuthenticationPolicy(
+        "secret", leeway=2, clock=clock, skew_monitor=monitor
+    )
+    for _ in range(5):
+        decode(policy, foreign_token("ahead", int(clock.now) + 8))
+    assert decode(policy, foreign_token("ahead", int(clock.now) + 8))
+    expired = foreign_token("ahead", int(clock.now) - 100, expiration=95)
+    assert decode(policy, expired) == {}
+    assert policy.stats.outcomes["expired"] == 1
+
+
+def test_adaptive_leeway_is_bounded(clock):
+    monitor = SkewMonitor(max_leeway=30, min_samples=1)
+    policy = JWTAuthenticationPolicy("secret", clock=clock, skew_monitor=monitor)
+    token = foreign_token("far", int(clock.now) + 100)
+    decode(policy, token)
+    assert monitor.leeway(None, {"iss": "far"}, clock.now, 0) == 30
+    assert decode(policy, token) == {}
+
+
+def test_from_settings():
+    assert skew_monitor_from_settings({}) is None
+    monitor = skew_monitor_from_settings({"jwt.skew_tracking": "true"})
+    assert monitor.max_leeway is None
+    monitor = skew_monitor_from_settings(
+        {"jwt.leeway_max": "60", "jwt.skew_window": "120", "jwt.skew_clients": "10"}
+    )
+    assert monitor.max_leeway == 60
+    assert monitor.window == 120
+    assert monitor.clients.maxsize == 10
+
+
+def test_leeway_lookup_does_not_touch_clients(clock):
+    monitor = SkewMonitor(max_leeway=30, max_clients=2)
+    monitor.observe(None, {"iss": "a", "iat": int(clock.now)}, clock.now)
+    monitor.observe(None, {"iss": "b", "iat": int(clock.now)}, clock.now)
+    hits = monitor.clients.hits
+    monitor.leeway(None, {"iss": "a"}, clock.now, 0)
+    assert monitor.clients.hits == hits
+    # "a" is still the least recently used client and is evicted first.
+    monitor.observe(None, {"iss": "c", "iat": int(clock.now)}, clock.now)
+    assert [client for client, _ in monitor.clients.items()] == ["b", "c"]
+
+
+def test_concurrent_observe(clock):
+    monitor = SkewMonitor()
+    claims = {"iss": "fleet", "iat": int(clock.now)}
+
+    def work():
+        for _ in range(1000):
+            monitor.observe(None, claims, clock.now)
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert 0 < monitor.metrics(clock.now)["fleet"]["tokens"] <= 4000
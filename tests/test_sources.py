@@ -0,0 +1,211 @@
+import pytest
+from pyramid.authorization import ACLAuthorizationPolicy
+from pyramid.config import Configurator
+from pyramid.request import Request as PyramidRequest
+from webob import Request
+from webtest import TestApp
+
+from pyramid_jwt.clock import FixedClock
+from pyramid_jwt.policy import JWTAuthenticationPolicy, JWTCookieAuthenticationPolicy
+from pyramid_jwt.sources import (
+    AuthorizationHeaderSource,
+    CookieSource,
+    CredentialSource,
+    HeaderSource,
+    QueryParamSource,
+    sources_from_settings,
+)
+from pyramid_jwt.state import request_state
+
+
+def make_policy(**kw):
+    sources = [
+        HeaderSource("X-Token"),
+        QueryParamSource("access_token"),
+        AuthorizationHeaderSource("Bearer"),
+    ]
+    return JWTAuthenticationPolicy("secret", credential_sources=sources, **kw)
+
+
+def test_first_present_source_wins():
+    policy = make_policy()
+    request = Request.blank("/?access_token=%s" % policy.create_token("query"))
+    request.headers["X-Token"] = policy.create_token("header")
+    assert policy.get_claims(request)["sub"] == "header"
+    assert policy.get_credential_source(request) == "header:X-Token"
+
+
+def test_invalid_token_falls_through():
+    policy = make_policy()
+    token = policy.create_token("bearer")
+    request = Request.blank("/")
+    request.headers["X-Token"] = "garbage"
+    request.authorization = ("Bearer", token)
+    assert policy.get_claims(request)["sub"] == "bearer"
+    assert policy.get_token(request) == token
+    assert policy.get_credential_source(request) == "authorization"
+
+
+def test_query_parameter():
+    policy = make_policy()
+    request = Request.blank("/ws?access_token=%s" % policy.create_token("ws"))
+    assert policy.get_claims(request)["sub"] == "ws"
+    assert policy.get_credential_source(request) == "query:access_token"
+
+
+def test_no_valid_source():
+    policy = make_policy()
+    request = Request.blank("/?access_token=garbage")
+    request.authorization = ("Other", policy.create_token("other"))
+    assert policy.get_claims(request) == {}
+    assert policy.get_token(request) is None
+    assert policy.get_credential_source(request) is None
+
+
+def test_sources_probed_once():
+    class CountingSource(CredentialSource):
+        probes = 0
+
+        def probe(self, policy, request):
+            self.probes += 1
+            return None
+
+    source = CountingSource(name="counting")
+    policy = JWTAuthenticationPolicy("secret", credential_sources=[source])
+    request = Request.blank("/")
+    policy.get_claims(request)
+    policy.get_token(request)
+    assert source.probes == 1
+
+
+def test_per_source_audience():
+    sources = [
+        HeaderSource("X-Internal", audience="internal"),
+        AuthorizationHeaderSource(),
+    ]
+    policy = JWTAuthenticationPolicy("secret", credential_sources=sources)
+    request = Request.blank("/")
+    request.headers["X-Internal"] = policy.create_token("svc", audience="public")
+    assert policy.get_claims(request) == {}
+
+    request = Request.blank("/")
+    request.headers["X-Internal"] = policy.create_token("svc", audience="internal")
+    assert policy.get_claims(request)["sub"] == "svc"
+
+
+def test_per_source_algorithm():
+    sources = [HeaderSource("X-Token", algorithms=["HS256"])]
+    policy = JWTAuthenticationPolicy("secret", credential_sources=sources)
+    request = Request.blank("/")
+    request.headers["X-Token"] = policy.create_token("user")  # HS512
+    assert policy.get_claims(request) == {}
+
+
+def test_cookie_source_reissue():
+    clock = FixedClock(1000)
+    policy = JWTCookieAuthenticationPolicy(
+        "secret",
+        reissue_time=10,
+        clock=clock,
+        credential_sources=[AuthorizationHeaderSource(), CookieSource()],
+    )
+    token = policy.create_token("user")
+    request = PyramidRequest.blank("/")
+    request.cookies = {
+        name: value
+        for name, value in (
+            cookie.split(";", 1)[0].split("=", 1)
+            for _, cookie in policy.remember(PyramidRequest.blank("/"), token)
+        )
+    }
+    clock.tick(20)
+    assert policy.get_claims(request)["sub"] == "user"
+    assert request_state(request).reissued
+
+
+def test_header_source_does_not_reissue():
+    clock = FixedClock(1000)
+    policy = JWTCookieAuthenticationPolicy(
+        "secret",
+        reissue_time=10,
+        clock=clock,
+        credential_sources=[AuthorizationHeaderSource(), CookieSource()],
+    )
+    request = Request.blank("/")
+    request.authorization = ("JWT", policy.create_token("user"))
+    clock.tick(20)
+    assert policy.get_claims(request)["sub"] == "user"
+    assert not request_state(request).reissued
+
+
+def test_named_cookie_source():
+    policy = JWTAuthenticationPolicy(
+        "secret", credential_sources=[CookieSource("ws_token")]
+    )
+    request = Request.blank("/")
+    request.cookies["ws_token"] = policy.create_token("user")
+    assert policy.get_claims(request)["sub"] == "user"
+    assert policy.get_credential_source(request) == "cookie:ws_token"
+
+
+def test_named_cookie_source_not_reissued():
+    clock = FixedClock(1000)
+    policy = JWTCookieAuthenticationPolicy(
+        "secret",
+        reissue_time=10,
+        clock=clock,
+        credential_sources=[CookieSource("session_jwt")],
+    )
+    request = PyramidRequest.blank("/")
+    request.cookies["session_jwt"] = policy.create_token("user")
+    clock.tick(20)
+    assert policy.get_claims(request)["sub"] == "user"
+    assert not request_state(request).reissued
+    assert not request.response_callbacks
+
+
+def test_policy_cookie_source_needs_cookie_policy():
+    with pytest.raises(ValueError):
+        JWTAuthenticationPolicy("secret", credential_sources=[CookieSource()])
+    config = Configurator(settings={"jwt.credential_sources": "authorization cookie"})
+    config.include("pyramid_jwt")
+    with pytest.raises(ValueError):
+        config.set_jwt_authentication_policy("secret")
+        config.commit()
+
+
+def test_sources_from_settings():
+    sources = sources_from_settings(
+        "header:X-Token\nquery\ncookie authorization:Bearer", "JWT"
+    )
+    assert [source.name for source in sources] == [
+        "header:X-Token",
+        "query:access_token",
+        "cookie",
+        "authorization",
+    ]
+    assert sources[3].auth_type == "Bearer"
+    with pytest.raises(ValueError):
+        sources_from_settings("header")
+
+
+def test_request_credential_source():
+    def view(request):
+        return {
+            "source": request.jwt_credential_source,
+            "sub": request.jwt_claims.get("sub"),
+        }
+
+    config = Configurator(
+        settings={"jwt.credential_sources": "header:X-Token query:access_token"}
+    )
+    config.set_authorization_policy(ACLAuthorizationPolicy())
+    config.include("pyramid_jwt")
+    config.set_jwt_authentication_policy("secret")
+    config.add_route("view", "/")
+    config.add_view(view, route_name="view", renderer="json")
+    app = TestApp(config.make_wsgi_app())
+
+    token = JWTAuthenticationPolicy("secret").create_token("user")
+    body = app.get("/", params={"access_token": token}).json_body
+    assert body == {"source": "query:access_token", "sub": "user"}
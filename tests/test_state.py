@@ -0,0 +1,165 @@
+import pytest
+from pyramid.request import Request
+from pyramid.response import Response
+
+from pyramid_jwt.clock import FixedClock
+from pyramid_jwt.policy import JWTCookieAuthenticationPolicy
+from pyramid_jwt.state import (
+    REISSUE_CHECKED,
+    REISSUE_PENDING,
+    REISSUE_REVOKED,
+    REISSUE_SCHEDULED,
+    RequestState,
+    add_reissue_headers,
+    request_state,
+)
+
+
+@pytest.fixture
+def clock():
+    return FixedClock(1000)
+
+
+@pytest.fixture
+def policy(clock):
+    return JWTCookieAuthenticationPolicy(
+        "secret", expiration=60, reissue_time=10, clock=clock, https_only=False
+    )
+
+
+def cookie_request(policy, token):
+    request = Request.blank("/")
+    for _, cookie in policy.remember(Request.blank("/"), token):
+        name, value = cookie.split(";", 1)[0].split("=", 1)
+        request.cookies[name] = value
+    return request
+
+
+def response_cookies(request):
+    response = Response()
+    request._process_response_callbacks(response)
+    return response.headers.getall("Set-Cookie")
+
+
+@pytest.fixture
+def request_(policy, clock):
+    request = cookie_request(policy, policy.create_token("user"))
+    clock.tick(20)
+    return request
+
+
+def test_state_is_slotted():
+    assert not hasattr(RequestState(), "__dict__")
+
+
+def test_one_state_and_callback_per_request(policy, request_):
+    before = set(vars(request_))
+    policy.get_claims(request_)
+    policy.get_token(request_)
+    policy.get_claims(request_)
+    assert set(vars(request_)) - before == {"_jwt_state", "response_callbacks"}
+    assert list(request_.response_callbacks) == [add_reissue_headers]
+
+
+def test_callback_shared_between_requests(policy, clock):
+    token = policy.create_token("user")
+    requests = [cookie_request(policy, token) for _ in range(2)]
+    clock.tick(20)
+    for request in requests:
+        policy.get_claims(request)
+    assert requests[0].response_callbacks[0] is requests[1].response_callbacks[0]
+
+
+def test_reissue(policy, request_):
+    policy.get_claims(request_)
+    assert request_state(request_).reissue == REISSUE_SCHEDULED
+    cookies = response_cookies(request_)
+    assert len(cookies) == 1
+    assert cookies[0].startswith(policy.cookie_name + "=")
+
+
+def test_token_too_young(policy, clock):
+    request = cookie_request(policy, policy.create_token("user"))
+    clock.tick(5)
+    assert policy.get_claims(request)["sub"] == "user"
+    assert request_state(request).reissue == REISSUE_CHECKED
+    assert not request.response_callbacks
+
+
+def test_reissue_checked_once(policy, request_, monkeypatch):
+    calls = []
+    callback = policy.reissue_callback
+
+    def reissue_callback(request, principal, **claims):
+        calls.append(principal)
+        return callback(request, principal, **claims)
+
+    monkeypatch.setattr(policy, "reissue_callback", reissue_callback)
+    policy.get_claims(request_)
+    policy.get_token(request_)
+    assert calls == ["user"]
+    assert len(response_cookies(request_)) == 1
+
+
+@pytest.mark.parametrize("revoke", ["remember", "forget"])
+def test_revoke_after_reissue(policy, request_, revoke):
+    policy.get_claims(request_)
+    if revoke == "remember":
+        policy.remember(request_, policy.create_token("other"))
+    else:
+        policy.forget(request_)
+    assert request_state(request_).reissue == REISSUE_REVOKED
+    assert response_cookies(request_) == []
+
+
+@pytest.mark.parametrize("revoke", ["remember", "forget"])
+def test_revoke_before_reissue(policy, request_, revoke, monkeypatch):
+    if revoke == "remember":
+        policy.remember(request_, policy.create_token("other"))
+    else:
+        policy.forget(request_)
+    monkeypatch.setattr(policy, "reissue_callback", pytest.fail)
+    assert policy.get_claims(request_)["sub"] == "user"
+    assert not request_.response_callbacks
+
+
+def test_revoke_from_reissue_callback(policy, request_):
+    def reissue_callback(request, principal, **claims):
+        policy.forget(request)
+        return "token"
+
+    policy.reissue_callback = reissue_callback
+    policy.get_claims(request_)
+    assert request_state(request_).reissue == REISSUE_REVOKED
+    assert not request_.response_callbacks
+
+
+@pytest.mark.parametrize("before", [True, False])
+def test_revoke_reissue(policy, request_, before):
+    if before:
+        policy.revoke_reissue(request_)
+    policy.get_claims(request_)
+    if not before:
+        policy.revoke_reissue(request_)
+    assert request_state(request_).reissue == REISSUE_REVOKED
+    assert response_cookies(request_) == []
+
+
+def test_legacy_revoke_attribute(policy, request_):
+    policy.get_claims(request_)
+    request_._jwt_cookie_reissue_revoked = True
+    assert response_cookies(request_) == []
+
+
+def test_revoke_after_token_too_young(policy, clock):
+    request = cookie_request(policy, policy.create_token("user"))
+    policy.get_claims(request)
+    policy.forget(request)
+    assert request_state(request).reissue == REISSUE_REVOKED
+
+
+def test_new_state_is_pending():
+    request = Request.blank("/")
+    state = request_state(request)
+    assert state.reissue == REISSUE_PENDING
+    assert request_state(request) is state
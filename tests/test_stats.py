@@ -0,0 +1,123 @@
+import pytest
+from pyramid.authorization import ACLAuthorizationPolicy
+from pyramid.config import Configurator
+from pyramid.security import NO_PERMISSION_REQUIRED
+from pyramid.security import ALL_PERMISSIONS, Allow
+from pyramid.testing import DummyRequest
+from webtest import TestApp
+
+from pyramid_jwt.clock import FixedClock
+from pyramid_jwt.policy import JWTAuthenticationPolicy
+from pyramid_jwt.reference import ReferenceTokens
+from pyramid_jwt.stats import TopCounter, failure_reason, policy_stats
+
+
+def decode(policy, token, remote_addr="10.0.0.1"):
+    return policy.jwt_decode(DummyRequest(remote_addr=remote_addr), token)
+
+
+def test_outcomes_by_reason():
+    clock = FixedClock(1000)
+    policy = JWTAuthenticationPolicy("secret", expiration=10, clock=clock)
+    token = policy.create_token("user")
+    decode(policy, token)
+    decode(policy, token + "x")
+    decode(policy, "garbage")
+    clock.tick(20)
+    decode(policy, token)
+    assert policy.stats.outcomes == {
+        "ok": 1,
+        "invalid_signature": 1,
+        "malformed": 1,
+        "expired": 1,
+    }
+
+
+def test_failure_reason():
+    import jwt
+
+    assert failure_reason(jwt.ExpiredSignatureError()) == "expired"
+    assert failure_reason(jwt.InvalidAudienceError()) == "invalid_audience"
+    assert failure_reason(jwt.InvalidIssuerError()) == "invalid"
+
+
+def test_failing_addresses():
+    policy = JWTAuthenticationPolicy("secret")
+    for i in range(5):
+        decode(policy, "garbage", "10.0.0.1")
+    decode(policy, "garbage", "10.0.0.2")
+    stats = policy_stats(policy)
+    assert stats["decoded"] == 6
+    assert stats["failing_addresses"][0] == {"address": "10.0.0.1", "failures": 5}
+
+
+def test_top_counter_is_bounded():
+    counter = TopCounter(3)
+    for i in range(100):
+        counter.add("noisy")
+        counter.add("client-%d" % i)
+    top = counter.most_common()
+    assert len(top) == 3
+    assert top[0] == ("noisy", 100)
+
+
+def test_reference_cache_stats():
+    policy = JWTAuthenticationPolicy("secret", reference_tokens=ReferenceTokens())
+    handle = policy.create_token("user")
+    decode(policy, handle)
+    decode(policy, "unknown")
+    stats = policy_stats(policy)
+    assert stats["outcomes"] == {"ok": 1, "unknown_reference": 1}
+    cache = stats["caches"]["reference_tokens"]
+    assert cache["hits"] == 1
+    assert cache["size"] == 1
+
+
+class Root:
+    def __init__(self, request):
+        pass
+
+    __acl__ = [(Allow, "admin", ALL_PERMISSIONS)]
+
+
+def make_app(settings, security_policy=False):
+    config = Configurator(settings=settings, root_factory=Root)
+    config.include("pyramid_jwt")
+    if security_policy:
+        config.set_jwt_security_policy("secret")
+    else:
+        config.set_authorization_policy(ACLAuthorizationPolicy())
+        config.set_jwt_authentication_policy("secret")
+    return TestApp(config.make_wsgi_app())
+
+
+def test_view_requires_permission():
+    app = make_app({"jwt.stats_path": "/_jwt"})
+    app.get("/_jwt", status=403)
+
+
+def test_view_not_registered_by_default():
+    app = make_app({})
+    app.get("/_jwt", status=404)
+
+
+@pytest.mark.parametrize("security_policy", [False, True])
+def test_view(security_policy):
+    app = make_app({"jwt.stats_path": "/_jwt"}, security_policy)
+    policy = JWTAuthenticationPolicy("secret")
+    headers = {"Authorization": "JWT " + policy.create_token("admin")}
+    app.get("/_jwt", headers={"Authorization": "JWT garbage"}, status=403)
+    result = app.get("/_jwt", headers=headers).json
+    assert result["outcomes"] == {"ok": 1, "malformed": 1}
+    assert result["failing_addresses"] == []
+    app.post("/_jwt", {"reset": "true"}, headers=headers)
+    assert app.get("/_jwt", headers=headers).json["outcomes"] == {"ok": 1}
+
+
+def test_view_permission_setting():
+    settings = {
+        "jwt.stats_path": "/_jwt",
+        "jwt.stats_permission": NO_PERMISSION_REQUIRED,
+    }
+    app = make_app(settings)
+    assert "outcomes" in app.get("/_jwt").json
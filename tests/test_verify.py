@@ -0,0 +1,123 @@
+import json
+import subprocess
+import sys
+
+import pytest
+
+from pyramid_jwt.clock import FixedClock
+from pyramid_jwt.policy import JWTAuthenticationPolicy
+from pyramid_jwt.scripts import main, read_tokens, verify_tokens
+
+SETTINGS = {"jwt.private_key": "secret", "jwt.audience": "app"}
+
+
+@pytest.fixture
+def tokens():
+    policy = JWTAuthenticationPolicy(
+        "secret", expiration=60, audience="app", clock=FixedClock(1000)
+    )
+    other = JWTAuthenticationPolicy("other", audience="app")
+    return [
+        policy.create_token("alice"),
+        "garbage",
+        other.create_token("mallory"),
+        policy.create_token("bob", audience="elsewhere"),
+    ]
+
+
+EXPECTED = [
+    (True, None),
+    (False, "malformed"),
+    (False, "invalid_signature"),
+    (False, "invalid_audience"),
+]
+
+
+def outcomes(results):
+    return [(r["valid"], r.get("error")) for r in results]
+
+
+def test_read_tokens(tmp_path):
+    path = tmp_path / "tokens"
+    path.write_text("abc\n\nJWT def\n  ghi  \n")
+    assert list(read_tokens([str(path)])) == [
+        (str(path), 1, "abc"),
+        (str(path), 3, "def"),
+        (str(path), 4, "ghi"),
+    ]
+
+
+def test_verify_serial(tokens):
+    source = [("-", i + 1, token) for i, token in enumerate(tokens)]
+    results = list(verify_tokens(source, SETTINGS, now=1010))
+    assert outcomes(results) == EXPECTED
+    assert results[0]["claims"]["sub"] == "alice"
+    assert [r["line"] for r in results] == [1, 2, 3, 4]
+
+
+def test_verify_expiry(tokens):
+    source = [("-", 1, tokens[0])]
+    assert outcomes(verify_tokens(source, SETTINGS, now=2000)) == [(False, "expired")]
+
+
+def test_verify_parallel(tokens):
+    source = [("-", i, tokens[i % 4]) for i in range(200)]
+    results = list(verify_tokens(source, SETTINGS, now=1010, jobs=2, batch_size=7))
+    assert [r["line"] for r in results] == list(range(200))
+    assert outcomes(results) == EXPECTED * 50
+
+
+def test_verify_stops_early(tokens):
+    source = (("-", i, tokens[0]) for i in range(100000))
+    results = verify_tokens(source, SETTINGS, now=1010, jobs=2, batch_size=10)
+    assert next(results)["valid"]
+    results.close()
+
+
+def test_cli(tmp_path, tokens, capsys):
+    path = tmp_path / "tokens"
+    path.write_text("\n".join(tokens) + "\n")
+    output = tmp_path / "results"
+    main(
+        [
+            "verify",
+            "--key",
+            "secret",
+            "--audience",
+            "app",
+            "--now",
+            "1010",
+            "-j",
+            "1",
+            "-o",
+            str(output),
+            str(path),
+        ]
+    )
+    results = [json.loads(line) for line in output.read_text().splitlines()]
+    assert outcomes(results) == EXPECTED
+    summary = capsys.readouterr().err
+    assert "ok: 1" in summary
+    assert "malformed: 1" in summary
+
+
+def test_cli_closed_pipe(tmp_path):
+    path = tmp_path / "tokens"
+    path.write_text("garbage\n" * 50000)
+    process = subprocess.Popen(
+        [sys.executable, "-m", "pyramid_jwt.scripts", "verify", "--key", "secret"]
+        + ["-j", "1", str(path)],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    assert json.loads(process.stdout.readline())["error"] == "malformed"
+    process.stdout.close()
+    errors = process.stderr.read()
+    process.stderr.close()
+    assert process.wait() == 1
+    assert b"Traceback" not in errors
+
+
+def test_cli_requires_key(tmp_path):
+    with pytest.raises(SystemExit):
+        main(["verify", str(tmp_path / "tokens")])
@@ -0,0 +1,110 @@
+import pytest
+from pyramid.authorization import ACLAuthorizationPolicy
+from pyramid.config import Configurator
+from pyramid.interfaces import IAuthenticationPolicy
+
+from pyramid_jwt.clock import FixedClock
+from pyramid_jwt.encryption import TokenEncryption
+from pyramid_jwt.keys import generate_key, public_key_for
+from pyramid_jwt.policy import JWTAuthenticationPolicy, JWTCookieAuthenticationPolicy
+from pyramid_jwt.reference import ReferenceTokens
+
+KEY = bytes(range(32))
+
+
+def test_warm_up_prepares_signer():
+    policy = JWTCookieAuthenticationPolicy("secret")
+    assert policy._fast_signer is None
+    assert policy.warm_up() == 0
+    assert policy._fast_signer is not None
+
+
+def test_warm_up_verification_keys():
+    pytest.importorskip("cryptography")
+    key = generate_key("ES256")
+    policy = JWTAuthenticationPolicy(
+        "secret",
+        algorithm="HS256",
+        verification_keys={"ES256": public_key_for(key)},
+    )
+    policy.warm_up()
+
+
+def test_warm_up_public_key_only():
+    pytest.importorskip("cryptography")
+    key = generate_key("EdDSA")
+    policy = JWTAuthenticationPolicy(None, public_key_for(key), algorithm="EdDSA")
+    assert policy.warm_up() == 0
+
+
+def test_snapshot_fills_decryption_cache(tmp_path):
+    pytest.importorskip("cryptography")
+    clock = FixedClock(1000)
+    policy = JWTAuthenticationPolicy(
+        "secret", expiration=60, clock=clock, encryption=TokenEncryption(KEY)
+    )
+    tokens = [policy.create_token("user%d" % i) for i in range(3)]
+    snapshot = tmp_path / "tokens"
+    snapshot.write_text("\n".join(tokens + ["", "garbage"]) + "\n")
+
+    worker = JWTAuthenticationPolicy(
+        "secret", expiration=60, clock=clock, encryption=TokenEncryption(KEY)
+    )
+    assert worker.warm_up(str(snapshot)) == 3
+    cache = worker.encryption.cache
+    assert len(cache) == 3
+    misses = cache.misses
+    worker._decrypt(tokens[0])
+    assert cache.misses == misses
+
+
+def test_snapshot_fills_reference_cache(tmp_path):
+    store_policy = JWTAuthenticationPolicy("secret", reference_tokens=ReferenceTokens())
+    handle = store_policy.create_token("user")
+    worker = JWTAuthenticationPolicy(
+        "secret",
+        reference_tokens=ReferenceTokens(store_policy.reference_tokens.store),
+    )
+    snapshot = tmp_path / "tokens"
+    snapshot.write_text(handle + "\nunknown\n")
+    assert worker.warm_up(str(snapshot)) == 1
+    assert handle in worker.reference_tokens.cache
+
+
+@pytest.mark.parametrize("cookie", [False, True])
+def test_application_created_security_policy(monkeypatch, cookie):
+    calls = []
+    monkeypatch.setattr(
+        JWTAuthenticationPolicy,
+        "warm_up",
+        lambda self, snapshot: calls.append((type(self), snapshot)),
+    )
+    config = Configurator(settings={"jwt.warm_up_snapshot": "tokens.txt"})
+    config.include("pyramid_jwt")
+    if cookie:
+        config.set_jwt_cookie_security_policy("secret")
+    else:
+        config.set_jwt_security_policy("secret")
+    config.make_wsgi_app()
+    expected = JWTCookieAuthenticationPolicy if cookie else JWTAuthenticationPolicy
+    assert calls == [(expected, "tokens.txt")]
+
+
+@pytest.mark.parametrize("enabled", [True, False])
+def test_application_created(tmp_path, enabled, monkeypatch):
+    calls = []
+    monkeypatch.setattr(
+        JWTAuthenticationPolicy,
+        "warm_up",
+        lambda self, snapshot: calls.append(snapshot),
+    )
+    settings = {"jwt.warm_up": str(enabled).lower()}
+    config = Configurator(settings=settings)
+    config.set_authorization_policy(ACLAuthorizationPolicy())
+    config.include("pyramid_jwt")
+    config.set_jwt_authentication_policy("secret")
+    app = config.make_wsgi_app()
+    assert isinstance(
+        app.registry.queryUtility(IAuthenticationPolicy), JWTAuthenticationPolicy
+    )
+    assert calls == ([None] if enabled else [])